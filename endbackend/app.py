@@ -1,16 +1,42 @@
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask
 from flask_cors import CORS
 from config import Config
 from models import db
 from routes import register_routes
+from utils.versioning import ensure_versions
+from utils.migrations import upgrade, schema_fingerprint, schema_is_current, record_schema_fingerprint
+from utils.db_routing import replica_router
+from utils.sql_profiler import query_profiler
+from utils.metrics import app_metrics
+from utils.profiler import request_profiler
+from utils.startup import startup_timer
+from utils.tokens import ensure_secret_key
+
+startup_timer.record('导入模块', time.perf_counter() - _import_started)
 
-def create_app():
+# with_commands=False 时不导入命令行命令模块（导入批量导入、导出、压测等工具模块），
+# 用于只处理请求的工作进程；debug 不为空时覆盖 FLASK_DEBUG 环境变量的设置
+def create_app(with_commands=True, debug=None):
+    started = time.perf_counter()
+    
     # 创建Flask应用实例
     app = Flask(__name__)
+    if debug is not None:
+        app.debug = debug
+    
+    # 未设置签名密钥时只允许调试模式启动
+    ensure_secret_key(app.debug)
     
     # 配置应用
     app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = Config.SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config['USE_X_SENDFILE'] = Config.USE_X_SENDFILE
+    app.config['SQLALCHEMY_BINDS'] = {
+        f'replica{i}': uri for i, uri in enumerate(Config.SQLALCHEMY_REPLICA_URIS)
+    }
     
     # 配置跨域
     CORS(app, resources=Config.CORS_RESOURCES)
@@ -18,22 +44,51 @@ def create_app():
     # 初始化数据库
     db.init_app(app)
     
+    # 读写分离
+    replica_router.init_app(app)
+    
+    # SQL性能统计
+    query_profiler.init_app(app)
+    
+    # 请求指标（/metrics）
+    app_metrics.init_app(app)
+    
+    # 按需的请求性能分析
+    request_profiler.init_app(app)
+    
     # 注册路由
     register_routes(app)
     
+    # 注册命令行命令
+    if with_commands:
+        from commands import register_commands
+        register_commands(app)
+    
+    startup_timer.record('创建应用', time.perf_counter() - started)
     return app
 
 # 创建数据库表
+# 数据库中记录的结构指纹与当前模型一致时（上次启动已完成建表和迁移）只需一次查询，
+# 跳过 create_all 的逐表检查和迁移；SCHEMA_FINGERPRINT_CHECK=0 时每次都完整检查
 def init_db(app):
-    with app.app_context():
+    with app.app_context(), startup_timer.phase('初始化数据库'):
         try:
-            db.create_all()
-            print('数据库表创建成功')
+            fingerprint = schema_fingerprint()
+            if Config.SCHEMA_FINGERPRINT_CHECK and schema_is_current(fingerprint):
+                print('数据库结构未变化，跳过建表和迁移检查')
+            else:
+                db.create_all()
+                for version, name in upgrade():
+                    print(f'已执行数据库迁移 {version}: {name}')
+                ensure_versions()
+                record_schema_fingerprint(fingerprint)
+                print('数据库表创建成功')
         except Exception as e:
             print(f'数据库初始化错误：{str(e)}')
+    print(startup_timer.summary())
 
 # 主程序入口
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app(debug=True)
     init_db(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,318 @@
+import logging
+import time
+from urllib.parse import parse_qsl
+from sqlalchemy import and_, select
+from sqlalchemy.orm import contains_eager
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_etags
+from config import Config
+from app import create_app, init_db
+from models import Food, Ingredient, Partnership, PartnerRequest, User
+from utils.async_db import async_db, get_versions, resolve_principal
+from utils.metrics import app_metrics
+from utils.pagination import PaginationError, page_query
+from utils.serializers import food_catalog_options, serialize_food, serialize_ingredient
+from utils.versioning import make_etag
+
+logger = logging.getLogger(__name__)
+
+# 异步模式：uvicorn asgi:app --workers 4
+# 食品目录、原料列表、合作伙伴等高频只读接口使用异步数据库会话处理，
+# 等待数据库时不占用线程；其他接口交给 Flask 应用处理（需安装 asgiref）
+
+class AsyncRequest:
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'')
+        # 异步处理的接口都没有路径参数
+        self.view_args = {}
+        self.args = MultiDict(parse_qsl(self.query_string.decode('utf-8', 'replace'), keep_blank_values=True))
+        self.headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+
+    def bearer_token(self):
+        header = self.headers.get('Authorization', '')
+        if header.startswith('Bearer '):
+            return header[len('Bearer '):].strip()
+        return None
+
+class AsyncResponse:
+    def __init__(self, body=b'', status=200, mimetype='application/json'):
+        # body 为 bytes 或异步生成器（流式返回）
+        self.body = body
+        self.status = status
+        self.headers = Headers({'Content-Type': mimetype})
+
+# 与 Flask jsonify 相同的输出（使用应用的JSON配置）
+def jsonify(payload, status=200):
+    body = flask_app.json.dumps(payload, separators=(',', ':')) + '\n'
+    return AsyncResponse(body.encode('utf-8'), status)
+
+def error(message, status):
+    return jsonify({"message": message, "status": "error"}, status)
+
+# 流式返回完整列表（同 utils.streaming.stream_json_list），按批次从服务端游标读取
+def stream_json_list(session, message, statement, serialize):
+    dumps = flask_app.json.dumps
+
+    async def generate():
+        yield ('{"message": %s, "status": "success", "data": [' % dumps(message)).encode('utf-8')
+        result = await session.stream_scalars(statement.execution_options(yield_per=Config.STREAM_BATCH_SIZE))
+        first = True
+        async for rows in result.partitions():
+            yield (('' if first else ',') + ','.join(dumps(serialize(row)) for row in rows)).encode('utf-8')
+            first = False
+        yield b'], "next_cursor": null}'
+
+    return AsyncResponse(generate())
+
+def wants_stream(request):
+    return request.args.get('stream') in ('1', 'true')
+
+async def paginate(session, statement, id_column, sort_columns, args):
+    statement, finish = page_query(statement, id_column, sort_columns, args)
+    return finish((await session.scalars(statement)).all())
+
+# 获取所有食品（同 routes.food.get_foods）
+async def get_foods(request, session, principal):
+    statement = select(Food).options(*food_catalog_options())
+    if wants_stream(request):
+        return stream_json_list(session, "获取食品列表成功", statement.order_by(Food.id),
+                                lambda food: serialize_food(food, catalog=True))
+    try:
+        page = await paginate(session, statement, Food.id, {'name': Food.name}, request.args)
+    except PaginationError as e:
+        return error(str(e), 400)
+    return jsonify({
+        "message": "获取食品列表成功",
+        "status": "success",
+        "data": [serialize_food(food, catalog=True) for food in page.items],
+        "next_cursor": page.next_cursor
+    })
+
+# 获取所有原料（同 routes.ingredient.get_ingredients）
+async def get_ingredients(request, session, principal):
+    statement = select(Ingredient)
+    user_id = request.args.get('user_id')
+    if user_id:
+        statement = statement.filter_by(user_id=user_id)
+    if wants_stream(request):
+        return stream_json_list(session, "获取原料列表成功", statement.order_by(Ingredient.id), serialize_ingredient)
+    try:
+        page = await paginate(session, statement, Ingredient.id, {'name': Ingredient.name}, request.args)
+    except PaginationError as e:
+        return error(str(e), 400)
+    return jsonify({
+        "message": "获取原料列表成功",
+        "status": "success",
+        "data": [serialize_ingredient(ingredient) for ingredient in page.items],
+        "next_cursor": page.next_cursor
+    })
+
+# 获取合作伙伴的原料（同 routes.ingredient.get_partner_ingredients）
+async def get_partner_ingredients(request, session, principal):
+    has_partner = await session.scalar(select(select(Partnership).filter_by(user_id=principal.id).exists()))
+    if not has_partner:
+        return jsonify({
+            "message": "暂无合作伙伴的原料",
+            "status": "success",
+            "data": [],
+            "next_cursor": None
+        })
+
+    statement = select(Ingredient)\
+        .join(Partnership, and_(Partnership.user_id == principal.id,
+                                Partnership.partner_id == Ingredient.user_id))\
+        .join(User, User.id == Ingredient.user_id)\
+        .filter(User.identity == '农户')\
+        .options(contains_eager(Ingredient.user))
+    try:
+        page = await paginate(session, statement, Ingredient.id, {'name': Ingredient.name}, request.args)
+    except PaginationError as e:
+        return error(str(e), 400)
+
+    ingredient_list = []
+    for ing in page.items:
+        ingredient_info = serialize_ingredient(ing)
+        ingredient_info['farmer_name'] = ing.user.username if ing.user else "未知农户"
+        ingredient_list.append(ingredient_info)
+    return jsonify({
+        "message": "获取合作伙伴原料列表成功",
+        "status": "success",
+        "data": ingredient_list,
+        "next_cursor": page.next_cursor
+    })
+
+# 获取合作伙伴列表（同 routes.user.get_partners）
+async def get_partners(request, session, principal):
+    partners = await session.scalars(
+        select(User).join(Partnership, Partnership.partner_id == User.id).filter(Partnership.user_id == principal.id))
+    return jsonify({
+        "message": "获取合作伙伴列表成功",
+        "status": "success",
+        "data": [{
+            'id': partner.id,
+            'username': partner.username,
+            'account': partner.account,
+            'identity': partner.identity
+        } for partner in partners]
+    })
+
+# 获取收到的合作伙伴请求（同 routes.user.get_received_requests），发送者与请求一次连接查出
+async def get_received_requests(request, session, principal):
+    rows = await session.execute(
+        select(PartnerRequest, User)
+        .join(User, User.id == PartnerRequest.sender_id)
+        .filter(PartnerRequest.receiver_id == principal.id, PartnerRequest.status == 'pending')
+        .order_by(PartnerRequest.id))
+    return jsonify({
+        "message": "获取合作请求成功",
+        "status": "success",
+        "data": [{
+            'request_id': req.id,
+            'sender_id': sender.id,
+            'sender_username': sender.username,
+            'sender_account': sender.account,
+            'sender_identity': sender.identity,
+            'created_at': req.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        } for req, sender in rows]
+    })
+
+# 路径 -> (接口名, 数据版本类别, 处理函数, 必要参数, 身份要求)
+# 身份要求为 None 时不需要登录，否则为 (允许的身份, 拒绝时的消息)，允许的身份为空时任何登录用户都可以访问
+# 接口名与 Flask 端点相同，两种模式生成的ETag一致
+ROUTES = {
+    '/api/foods': ('food.get_foods', ('food', 'ingredient', 'user'), get_foods, (), None),
+    '/api/ingredients': ('ingredient.get_ingredients', ('ingredient',), get_ingredients, (), None),
+    '/api/ingredients/partners': ('ingredient.get_partner_ingredients', ('ingredient', 'partner', 'user'),
+                                  get_partner_ingredients, ('user_id',),
+                                  (('商户',), "只有商户可以查看合作伙伴的原料")),
+    '/api/user/partners': ('user.get_partners', ('partner', 'user'), get_partners, ('user_id',),
+                           ((), "无权执行此操作")),
+    '/api/user/partner/requests/received': ('user.get_received_requests', ('partner_request', 'user'),
+                                            get_received_requests, ('user_id',), ((), "无权执行此操作")),
+}
+
+async def dispatch(request, session, route):
+    endpoint, scopes, handler, required, auth = route
+    missing = [param for param in required if param not in request.args]
+    if missing:
+        return error(f"缺少必要参数: {', '.join(missing)}", 400)
+
+    principal = None
+    if auth is not None:
+        identities, forbidden = auth
+        principal, failure = await resolve_principal(session, request.bearer_token(), request.args.get('user_id'),
+                                                     identities, forbidden)
+        if failure:
+            return error(failure[1], failure[0])
+
+    # 数据版本ETag（同 utils.versioning.etag_versioned）
+    versions = await get_versions(session, *scopes)
+    etag = make_etag(endpoint, versions, request.query_string, request.view_args)
+    if parse_etags(request.headers.get('If-None-Match')).contains(etag):
+        response = AsyncResponse(b'', 304)
+        del response.headers['Content-Type']
+    else:
+        response = await handler(request, session, principal)
+        if response.status != 200:
+            return response
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# 跨域响应头（与 Flask-CORS 的配置一致）
+def allowed_origin(request):
+    origin = request.headers.get('Origin')
+    if origin is None:
+        return None
+    for pattern, options in Config.CORS_RESOURCES.items():
+        origins = options.get('origins', '*')
+        origins = [origins] if isinstance(origins, str) else origins
+        if request.path.startswith(pattern.rstrip('*')) and ('*' in origins or origin in origins):
+            return origin
+    return None
+
+async def send_response(send, request, response):
+    origin = allowed_origin(request)
+    if origin is not None:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers.add('Vary', 'Origin')
+    streamed = not isinstance(response.body, bytes)
+    if not streamed:
+        response.headers['Content-Length'] = str(len(response.body))
+    await send({
+        'type': 'http.response.start',
+        'status': response.status,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+    })
+    if not streamed:
+        await send({'type': 'http.response.body', 'body': response.body})
+        return len(response.body)
+    async for chunk in response.body:
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+    return None
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_db.dispose()
+            app_metrics.registry.flush(force=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+class AsyncApp:
+    def __init__(self, wsgi_app):
+        self.fallback = None
+        try:
+            from asgiref.wsgi import WsgiToAsgi
+            self.fallback = WsgiToAsgi(wsgi_app)
+        except ImportError:
+            logger.warning("未安装 asgiref，异步模式只提供只读接口")
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await lifespan(receive, send)
+        route = ROUTES.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if route is None:
+            if self.fallback is None:
+                request = AsyncRequest(scope)
+                return await send_response(send, request, error("异步模式下不支持该接口", 404))
+            return await self.fallback(scope, receive, send)
+
+        request = AsyncRequest(scope)
+        metrics = Config.METRICS_ENABLED
+        blueprint, endpoint = route[0].split('.')[0], route[0]
+        if metrics:
+            app_metrics.in_flight.inc(blueprint=blueprint)
+        started = time.perf_counter()
+        status, size = 500, None
+        try:
+            # 会话在响应发送完成后关闭（流式返回时边读边发送）
+            async with async_db.session() as session:
+                try:
+                    response = await dispatch(request, session, route)
+                except Exception:
+                    logger.exception("处理请求失败: %s %s", request.method, request.path)
+                    response = error("服务器内部错误", 500)
+                status = response.status
+                size = await send_response(send, request, response)
+        finally:
+            if metrics:
+                app_metrics.in_flight.dec(blueprint=blueprint)
+                app_metrics.requests.inc(blueprint=blueprint, endpoint=endpoint, method=request.method,
+                                         status=status)
+                app_metrics.duration.observe(time.perf_counter() - started, blueprint=blueprint,
+                                             endpoint=endpoint, method=request.method)
+                if status == 200 and size is not None:
+                    app_metrics.response_size.observe(size, blueprint=blueprint, endpoint=endpoint)
+                app_metrics.registry.flush()
+
+# 数据库迁移在导入时执行（多个工作进程时由结构指纹跳过重复检查）
+flask_app = create_app(with_commands=False)
+init_db(flask_app)
+app = AsyncApp(flask_app)
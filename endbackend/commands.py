@@ -0,0 +1,350 @@
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+import click
+from sqlalchemy import update, delete
+from werkzeug.datastructures import FileStorage
+from config import Config
+from models import db, User, UsernameGram, Ingredient, FoodLineage, StoredFile
+from utils.search import username_grams
+from utils.lineage import rebuild_all_lineage
+from utils.importer import ImageArchive, ImportRowError, detect_format, read_records, \
+    import_ingredients, import_foods
+from utils.exporter import ExportError, iter_export, parse_date
+from utils.file_handler import IMAGE_FOLDERS, allowed_file, store_file, retain_files, remove_from_disk
+from utils.uploads import expire_sessions
+from utils.image_variants import PILLOW_AVAILABLE, generate_variants, is_image, variant_names
+from utils.versioning import bump_versions
+from utils.migrations import MIGRATIONS, upgrade, current_version, pending_migrations, check_hot_queries, \
+    migrate_partnerships
+from utils.seed import seed_data
+from utils.benchmark import run_benchmark, compare_reports, load_report
+
+def register_commands(app):
+    # 将 user.worktogeter 中逗号分隔的合作伙伴ID迁移到 partnership 表
+    # （升级时由第3个数据库迁移自动执行，此命令用于之后再次导入旧格式数据）
+    @app.cli.command('migrate-partners')
+    def migrate_partners():
+        db.create_all()
+        
+        try:
+            with db.engine.begin() as conn:
+                migrated_users, new_rows = migrate_partnerships(conn)
+        except Exception as e:
+            raise click.ClickException(f'迁移合作伙伴失败: {str(e)}')
+        
+        click.echo(f'已迁移 {migrated_users} 个用户的 {new_rows} 条合作关系')
+    
+    # 重建全部用户的用户名搜索索引（用于已有数据的初始化）
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        db.create_all()
+        
+        try:
+            users = db.session.query(User.id, User.username).all()
+            UsernameGram.query.delete(synchronize_session=False)
+            rows = []
+            for user_id, username in users:
+                rows.extend({'gram': gram, 'user_id': user_id} for gram in username_grams(username))
+                if len(rows) >= 5000:
+                    db.session.execute(UsernameGram.__table__.insert(), rows)
+                    rows = []
+            if rows:
+                db.session.execute(UsernameGram.__table__.insert(), rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise click.ClickException(f'重建搜索索引失败: {str(e)}')
+        
+        click.echo(f'已重建 {len(users)} 个用户的搜索索引')
+    
+    # 重建全部食品的溯源记录（用于已有数据的初始化）
+    @app.cli.command('rebuild-lineage')
+    def rebuild_lineage():
+        db.create_all()
+        
+        try:
+            count = rebuild_all_lineage()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise click.ClickException(f'重建溯源记录失败: {str(e)}')
+        
+        click.echo(f'已重建 {count} 个食品的溯源记录')
+    
+    # 批量导入原料或食品（CSV/JSONL），例如：
+    # flask --app app import-data ingredients harvest.csv --user-id 3 --images photos.zip
+    @app.cli.command('import-data')
+    @click.argument('kind', type=click.Choice(['ingredients', 'foods']))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user-id', type=int, required=True, help='导入数据所属用户ID')
+    @click.option('--images', type=click.Path(exists=True, dir_okay=False), help='原料图片压缩包（zip）')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='数据格式，默认按扩展名判断')
+    @click.option('--dry-run', is_flag=True, help='只校验不写入')
+    def import_data(kind, path, user_id, images, fmt, dry_run):
+        user = db.session.get(User, user_id)
+        if not user:
+            raise click.ClickException('用户不存在')
+        if kind == 'ingredients' and user.identity != '农户':
+            raise click.ClickException('只有农户可以添加原料')
+        if kind == 'foods' and user.identity not in ['商户', '农户']:
+            raise click.ClickException('只有商户或农户可以添加食品')
+        
+        try:
+            with open(path, 'rb') as fp:
+                records = read_records(fp, detect_format(path, fmt))
+        except ImportRowError as e:
+            raise click.ClickException(str(e))
+        
+        if kind == 'ingredients':
+            archive = ImageArchive(open(images, 'rb')) if images else None
+            try:
+                report = import_ingredients(user, records, archive, dry_run=dry_run)
+            finally:
+                if archive:
+                    archive.close()
+        else:
+            report = import_foods(user, records, dry_run=dry_run)
+        
+        click.echo(json.dumps(report, ensure_ascii=False, indent=2))
+    
+    # 流式导出溯源数据，例如：
+    # flask --app app export-trace --format ndjson --start 2025-01-01 --gzip -o trace.ndjson.gz
+    @app.cli.command('export-trace')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', help='导出格式')
+    @click.option('--merchant-id', type=int, help='只导出指定商户的食品')
+    @click.option('--start', help='制作时间起（ISO格式）')
+    @click.option('--end', help='制作时间止（ISO格式）')
+    @click.option('--gzip', 'compress', is_flag=True, help='使用gzip压缩')
+    @click.option('-o', '--output', type=click.File('wb'), default='-', help='输出文件，默认标准输出')
+    def export_trace(fmt, merchant_id, start, end, compress, output):
+        try:
+            start = parse_date(start, '开始时间')
+            end = parse_date(end, '结束时间')
+        except ExportError as e:
+            raise click.ClickException(str(e))
+        
+        for chunk in iter_export(fmt, merchant_id, start, end, compress):
+            output.write(chunk)
+    
+    # 为已有图片补生成缩略图（升级后执行一次）：flask --app app generate-image-variants
+    @app.cli.command('generate-image-variants')
+    @click.option('--force', is_flag=True, help='重新生成已存在的缩略图')
+    def generate_image_variants(force):
+        if not PILLOW_AVAILABLE:
+            raise click.ClickException("未安装Pillow，无法生成缩略图")
+        
+        generated = failed = 0
+        for folder in IMAGE_FOLDERS.values():
+            for dir_path, _, names in os.walk(os.path.join(Config.STATIC_FOLDER, folder)):
+                for name in sorted(names):
+                    # 跳过缩略图本身
+                    if '@w' in name or not is_image(name):
+                        continue
+                    path = os.path.join(dir_path, name)
+                    if not force and all(os.path.exists(os.path.join(dir_path, v)) for v in variant_names(name)):
+                        continue
+                    try:
+                        generate_variants(path)
+                        generated += 1
+                    except Exception as e:
+                        failed += 1
+                        click.echo(f"{os.path.relpath(path, Config.STATIC_FOLDER)}: {str(e)}", err=True)
+        click.echo(f"已生成 {generated} 张图片的缩略图，失败 {failed} 张")
+    
+    # 将旧版平铺存储的图片迁移为按内容哈希存储，并根据原料数据重新计算引用计数；
+    # 可重复执行，也用于清理未被引用的文件：flask --app app migrate-files
+    @app.cli.command('migrate-files')
+    @click.option('--orphan-age', default=3600, help='未被引用的文件超过该秒数才删除（避免删除正在上传的文件）')
+    def migrate_files(orphan_age):
+        db.create_all()
+        
+        # 1. 旧文件按内容复制到新路径（相同内容只保存一份），不支持的文件类型保留原路径
+        mapping = {}
+        skipped = 0
+        for folder in IMAGE_FOLDERS.values():
+            folder_path = os.path.join(Config.STATIC_FOLDER, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in sorted(os.listdir(folder_path)):
+                path = os.path.join(folder_path, name)
+                if not os.path.isfile(path) or name.startswith('.') or '@' in name:
+                    continue
+                if not allowed_file(name):
+                    skipped += 1
+                    continue
+                with open(path, 'rb') as fp:
+                    mapping[f"/{folder}/{name}"] = store_file(FileStorage(stream=fp, filename=name), folder)
+        
+        # 2. 更新原料和溯源记录中的图片路径，并重新计算引用计数
+        try:
+            for field in IMAGE_FOLDERS:
+                for model in (Ingredient, FoodLineage):
+                    column = getattr(model, field)
+                    for old, new in mapping.items():
+                        db.session.execute(update(model).where(column == old).values({field: new}))
+            
+            counts = Counter()
+            for row in db.session.query(*(getattr(Ingredient, field) for field in IMAGE_FOLDERS)):
+                counts.update(path for path in row if path)
+            db.session.execute(delete(StoredFile))
+            db.session.flush()
+            retain_files(counts.elements())
+            bump_versions('ingredient', 'food')
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise click.ClickException(f"迁移失败: {str(e)}")
+        
+        # 3. 删除旧文件及其缩略图，以及未被引用的文件
+        for old in mapping:
+            remove_from_disk(old)
+        removed = 0
+        deadline = time.time() - orphan_age
+        for folder in IMAGE_FOLDERS.values():
+            for dir_path, _, names in os.walk(os.path.join(Config.STATIC_FOLDER, folder)):
+                for name in names:
+                    path = os.path.join(dir_path, name)
+                    url = '/' + os.path.relpath(path, Config.STATIC_FOLDER).replace(os.sep, '/')
+                    # 缩略图和失败标记随原图删除
+                    if '@' in name or url in counts or os.path.getmtime(path) > deadline:
+                        continue
+                    remove_from_disk(url)
+                    removed += 1
+        click.echo(f"已迁移 {len(mapping)} 个文件，跳过不支持的文件 {skipped} 个，"
+                   f"当前共 {len(counts)} 个文件被引用，删除未引用文件 {removed} 个")
+    
+    # 清理超过保留时间（UPLOAD_SESSION_TTL）的分片上传会话，建议定时执行：flask --app app clean-uploads
+    @app.cli.command('clean-uploads')
+    def clean_uploads():
+        db.create_all()
+        try:
+            removed = expire_sessions()
+        except Exception as e:
+            db.session.rollback()
+            raise click.ClickException(f"清理失败: {str(e)}")
+        click.echo(f"已清理 {removed} 个过期的上传会话")
+    
+    # 本地测试读写分离：把SQLite主库复制到各个SQLite副本（生产环境由数据库自身复制）
+    @app.cli.command('sync-sqlite-replicas')
+    def sync_sqlite_replicas():
+        primary = db.engine.url
+        replicas = [db.engines[key].url for key in sorted(app.config.get('SQLALCHEMY_BINDS') or {})]
+        if primary.get_backend_name() != 'sqlite' or any(url.get_backend_name() != 'sqlite' for url in replicas):
+            raise click.ClickException("仅支持SQLite主库和副本")
+        if not replicas:
+            raise click.ClickException("未配置副本（DATABASE_REPLICA_URLS）")
+        
+        source = sqlite3.connect(primary.database)
+        try:
+            for url in replicas:
+                target = sqlite3.connect(url.database)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                click.echo(f"已同步到 {url.database}")
+        finally:
+            source.close()
+    
+    # 执行未执行的数据库迁移：flask --app app db-upgrade
+    @app.cli.command('db-upgrade')
+    @click.option('--target', type=int, help='只升级到指定版本')
+    def db_upgrade(target):
+        db.create_all()
+        try:
+            applied = upgrade(target)
+        except Exception as e:
+            raise click.ClickException(f"迁移失败: {str(e)}")
+        for version, name in applied:
+            click.echo(f"已执行迁移 {version}: {name}")
+        click.echo(f"当前数据库版本: {current_version()}")
+    
+    # 查看数据库版本和未执行的迁移
+    @app.cli.command('db-status')
+    def db_status():
+        db.create_all()
+        click.echo(f"当前数据库版本: {current_version()}（最新 {MIGRATIONS[-1][0]}）")
+        for version, name, _ in pending_migrations():
+            click.echo(f"未执行: {version} {name}")
+    
+    # 用 EXPLAIN 检查热点查询是否使用索引，有查询未使用索引时返回非0退出码
+    @app.cli.command('db-check-indexes')
+    def db_check_indexes():
+        try:
+            results = check_hot_queries()
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for name, uses_index, plan in results:
+            click.echo(f"[{'OK' if uses_index else '未使用索引'}] {name}")
+            for line in plan:
+                click.echo(f"    {line}")
+        missing = [name for name, uses_index, _ in results if not uses_index]
+        if missing:
+            raise click.ClickException(f"以下查询未使用索引: {', '.join(missing)}")
+    
+    # 生成压测数据：flask --app app seed-data --farmers 200 --merchants 50
+    @app.cli.command('seed-data')
+    @click.option('--farmers', default=50, show_default=True, help='农户数量')
+    @click.option('--merchants', default=20, show_default=True, help='商户数量')
+    @click.option('--consumers', default=20, show_default=True, help='消费者数量')
+    @click.option('--ingredients-per-farmer', default=20, show_default=True, help='每个农户的原料数量')
+    @click.option('--foods-per-merchant', default=30, show_default=True, help='每个商户的食品数量')
+    @click.option('--ingredients-per-food', default=5, show_default=True, help='每个食品的原料数量')
+    @click.option('--partner-density', default=0.3, show_default=True, help='商户与农户建立合作的概率')
+    @click.option('--request-density', default=0.05, show_default=True, help='待处理合作请求的概率')
+    @click.option('--seed', default=42, show_default=True, help='随机种子')
+    @click.option('--prefix', default='seed', show_default=True, help='用户名、账号前缀')
+    def seed_data_command(farmers, merchants, consumers, ingredients_per_farmer, foods_per_merchant,
+                          ingredients_per_food, partner_density, request_density, seed, prefix):
+        db.create_all()
+        start = time.perf_counter()
+        try:
+            counts = seed_data(farmers, merchants, consumers, ingredients_per_farmer, foods_per_merchant,
+                               ingredients_per_food, partner_density, request_density, seed, prefix)
+        except ValueError as e:
+            db.session.rollback()
+            raise click.ClickException(str(e))
+        except Exception as e:
+            db.session.rollback()
+            raise click.ClickException(f"生成数据失败: {str(e)}")
+        for name, count in counts.items():
+            click.echo(f"{name}: {count}")
+        click.echo(f"耗时 {time.perf_counter() - start:.1f} 秒")
+    
+    # 接口基准测试：flask --app app benchmark --output report.json --compare baseline.json
+    # 与基线相比出现退化时返回非0退出码，可用于CI
+    @app.cli.command('benchmark')
+    @click.option('--iterations', default=20, show_default=True, help='每个场景的顺序执行次数')
+    @click.option('--concurrency', default=8, show_default=True, help='并发压测的线程数')
+    @click.option('--duration', default=10.0, show_default=True, help='并发压测时长（秒），0表示跳过')
+    @click.option('--writes', is_flag=True, help='并发压测包含写入场景')
+    @click.option('--cold', is_flag=True, help='每次请求前清空目录缓存')
+    @click.option('--seed', default=1, show_default=True, help='随机种子')
+    @click.option('--output', type=click.Path(dir_okay=False), help='报告输出文件（JSON）')
+    @click.option('--compare', type=click.Path(exists=True, dir_okay=False), help='基线报告文件')
+    @click.option('--threshold', default=0.2, show_default=True, help='p95 延迟允许增加的比例')
+    def benchmark(iterations, concurrency, duration, writes, cold, seed, output, compare, threshold):
+        report = run_benchmark(app, iterations, concurrency, duration, writes, cold, seed)
+        
+        click.echo(f"{'接口':<40}{'次数':>6}{'错误':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'SQL':>8}")
+        for name, item in report['sequential'].items():
+            click.echo(f"{name:<40}{item['count']:>6}{item['errors']:>6}{item['p50_ms']:>10}"
+                       f"{item['p95_ms']:>10}{item['p99_ms']:>10}{item['sql_mean']:>8}")
+        load = report['load']
+        click.echo(f"并发 {concurrency} 线程 {load['wall_time']} 秒: {load['requests']} 次请求, "
+                   f"{load['errors']} 次错误, {load['throughput_rps']} 次/秒")
+        
+        if output:
+            with open(output, 'w', encoding='utf-8') as fp:
+                json.dump(report, fp, ensure_ascii=False, indent=2)
+            click.echo(f"报告已写入 {output}")
+        if compare:
+            regressions = compare_reports(report, load_report(compare), threshold)
+            for line in regressions:
+                click.echo(f"退化: {line}")
+            if regressions:
+                raise click.ClickException(f"与基线相比有 {len(regressions)} 项退化")
+            click.echo("与基线相比未发现退化")
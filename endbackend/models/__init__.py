@@ -1,9 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
+from .routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # 导入所有模型以便在创建表时被识别
 from .user import User
-from .food import Food, food_ingredient
+from .food import Food, FoodIngredient, food_ingredient
 from .ingredient import Ingredient
-from .partner_request import PartnerRequest
\ No newline at end of file
+from .partner_request import PartnerRequest
+from .partnership import Partnership
+from .username_gram import UsernameGram
+from .food_lineage import FoodLineage
+from .data_version import DataVersion
+from .stored_file import StoredFile
+from .upload_session import UploadSession
+from .schema_version import SchemaVersion, SchemaState
\ No newline at end of file
@@ -0,0 +1,8 @@
+from . import db
+
+# 数据版本号：每类数据写入时在同一事务中递增，用于生成ETag和缓存键
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+    
+    scope = db.Column(db.String(50), primary_key=True)  # 数据类别，如 food、ingredient
+    version = db.Column(db.BigInteger, nullable=False, default=0)
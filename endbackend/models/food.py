@@ -1,11 +1,23 @@
 from . import db
 
-# 食品-原料关联表
-food_ingredient = db.Table('food_ingredient',
-    db.Column('food_id', db.Integer, db.ForeignKey('food.id'), primary_key=True),
-    db.Column('ingredient_id', db.Integer, db.ForeignKey('ingredient.id'), primary_key=True),
-    db.Column('amount', db.String(50))
-)
+# 食品-原料关联（关联对象，携带用量字段）
+class FoodIngredient(db.Model):
+    __tablename__ = 'food_ingredient'
+    
+    food_id = db.Column(db.Integer, db.ForeignKey('food.id'), primary_key=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), primary_key=True)
+    amount = db.Column(db.String(50))
+    
+    # 主键以 food_id 开头，按原料查关联（删除/修改原料时）需要单独的索引
+    __table_args__ = (
+        db.Index('ix_food_ingredient_ingredient_id', 'ingredient_id'),
+    )
+    
+    # 建立与Ingredient的关系
+    ingredient = db.relationship('Ingredient', backref=db.backref('food_links', lazy='dynamic'))
+
+# 保留原关联表名称，供直接操作关联表的代码使用
+food_ingredient = FoodIngredient.__table__
 
 class Food(db.Model):
     __tablename__ = 'food'
@@ -18,11 +30,11 @@ class Food(db.Model):
     num = db.Column(db.Integer, nullable=False, default=0)
     category = db.Column(db.String(255))  # 食品种类，以中文逗号分隔
     cooking_time = db.Column(db.DateTime)  # 制作时间
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     
     # 建立与User的关系
     user = db.relationship('User', backref=db.backref('foods', lazy=True))
     
-    # 建立与Ingredient的多对多关系
-    ingredients = db.relationship('Ingredient', secondary=food_ingredient,
-                                 backref=db.backref('foods', lazy='dynamic'))
\ No newline at end of file
+    # 建立与原料的关联（关联对象，可直接读取用量）
+    ingredients = db.relationship('FoodIngredient', backref='food',
+                                  cascade='all, delete-orphan')
\ No newline at end of file
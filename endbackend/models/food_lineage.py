@@ -0,0 +1,21 @@
+from . import db
+
+# 食品溯源链路：每行对应食品中的一种原料，冗余保存原料与农户信息，
+# 查询溯源时按 food_id 一次取出，无需逐层关联查询
+class FoodLineage(db.Model):
+    __tablename__ = 'food_lineage'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    food_id = db.Column(db.Integer, db.ForeignKey('food.id'), nullable=False, index=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), nullable=False, index=True)
+    amount = db.Column(db.String(50))
+    ingredient_name = db.Column(db.String(100))
+    ingredient_type = db.Column(db.String(255))
+    farming_time = db.Column(db.DateTime)  # 养殖/种植时间
+    production_time = db.Column(db.DateTime)  # 出产时间
+    planting_image = db.Column(db.String(255))
+    growing_image = db.Column(db.String(255))
+    production_image = db.Column(db.String(255))
+    quality_report_image = db.Column(db.String(255))
+    farmer_id = db.Column(db.Integer, index=True)
+    farmer_name = db.Column(db.String(50))
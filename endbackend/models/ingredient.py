@@ -14,7 +14,7 @@ class Ingredient(db.Model):
     production_image = db.Column(db.String(255))  # 出产图片路径
     quality_report_image = db.Column(db.String(255))  # 质检报告图片路径
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # 添加用户外键
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)  # 添加用户外键
     
     # 建立与User的关系
     user = db.relationship('User', backref=db.backref('ingredients', lazy=True))
\ No newline at end of file
@@ -11,6 +11,12 @@ class PartnerRequest(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     
+    # 按接收者查待处理请求、按发送者和接收者查重复请求
+    __table_args__ = (
+        db.Index('ix_partner_request_receiver_status', 'receiver_id', 'status'),
+        db.Index('ix_partner_request_sender_receiver_status', 'sender_id', 'receiver_id', 'status'),
+    )
+    
     # 关系
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_requests')
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_requests')
\ No newline at end of file
@@ -0,0 +1,15 @@
+from . import db
+from datetime import datetime
+
+# 合作关系：每行表示 user_id 将 partner_id 列为合作伙伴
+class Partnership(db.Model):
+    __tablename__ = 'partnership'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    partner_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    # 主键 (user_id, partner_id) 用于按用户查合作伙伴，反向索引用于按合作伙伴查用户
+    __table_args__ = (
+        db.Index('ix_partnership_partner_user', 'partner_id', 'user_id'),
+    )
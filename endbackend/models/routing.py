@@ -0,0 +1,16 @@
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+
+# 读写分离的会话：请求开始时若选定了只读副本（g.db_replica），查询发往副本；
+# 写语句、flush 以及之后的所有语句都发往主库
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None:
+                is_write = self._flushing or (clause is not None and getattr(clause, 'is_dml', False))
+                if not is_write and not (self.new or self.dirty or self.deleted):
+                    return replica
+                # 本次请求发生写入后不再使用副本，保证读到自己的写入
+                g.db_replica = None
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
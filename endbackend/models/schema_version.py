@@ -0,0 +1,18 @@
+from . import db
+from datetime import datetime
+
+# 已执行的数据库迁移（见 utils/migrations.py）
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.now)
+
+# 数据库结构状态（键值），如启动时用于比较的结构指纹
+class SchemaState(db.Model):
+    __tablename__ = 'schema_state'
+    
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(255), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
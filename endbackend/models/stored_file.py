@@ -0,0 +1,12 @@
+from . import db
+from datetime import datetime
+
+# 已存储的上传文件：按内容哈希寻址，相同内容只存一份，ref_count 为引用该文件的记录数
+class StoredFile(db.Model):
+    __tablename__ = 'stored_file'
+    
+    path = db.Column(db.String(255), primary_key=True)  # 访问路径，如 /in/ab/cd/<sha256>.jpg
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    size = db.Column(db.BigInteger, nullable=False, default=0)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.now)
@@ -0,0 +1,17 @@
+from . import db
+from datetime import datetime
+
+# 分片上传会话：分片文件保存在 UPLOAD_FOLDER/<id>/ 下，全部上传后合并，
+# 创建或修改原料时通过会话ID引用合并后的文件
+class UploadSession(db.Model):
+    __tablename__ = 'upload_session'
+    
+    id = db.Column(db.String(32), primary_key=True)  # 随机生成，同时作为访问凭证
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    folder = db.Column(db.String(50), nullable=False)  # 图片存储目录，如 in、grow
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    part_size = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), default='uploading')  # uploading, completed
+    sha256 = db.Column(db.String(64))  # 合并完成后的内容哈希
+    created_at = db.Column(db.DateTime, default=datetime.now)
@@ -8,7 +8,13 @@ class User(db.Model):
     account = db.Column(db.String(50), nullable=False, unique=True)
     password = db.Column(db.String(128), nullable=False)
     identity = db.Column(db.Enum('消费者', '商户', '农户'), nullable=False)
-    worktogeter = db.Column(db.String(255))  # 添加合作伙伴字段，存储以逗号分隔的ID
+    worktogeter = db.Column(db.String(255))  # 旧合作伙伴字段（逗号分隔的ID），已迁移至partnership表，仅供迁移读取（utils/migrations.py）
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 递增后已签发的登录令牌失效
+    
+    # 按身份筛选并按用户名排序/查找
+    __table_args__ = (
+        db.Index('ix_user_identity_username', 'identity', 'username'),
+    )
     
     def verify_password(self, password):
         return self.password == password  # 直接比较明文密码
\ No newline at end of file
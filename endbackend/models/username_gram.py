@@ -0,0 +1,13 @@
+from . import db
+
+# 用户名n-gram索引：每个用户名拆分为长度1~3的小写片段，用于子串搜索
+class UsernameGram(db.Model):
+    __tablename__ = 'username_gram'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    gram = db.Column(db.String(3), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_username_gram_gram_user', 'gram', 'user_id'),
+    )
@@ -5,9 +5,19 @@ def register_routes(app):
     from .ingredient import ingredient_bp
     from .food import food_bp
     from .static import static_bp
+    from .admin import admin_bp
+    from .data_import import import_bp
+    from .export import export_bp
+    from .upload import upload_bp
+    from .metrics import metrics_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(user_bp)
     app.register_blueprint(ingredient_bp)
     app.register_blueprint(food_bp)
-    app.register_blueprint(static_bp)
\ No newline at end of file
+    app.register_blueprint(static_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(import_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(upload_bp)
+    app.register_blueprint(metrics_bp)
\ No newline at end of file
@@ -0,0 +1,78 @@
+from flask import Blueprint, jsonify, request, send_file
+from werkzeug.security import safe_join
+import os
+from utils.cache import catalog_cache, image_cache
+from utils.decorators import admin_required
+from utils.db_routing import replica_router
+from utils.sql_profiler import query_profiler
+from utils.profiler import PROFILE_NAME, list_profiles, profile_folder, read_collapsed, to_speedscope
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+# 获取目录缓存统计信息（命中、未命中、合并等待次数）
+@admin_bp.route('/cache', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    return jsonify({
+        "message": "获取缓存统计成功",
+        "status": "success",
+        "data": catalog_cache.stats()
+    })
+
+# 获取图片内存缓存统计信息（命中、未命中、已缓存字节数）
+@admin_bp.route('/image-cache', methods=['GET'])
+@admin_required
+def get_image_cache_stats():
+    return jsonify({
+        "message": "获取图片缓存统计成功",
+        "status": "success",
+        "data": image_cache.stats()
+    })
+
+# 获取只读副本的健康状态
+@admin_bp.route('/replicas', methods=['GET'])
+@admin_required
+def get_replica_stats():
+    return jsonify({
+        "message": "获取副本状态成功",
+        "status": "success",
+        "data": replica_router.stats()
+    })
+
+# 获取各接口的SQL统计（抽样请求的平均语句数、疑似N+1次数）及最近的慢请求
+@admin_bp.route('/sql-profile', methods=['GET'])
+@admin_required
+def get_sql_profile():
+    return jsonify({
+        "message": "获取SQL统计成功",
+        "status": "success",
+        "data": query_profiler.stats()
+    })
+
+# 最近的请求性能分析文件
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def get_profiles():
+    return jsonify({
+        "message": "获取性能分析列表成功",
+        "status": "success",
+        "data": list_profiles()
+    })
+
+# 下载性能分析文件：format=collapsed（默认，折叠栈文本）或 speedscope（JSON）
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def download_profile(profile_id):
+    path = safe_join(profile_folder(), profile_id)
+    if not PROFILE_NAME.fullmatch(profile_id) or path is None or not os.path.isfile(path):
+        return jsonify({"message": "性能分析文件不存在", "status": "error"}), 404
+    
+    fmt = request.args.get('format', 'collapsed')
+    if fmt == 'speedscope':
+        name = profile_id[:-len('.collapsed')]
+        response = jsonify(to_speedscope(name, read_collapsed(path)))
+        response.headers['Content-Disposition'] = f'attachment; filename={name}.speedscope.json'
+        return response
+    if fmt != 'collapsed':
+        return jsonify({"message": "不支持的格式", "status": "error"}), 400
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=profile_id)
@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
+from config import Config
 from models import db, User
 from utils.decorators import validate_params
+from utils.search import index_username
+from utils.versioning import bump_versions
+from utils.tokens import issue_token
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -36,6 +40,10 @@ def register():
     
     try:
         db.session.add(new_user)
+        db.session.flush()
+        # 建立用户名搜索索引
+        index_username(new_user.id, new_user.username)
+        bump_versions('user')
         db.session.commit()
         return jsonify({
             "message": "注册成功", 
@@ -67,7 +75,9 @@ def login():
                 "id": user.id,
                 "username": user.username,
                 "account": user.account,
-                "identity": user.identity
+                "identity": user.identity,
+                "token": issue_token(user),
+                "expires_in": Config.TOKEN_MAX_AGE
             }
         })
     
@@ -0,0 +1,66 @@
+from flask import Blueprint, request, jsonify, g
+from utils.importer import ImageArchive, ImportRowError, detect_format, read_records, \
+    import_ingredients, import_foods
+from utils.tokens import principal_required
+
+import_bp = Blueprint('import', __name__, url_prefix='/api/import')
+
+# 读取上传的数据文件（CSV或JSONL）
+def _read_upload():
+    if 'file' not in request.files or not request.files['file'].filename:
+        raise ImportRowError("缺少导入文件")
+    upload = request.files['file']
+    fmt = detect_format(upload.filename, request.form.get('format'))
+    return read_records(upload.stream, fmt)
+
+def _dry_run():
+    return request.form.get('dry_run') in ('1', 'true')
+
+# 批量导入原料（表单提交：user_id、file，可选 images 图片压缩包、dry_run）
+@import_bp.route('/ingredients', methods=['POST'])
+@principal_required('农户', forbidden="只有农户可以添加原料")
+def bulk_import_ingredients():
+    user = g.principal
+    
+    try:
+        records = _read_upload()
+        images = None
+        if 'images' in request.files and request.files['images'].filename:
+            images = ImageArchive(request.files['images'].stream)
+    except ImportRowError as e:
+        return jsonify({"message": str(e), "status": "error"}), 400
+    except Exception as e:
+        return jsonify({"message": f"读取导入文件失败: {str(e)}", "status": "error"}), 400
+    
+    try:
+        report = import_ingredients(user, records, images, dry_run=_dry_run())
+    finally:
+        if images:
+            images.close()
+    
+    return jsonify({
+        "message": "导入原料完成",
+        "status": "success",
+        "data": report
+    })
+
+# 批量导入食品（表单提交：user_id、file，可选 dry_run）
+@import_bp.route('/foods', methods=['POST'])
+@principal_required('商户', '农户', forbidden="只有商户或农户可以添加食品")
+def bulk_import_foods():
+    user = g.principal
+    
+    try:
+        records = _read_upload()
+    except ImportRowError as e:
+        return jsonify({"message": str(e), "status": "error"}), 400
+    except Exception as e:
+        return jsonify({"message": f"读取导入文件失败: {str(e)}", "status": "error"}), 400
+    
+    report = import_foods(user, records, dry_run=_dry_run())
+    
+    return jsonify({
+        "message": "导入食品完成",
+        "status": "success",
+        "data": report
+    })
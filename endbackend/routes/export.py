@@ -0,0 +1,32 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from utils.decorators import admin_required
+from utils.exporter import ExportError, iter_export, parse_date
+
+export_bp = Blueprint('export', __name__, url_prefix='/api/export')
+
+# 流式导出溯源数据（食品→原料→农户），供监管部门审计
+# 参数：format=csv|ndjson，merchant_id，start/end（制作时间范围），gzip=1
+@export_bp.route('/trace', methods=['GET'])
+@admin_required
+def export_trace():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"message": "仅支持csv或ndjson格式", "status": "error"}), 400
+    
+    try:
+        start = parse_date(request.args.get('start'), '开始时间')
+        end = parse_date(request.args.get('end'), '结束时间')
+    except ExportError as e:
+        return jsonify({"message": str(e), "status": "error"}), 400
+    
+    compress = request.args.get('gzip') in ('1', 'true')
+    filename = f"trace_export.{fmt}" + ('.gz' if compress else '')
+    if compress:
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    
+    chunks = iter_export(fmt, request.args.get('merchant_id'), start, end, compress)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
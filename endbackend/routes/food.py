@@ -1,100 +1,102 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 import datetime
-from models import db, Food, Ingredient, User, food_ingredient
+from sqlalchemy import and_, insert
+from sqlalchemy.orm import joinedload
+from models import db, Food, FoodIngredient, Ingredient, User, Partnership, FoodLineage
 from utils.decorators import validate_params
+from utils.versioning import bump_versions, etag_versioned
+from utils.cache import catalog_cache, cached_response
+from utils.pagination import paginate_query, PaginationError
+from utils.serializers import food_catalog_query, serialize_food, serialize_trace
+from utils.streaming import stream_json_list, wants_stream
+from utils.lineage import rebuild_food_lineage, delete_food_lineage
+from utils.tokens import principal_required
 
 food_bp = Blueprint('food', __name__, url_prefix='/api/foods')
 
+# 原料ID转为整数（无法转换时返回None）
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+# 解析请求中的原料列表：一次 IN 查询验证原料是否存在；
+# partner_owner_id 不为空时同时验证原料是否来自该商户的合作农户。
+# 返回 (关联记录列表, 错误响应)，不存在的原料直接忽略，同一原料只保留第一条
+def _resolve_ingredients(items, partner_owner_id=None):
+    amounts = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        ingredient_id = _to_int(item.get('id'))
+        if ingredient_id and ingredient_id not in amounts:
+            amounts[ingredient_id] = item.get('amount', '')
+    if not amounts:
+        return [], None
+    
+    query = db.session.query(Ingredient.id, Ingredient.name, User.identity)\
+        .outerjoin(User, User.id == Ingredient.user_id)
+    if partner_owner_id is not None:
+        query = query.add_columns(Partnership.partner_id)\
+            .outerjoin(Partnership, and_(Partnership.user_id == partner_owner_id,
+                                         Partnership.partner_id == Ingredient.user_id))
+    found = {row.id: row for row in query.filter(Ingredient.id.in_(list(amounts)))}
+    
+    links = []
+    for ingredient_id, amount in amounts.items():
+        row = found.get(ingredient_id)
+        if not row:
+            continue
+        # 检查原料是否来自合作伙伴
+        if partner_owner_id is not None and (row.identity != '农户' or row.partner_id is None):
+            return None, (jsonify({
+                "message": f"原料 '{row.name}' 不是来自您的合作伙伴，无法添加", 
+                "status": "error"
+            }), 403)
+        links.append({'ingredient_id': ingredient_id, 'amount': amount})
+    return links, None
+
+# 批量写入食品的原料关联（多行INSERT一条语句），replace=True时先清除原有关联
+def _write_ingredient_links(food_id, links, replace=False):
+    if replace:
+        FoodIngredient.query.filter_by(food_id=food_id).delete(synchronize_session=False)
+    if links:
+        db.session.execute(insert(FoodIngredient), [dict(link, food_id=food_id) for link in links])
+
 # 获取所有食品
 @food_bp.route('', methods=['GET'])
+@etag_versioned('food', 'ingredient', 'user')
+@cached_response(catalog_cache, unless=wants_stream)
 def get_foods():
-    foods = Food.query.all()
-    food_list = []
+    # 流式返回完整目录
+    if wants_stream():
+        return stream_json_list("获取食品列表成功", food_catalog_query().order_by(Food.id),
+                                lambda food: serialize_food(food, catalog=True))
     
-    for food in foods:
-        # 获取食品制作商户信息
-        user = User.query.get(food.user_id)
-        merchant_name = user.username if user else "未知商户"
-        
-        # 获取原材料信息，包含农户信息
-        ingredients_info = []
-        for ingredient in food.ingredients:
-            # 获取原料的农户信息
-            ingredient_user = User.query.get(ingredient.user_id)
-            farmer_name = ingredient_user.username if ingredient_user else "未知农户"
-            
-            ingredients_info.append({
-                'id': ingredient.id,
-                'name': ingredient.name,
-                'type': ingredient.type,
-                'description': ingredient.description,
-                'farming_time': ingredient.farming_time.isoformat() if ingredient.farming_time else None,
-                'production_time': ingredient.production_time.isoformat() if ingredient.production_time else None,
-                'planting_image': ingredient.planting_image,
-                'growing_image': ingredient.growing_image,
-                'production_image': ingredient.production_image,
-                'quality_report_image': ingredient.quality_report_image,
-                'farmer_name': farmer_name,
-                'amount': db.session.query(food_ingredient.c.amount)\
-                    .filter(food_ingredient.c.food_id == food.id,
-                            food_ingredient.c.ingredient_id == ingredient.id)\
-                    .scalar() or ''
-            })
-        
-        food_list.append({
-            'id': food.id,
-            'name': food.name,
-            'prise': float(food.prise),
-            'info': food.info,
-            'poundage': food.poundage,
-            'num': food.num,
-            'category': food.category,
-            'cooking_time': food.cooking_time.isoformat() if food.cooking_time else None,
-            'user_id': food.user_id,
-            'merchant_name': merchant_name,
-            'ingredients': ingredients_info
-        })
+    try:
+        page = paginate_query(food_catalog_query(), Food.id, {'name': Food.name})
+    except PaginationError as e:
+        return jsonify({"message": str(e), "status": "error"}), 400
+    food_list = [serialize_food(food, catalog=True) for food in page.items]
     
     return jsonify({
         "message": "获取食品列表成功",
         "status": "success",
-        "data": food_list
+        "data": food_list,
+        "next_cursor": page.next_cursor
     })
 
 # 获取用户的食品列表
 @food_bp.route('/user', methods=['GET'])
+@etag_versioned('food', 'ingredient')
 def get_user_foods():
     user_id = request.args.get('user_id')
     if not user_id:
         return jsonify({"message": "缺少用户ID", "status": "error"}), 400
     
-    foods = Food.query.filter_by(user_id=user_id).all()
-    food_list = []
-    
-    for food in foods:
-        # 获取食品的原料信息
-        ingredients = [{
-            'id': ingredient.id,
-            'name': ingredient.name,
-            'description': ingredient.description,
-            'amount': db.session.query(food_ingredient.c.amount)\
-                      .filter(food_ingredient.c.food_id == food.id, 
-                              food_ingredient.c.ingredient_id == ingredient.id)\
-                      .scalar() or ''
-        } for ingredient in food.ingredients]
-        
-        food_list.append({
-            'id': food.id,
-            'name': food.name,
-            'prise': float(food.prise),
-            'info': food.info,
-            'poundage': food.poundage,
-            'num': food.num,
-            'category': food.category,
-            'cooking_time': food.cooking_time.isoformat() if food.cooking_time else None,
-            'user_id': food.user_id,
-            'ingredients': ingredients
-        })
+    foods = food_catalog_query(Food.query.filter_by(user_id=user_id)).all()
+    food_list = [serialize_food(food) for food in foods]
     
     return jsonify({
         "message": "获取食品列表成功",
@@ -105,15 +107,10 @@ def get_user_foods():
 # 添加食品
 @food_bp.route('', methods=['POST'])
 @validate_params(['name', 'prise', 'poundage', 'num', 'user_id'])
+@principal_required('商户', '农户', forbidden="只有商户或农户可以添加食品")
 def add_food():
     data = request.get_json()
-    
-    # 验证用户是否存在且是商户或农户
-    user = User.query.get(data['user_id'])
-    if not user:
-        return jsonify({"message": "用户不存在", "status": "error"}), 404
-    if user.identity not in ['商户', '农户']:
-        return jsonify({"message": "只有商户或农户可以添加食品", "status": "error"}), 403
+    user = g.principal
     
     # 验证价格是否为正数
     try:
@@ -148,88 +145,36 @@ def add_food():
         num=num,
         category=data.get('category', ''),
         cooking_time=cooking_time,
-        user_id=data['user_id']
+        user_id=user.id
     )
     
-    # 处理原料关联
+    # 处理原料关联（商户只能使用合作伙伴的原料，农户可以添加任何原料）
+    links = []
     if 'ingredients' in data and isinstance(data['ingredients'], list):
-        # 如果是商户，验证所选原料是否来自合作伙伴
-        if user.identity == '商户':
-            # 获取合作伙伴ID列表
-            partner_ids = []
-            if user.worktogeter:
-                partner_ids = [int(id) for id in user.worktogeter.split(',')]
-            
-            for ingredient_data in data['ingredients']:
-                ingredient_id = ingredient_data.get('id')
-                if ingredient_id:
-                    ingredient = Ingredient.query.get(ingredient_id)
-                    if not ingredient:
-                        continue
-                    
-                    # 检查原料是否来自合作伙伴
-                    ingredient_user = User.query.get(ingredient.user_id)
-                    if not ingredient_user or ingredient_user.identity != '农户' or ingredient.user_id not in partner_ids:
-                        return jsonify({
-                            "message": f"原料 '{ingredient.name}' 不是来自您的合作伙伴，无法添加", 
-                            "status": "error"
-                        }), 403
-                    
-                    new_food.ingredients.append(ingredient)
-        else:
-            # 农户可以添加任何原料
-            for ingredient_data in data['ingredients']:
-                ingredient_id = ingredient_data.get('id')
-                if ingredient_id:
-                    ingredient = Ingredient.query.get(ingredient_id)
-                    if ingredient:
-                        new_food.ingredients.append(ingredient)
+        links, error = _resolve_ingredients(
+            data['ingredients'], partner_owner_id=user.id if user.identity == '商户' else None)
+        if error:
+            return error
     
+    # 食品、原料关联、溯源记录在同一事务中写入
     try:
         db.session.add(new_food)
+        db.session.flush()
+        food_id = new_food.id
+        _write_ingredient_links(food_id, links)
+        # 同步溯源记录
+        rebuild_food_lineage([food_id])
+        bump_versions('food')
         db.session.commit()
+        catalog_cache.invalidate()
         
-        # 设置原料用量
-        if 'ingredients' in data and isinstance(data['ingredients'], list):
-            for ingredient_data in data['ingredients']:
-                ingredient_id = ingredient_data.get('id')
-                amount = ingredient_data.get('amount', '')
-                if ingredient_id:
-                    # 更新关联表中的用量
-                    db.session.execute(
-                        food_ingredient.update()
-                        .where(food_ingredient.c.food_id == new_food.id)
-                        .where(food_ingredient.c.ingredient_id == ingredient_id)
-                        .values(amount=amount)
-                    )
-            db.session.commit()
-        
-        # 获取食品的原料信息用于返回
-        ingredients = [{
-            'id': ingredient.id,
-            'name': ingredient.name,
-            'description': ingredient.description,
-            'amount': db.session.query(food_ingredient.c.amount)\
-                      .filter(food_ingredient.c.food_id == new_food.id, 
-                              food_ingredient.c.ingredient_id == ingredient.id)\
-                      .scalar() or ''
-        } for ingredient in new_food.ingredients]
+        # 使用统一的加载器获取食品及原料信息用于返回
+        food = food_catalog_query(Food.query.filter_by(id=food_id)).first()
         
         return jsonify({
             "message": "添加食品成功", 
             "status": "success",
-            "data": {
-                "id": new_food.id,
-                "name": new_food.name,
-                "prise": float(new_food.prise),
-                "info": new_food.info,
-                "poundage": new_food.poundage,
-                "num": new_food.num,
-                "category": new_food.category,
-                "cooking_time": new_food.cooking_time.isoformat() if new_food.cooking_time else None,
-                "user_id": new_food.user_id,
-                "ingredients": ingredients
-            }
+            "data": serialize_food(food)
         })
     except Exception as e:
         db.session.rollback()
@@ -237,23 +182,26 @@ def add_food():
 
 # 删除食品
 @food_bp.route('/<int:food_id>', methods=['DELETE'])
+@principal_required()
 def delete_food(food_id):
     food = Food.query.get(food_id)
     if not food:
         return jsonify({"message": "食品不存在", "status": "error"}), 404
     
     # 验证用户权限（只有食品的创建者可以删除）
-    user_id = request.args.get('user_id')
-    if not user_id or int(user_id) != food.user_id:
+    if g.principal.id != food.user_id:
         return jsonify({"message": "无权限删除此食品", "status": "error"}), 403
     
     try:
         # 删除食品与原料的关联
         food.ingredients = []
         
-        # 删除食品
+        # 删除食品及其溯源记录
+        delete_food_lineage(food.id)
         db.session.delete(food)
+        bump_versions('food')
         db.session.commit()
+        catalog_cache.invalidate()
         
         return jsonify({
             "message": "删除食品成功", 
@@ -266,16 +214,17 @@ def delete_food(food_id):
 # 修改食品
 @food_bp.route('/<int:food_id>', methods=['PUT'])
 @validate_params(['name', 'prise', 'poundage', 'num'])
+@principal_required()
 def update_food(food_id):
     data = request.get_json()
+    user = g.principal
     
     food = Food.query.get(food_id)
     if not food:
         return jsonify({"message": "食品不存在", "status": "error"}), 404
     
     # 验证用户权限（只有食品的创建者可以修改）
-    user_id = data.get('user_id')
-    if not user_id or int(user_id) != food.user_id:
+    if user.id != food.user_id:
         return jsonify({"message": "无权限修改此食品", "status": "error"}), 403
     
     # 验证价格是否为正数
@@ -311,64 +260,50 @@ def update_food(food_id):
     food.category = data.get('category', '')
     food.cooking_time = cooking_time
     
-    # 处理原料关联
+    # 处理原料关联（与添加食品相同，商户只能使用合作伙伴的原料）
+    links = None
     if 'ingredients' in data and isinstance(data['ingredients'], list):
-        # 清除现有关联
-        food.ingredients = []
-        
-        # 添加新关联
-        for ingredient_data in data['ingredients']:
-            ingredient_id = ingredient_data.get('id')
-            if ingredient_id:
-                ingredient = Ingredient.query.get(ingredient_id)
-                if ingredient:
-                    food.ingredients.append(ingredient)
+        links, error = _resolve_ingredients(
+            data['ingredients'], partner_owner_id=user.id if user.identity == '商户' else None)
+        if error:
+            return error
     
+    # 食品、原料关联、溯源记录在同一事务中写入
     try:
+        if links is not None:
+            # 清除现有关联并批量写入新关联
+            _write_ingredient_links(food.id, links, replace=True)
+        # 同步溯源记录
+        rebuild_food_lineage([food.id])
+        bump_versions('food')
         db.session.commit()
+        catalog_cache.invalidate()
         
-        # 设置原料用量
-        if 'ingredients' in data and isinstance(data['ingredients'], list):
-            for ingredient_data in data['ingredients']:
-                ingredient_id = ingredient_data.get('id')
-                amount = ingredient_data.get('amount', '')
-                if ingredient_id:
-                    # 更新关联表中的用量
-                    db.session.execute(
-                        food_ingredient.update()
-                        .where(food_ingredient.c.food_id == food.id)
-                        .where(food_ingredient.c.ingredient_id == ingredient_id)
-                        .values(amount=amount)
-                    )
-            db.session.commit()
-        
-        # 获取食品的原料信息用于返回
-        ingredients = [{
-            'id': ingredient.id,
-            'name': ingredient.name,
-            'description': ingredient.description,
-            'amount': db.session.query(food_ingredient.c.amount)\
-                      .filter(food_ingredient.c.food_id == food.id, 
-                              food_ingredient.c.ingredient_id == ingredient.id)\
-                      .scalar() or ''
-        } for ingredient in food.ingredients]
+        # 使用统一的加载器获取食品及原料信息用于返回
+        food = food_catalog_query(Food.query.filter_by(id=food_id)).first()
         
         return jsonify({
             "message": "修改食品成功", 
             "status": "success",
-            "data": {
-                "id": food.id,
-                "name": food.name,
-                "prise": float(food.prise),
-                "info": food.info,
-                "poundage": food.poundage,
-                "num": food.num,
-                "category": food.category,
-                "cooking_time": food.cooking_time.isoformat() if food.cooking_time else None,
-                "user_id": food.user_id,
-                "ingredients": ingredients
-            }
+            "data": serialize_food(food)
         })
     except Exception as e:
         db.session.rollback()
-        return jsonify({"message": f"修改食品失败: {str(e)}", "status": "error"}), 500
\ No newline at end of file
+        return jsonify({"message": f"修改食品失败: {str(e)}", "status": "error"}), 500
+
+# 获取食品溯源信息：商户、原料及用量、农户、种植/出产时间与质检图片
+@food_bp.route('/<int:food_id>/trace', methods=['GET'])
+@etag_versioned('food', 'ingredient', 'user')
+def get_food_trace(food_id):
+    food = Food.query.options(joinedload(Food.user)).filter_by(id=food_id).first()
+    if not food:
+        return jsonify({"message": "食品不存在", "status": "error"}), 404
+    
+    # 溯源记录按 food_id 索引一次取出
+    lineage = FoodLineage.query.filter_by(food_id=food_id).order_by(FoodLineage.id).all()
+    
+    return jsonify({
+        "message": "获取食品溯源信息成功",
+        "status": "success",
+        "data": serialize_trace(food, lineage)
+    })
\ No newline at end of file
@@ -1,13 +1,39 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 import datetime
-from models import db, Ingredient, User
-from utils.file_handler import save_file
+from sqlalchemy import and_
+from sqlalchemy.orm import contains_eager
+from models import db, Ingredient, User, Partnership
+from utils.file_handler import IMAGE_FOLDERS, FileTypeError, save_file, release_files, remove_unreferenced
 from utils.decorators import validate_params  # 添加这一行导入装饰器
+from utils.versioning import bump_versions, etag_versioned
+from utils.cache import catalog_cache, cached_response
+from utils.pagination import paginate_query, PaginationError
+from utils.serializers import serialize_ingredient
+from utils.streaming import stream_json_list, wants_stream
+from utils.lineage import refresh_ingredient_lineage, delete_ingredient_lineage
+from utils.uploads import UploadError, claim_upload, discard_session_files
+from utils.tokens import principal_required
 
 ingredient_bp = Blueprint('ingredient', __name__, url_prefix='/api/ingredients')
 
+# 读取请求中的图片：直接上传的文件优先，其次为已完成的分片上传（表单字段 <字段>_upload_id）
+# 返回 {字段: 路径}，只包含本次提供了图片的字段；引用的上传会话ID追加到 claimed
+def _images_from_request(user_id, claimed):
+    images = {}
+    for field, folder in IMAGE_FOLDERS.items():
+        file = request.files.get(field)
+        if file and file.filename:
+            images[field] = save_file(file, folder)
+        elif request.form.get(f'{field}_upload_id'):
+            upload_id = request.form.get(f'{field}_upload_id')
+            images[field] = claim_upload(upload_id, user_id, field)
+            claimed.append(upload_id)
+    return images
+
 # 获取所有原料
 @ingredient_bp.route('', methods=['GET'])
+@etag_versioned('ingredient')
+@cached_response(catalog_cache, unless=wants_stream)
 def get_ingredients():
     # 可选的用户ID参数，用于筛选特定用户的原料
     user_id = request.args.get('user_id')
@@ -15,42 +41,30 @@ def get_ingredients():
     query = Ingredient.query
     if user_id:
         query = query.filter_by(user_id=user_id)
+    
+    # 流式返回完整列表
+    if wants_stream():
+        return stream_json_list("获取原料列表成功", query.order_by(Ingredient.id), serialize_ingredient)
         
-    ingredients = query.all()
-    ingredient_list = [{
-        'id': ingredient.id,
-        'name': ingredient.name,
-        'type': ingredient.type,
-        'description': ingredient.description,
-        'farming_time': ingredient.farming_time.isoformat() if ingredient.farming_time else None,
-        'production_time': ingredient.production_time.isoformat() if ingredient.production_time else None,
-        'planting_image': ingredient.planting_image,
-        'growing_image': ingredient.growing_image,
-        'production_image': ingredient.production_image,
-        'quality_report_image': ingredient.quality_report_image,
-        'user_id': ingredient.user_id
-    } for ingredient in ingredients]
+    try:
+        page = paginate_query(query, Ingredient.id, {'name': Ingredient.name})
+    except PaginationError as e:
+        return jsonify({"message": str(e), "status": "error"}), 400
+    
+    ingredient_list = [serialize_ingredient(ingredient) for ingredient in page.items]
     
     return jsonify({
         "message": "获取原料列表成功",
         "status": "success",
-        "data": ingredient_list
+        "data": ingredient_list,
+        "next_cursor": page.next_cursor
     })
 
 # 添加原料（表单提交，支持文件上传）
 @ingredient_bp.route('', methods=['POST'])
+@principal_required('农户', forbidden="只有农户可以添加原料")
 def add_ingredient():
-    # 验证用户身份
-    user_id = request.form.get('user_id')
-    if not user_id:
-        return jsonify({"message": "缺少用户ID", "status": "error"}), 400
-        
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"message": "用户不存在", "status": "error"}), 404
-        
-    if user.identity != '农户':
-        return jsonify({"message": "只有农户可以添加原料", "status": "error"}), 403
+    user_id = g.principal.id
     
     # 获取表单数据
     name = request.form.get('name')
@@ -74,22 +88,12 @@ def add_ingredient():
             return jsonify({"message": "出产时间格式不正确", "status": "error"}), 400
     
     # 处理文件上传
-    planting_image = None
-    growing_image = None
-    production_image = None
-    quality_report_image = None
-    
-    if 'planting_image' in request.files:
-        planting_image = save_file(request.files['planting_image'], 'in')
-        
-    if 'growing_image' in request.files:
-        growing_image = save_file(request.files['growing_image'], 'grow')
-        
-    if 'production_image' in request.files:
-        production_image = save_file(request.files['production_image'], 'out')
-        
-    if 'quality_report_image' in request.files:
-        quality_report_image = save_file(request.files['quality_report_image'], 'quality_inspection_report')
+    claimed = []
+    try:
+        images = _images_from_request(user_id, claimed)
+    except (UploadError, FileTypeError) as e:
+        db.session.rollback()
+        return jsonify({"message": str(e), "status": "error"}), 400
     
     # 创建新原料
     new_ingredient = Ingredient(
@@ -98,33 +102,22 @@ def add_ingredient():
         description=request.form.get('description', ''),
         farming_time=farming_time,
         production_time=production_time,
-        planting_image=planting_image,
-        growing_image=growing_image,
-        production_image=production_image,
-        quality_report_image=quality_report_image,
-        user_id=user_id
+        user_id=user_id,
+        **images
     )
     
     try:
         db.session.add(new_ingredient)
+        bump_versions('ingredient')
         db.session.commit()
+        catalog_cache.invalidate()
+        for upload_id in claimed:
+            discard_session_files(upload_id)
         
         return jsonify({
             "message": "添加原料成功", 
             "status": "success",
-            "data": {
-                "id": new_ingredient.id,
-                "name": new_ingredient.name,
-                "type": new_ingredient.type,
-                "description": new_ingredient.description,
-                "farming_time": new_ingredient.farming_time.isoformat() if new_ingredient.farming_time else None,
-                "production_time": new_ingredient.production_time.isoformat() if new_ingredient.production_time else None,
-                "planting_image": new_ingredient.planting_image,
-                "growing_image": new_ingredient.growing_image,
-                "production_image": new_ingredient.production_image,
-                "quality_report_image": new_ingredient.quality_report_image,
-                "user_id": new_ingredient.user_id
-            }
+            "data": serialize_ingredient(new_ingredient)
         })
     except Exception as e:
         db.session.rollback()
@@ -132,24 +125,30 @@ def add_ingredient():
 
 # 删除原料
 @ingredient_bp.route('/<int:ingredient_id>', methods=['DELETE'])
+@principal_required()
 def delete_ingredient(ingredient_id):
     ingredient = Ingredient.query.get(ingredient_id)
     if not ingredient:
         return jsonify({"message": "原料不存在", "status": "error"}), 404
     
     # 验证用户权限（只有原料的创建者可以删除）
-    user_id = request.args.get('user_id')
-    if not user_id or int(user_id) != ingredient.user_id:
+    if g.principal.id != ingredient.user_id:
         return jsonify({"message": "无权限删除此原料", "status": "error"}), 403
     
     try:
         # 删除原料与食品的关联
-        for food in ingredient.foods.all():
-            food.ingredients.remove(ingredient)
+        ingredient.food_links.delete(synchronize_session='fetch')
+        delete_ingredient_lineage(ingredient.id)
+        
+        # 释放原料引用的图片
+        released = release_files([getattr(ingredient, field) for field in IMAGE_FOLDERS])
         
         # 删除原料
         db.session.delete(ingredient)
+        bump_versions('ingredient', 'food')
         db.session.commit()
+        catalog_cache.invalidate()
+        remove_unreferenced(released)
         
         return jsonify({
             "message": "删除原料成功", 
@@ -161,14 +160,15 @@ def delete_ingredient(ingredient_id):
 
 # 修改原料
 @ingredient_bp.route('/<int:ingredient_id>', methods=['PUT'])
+@principal_required()
 def update_ingredient(ingredient_id):
+    user_id = g.principal.id
     ingredient = Ingredient.query.get(ingredient_id)
     if not ingredient:
         return jsonify({"message": "原料不存在", "status": "error"}), 404
     
     # 验证用户权限（只有原料的创建者可以修改）
-    user_id = request.form.get('user_id')
-    if not user_id or int(user_id) != ingredient.user_id:
+    if user_id != ingredient.user_id:
         return jsonify({"message": "无权限修改此原料", "status": "error"}), 403
     
     # 获取表单数据
@@ -192,22 +192,16 @@ def update_ingredient(ingredient_id):
         except ValueError:
             return jsonify({"message": "出产时间格式不正确", "status": "error"}), 400
     
-    # 处理文件上传
-    if 'planting_image' in request.files and request.files['planting_image'].filename:
-        planting_image = save_file(request.files['planting_image'], 'in')
-        ingredient.planting_image = planting_image
-        
-    if 'growing_image' in request.files and request.files['growing_image'].filename:
-        growing_image = save_file(request.files['growing_image'], 'grow')
-        ingredient.growing_image = growing_image
-        
-    if 'production_image' in request.files and request.files['production_image'].filename:
-        production_image = save_file(request.files['production_image'], 'out')
-        ingredient.production_image = production_image
-        
-    if 'quality_report_image' in request.files and request.files['quality_report_image'].filename:
-        quality_report_image = save_file(request.files['quality_report_image'], 'quality_inspection_report')
-        ingredient.quality_report_image = quality_report_image
+    # 处理文件上传，被替换的旧图片释放引用
+    claimed = []
+    try:
+        images = _images_from_request(user_id, claimed)
+    except (UploadError, FileTypeError) as e:
+        db.session.rollback()
+        return jsonify({"message": str(e), "status": "error"}), 400
+    released = release_files([getattr(ingredient, field) for field in images])
+    for field, path in images.items():
+        setattr(ingredient, field, path)
     
     # 更新原料信息
     ingredient.name = name
@@ -220,24 +214,19 @@ def update_ingredient(ingredient_id):
         ingredient.production_time = production_time
     
     try:
+        # 同步引用该原料的溯源记录
+        refresh_ingredient_lineage(ingredient)
+        bump_versions('ingredient')
         db.session.commit()
+        catalog_cache.invalidate()
+        remove_unreferenced(released)
+        for upload_id in claimed:
+            discard_session_files(upload_id)
         
         return jsonify({
             "message": "修改原料成功", 
             "status": "success",
-            "data": {
-                "id": ingredient.id,
-                "name": ingredient.name,
-                "type": ingredient.type,
-                "description": ingredient.description,
-                "farming_time": ingredient.farming_time.isoformat() if ingredient.farming_time else None,
-                "production_time": ingredient.production_time.isoformat() if ingredient.production_time else None,
-                "planting_image": ingredient.planting_image,
-                "growing_image": ingredient.growing_image,
-                "production_image": ingredient.production_image,
-                "quality_report_image": ingredient.quality_report_image,
-                "user_id": ingredient.user_id
-            }
+            "data": serialize_ingredient(ingredient)
         })
     except Exception as e:
         db.session.rollback()
@@ -246,61 +235,43 @@ def update_ingredient(ingredient_id):
 # 获取合作伙伴的原料
 @ingredient_bp.route('/partners', methods=['GET'])
 @validate_params(['user_id'])
+@principal_required('商户', forbidden="只有商户可以查看合作伙伴的原料")
+@etag_versioned('ingredient', 'partner', 'user')
 def get_partner_ingredients():
-    user_id = request.args.get('user_id')
-    
-    # 获取用户信息
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "用户不存在", "status": "error"}), 404
-    
-    # 检查用户是否是商户
-    if user.identity != '商户':
-        return jsonify({"message": "只有商户可以查看合作伙伴的原料", "status": "error"}), 403
-    
-    # 获取合作伙伴ID列表
-    partner_ids = []
-    if user.worktogeter:
-        partner_ids = [int(id) for id in user.worktogeter.split(',')]
+    user = g.principal
     
     # 如果没有合作伙伴，返回空列表
-    if not partner_ids:
+    has_partner = db.session.query(Partnership.query.filter_by(user_id=user.id).exists()).scalar()
+    if not has_partner:
         return jsonify({
             "message": "暂无合作伙伴的原料",
             "status": "success",
-            "data": []
+            "data": [],
+            "next_cursor": None
         })
     
-    # 获取所有合作伙伴（农户）的原料
-    partner_ingredients = Ingredient.query.join(User).filter(
-        Ingredient.user_id.in_(partner_ids),
-        User.identity == '农户'
-    ).all()
+    # 获取所有合作伙伴（农户）的原料，合作关系和农户信息通过索引连接一次查出
+    query = Ingredient.query\
+        .join(Partnership, and_(Partnership.user_id == user.id,
+                                Partnership.partner_id == Ingredient.user_id))\
+        .join(User, User.id == Ingredient.user_id)\
+        .filter(User.identity == '农户')\
+        .options(contains_eager(Ingredient.user))
+    try:
+        page = paginate_query(query, Ingredient.id, {'name': Ingredient.name})
+    except PaginationError as e:
+        return jsonify({"message": str(e), "status": "error"}), 400
     
     # 构建原料列表
     ingredient_list = []
-    for ing in partner_ingredients:
-        # 获取原料的农户信息
-        ing_user = User.query.get(ing.user_id)
-        
-        ingredient_list.append({
-            'id': ing.id,
-            'name': ing.name,
-            'type': ing.type,
-            'description': ing.description,
-            'farming_time': ing.farming_time.isoformat() if ing.farming_time else None,
-            'production_time': ing.production_time.isoformat() if ing.production_time else None,
-            'planting_image': ing.planting_image,
-            'growing_image': ing.growing_image,
-            'production_image': ing.production_image,
-            'quality_report_image': ing.quality_report_image,
-            'user_id': ing.user_id,
-            'farmer_name': ing_user.username if ing_user else "未知农户"
-        })
+    for ing in page.items:
+        ingredient_info = serialize_ingredient(ing)
+        ingredient_info['farmer_name'] = ing.user.username if ing.user else "未知农户"
+        ingredient_list.append(ingredient_info)
     
     return jsonify({
         "message": "获取合作伙伴原料列表成功",
         "status": "success",
-        "data": ingredient_list
+        "data": ingredient_list,
+        "next_cursor": page.next_cursor
     })
\ No newline at end of file
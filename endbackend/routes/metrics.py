@@ -0,0 +1,12 @@
+from flask import Blueprint, Response, abort
+from config import Config
+from utils.metrics import app_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Prometheus 抓取接口（文本格式）
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not Config.METRICS_ENABLED:
+        abort(404)
+    return Response(app_metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -1,13 +1,87 @@
-from flask import Blueprint, send_from_directory
+from flask import Blueprint, Response, abort, current_app, request, send_file
+from werkzeug.security import safe_join
+import mimetypes
 import os
+import re
+import stat
 from config import Config
+from utils.cache import image_cache
+from utils.image_variants import is_image, pick_width, queue_variants, variant_name, variants_failed
 
 static_bp = Blueprint('static', __name__)
 
+mimetypes.add_type('image/webp', '.webp')
+
+# 按内容哈希命名的文件（含缩略图），完整文件名（含扩展名）即可作为ETag：
+# 同一URL按 Accept 返回WebP或JPEG缩略图时两者的ETag不同
+CONTENT_NAME = re.compile(r'[0-9a-f]{64}(@w\d+)?')
+# 缩略图尚未生成时返回的原图只短暂缓存，生成后即可换成缩略图
+FALLBACK_MAX_AGE = 60
+
 # 添加新的路由处理图片请求
+# 可选参数 w：返回不小于该宽度的缩略图（浏览器支持时为WebP，否则为JPEG）；
+# 缩略图尚未生成时返回原图并在后台生成；无法生成缩略图的图片始终返回原图
 @static_bp.route('/<folder>/<path:filename>')
 def serve_image(folder, filename):
     # 只处理特定的图片文件夹
     if folder in ['in', 'grow', 'out', 'quality_inspection_report']:
-        return send_from_directory(os.path.join(Config.STATIC_FOLDER, folder), filename)
-    return "File not found", 404
\ No newline at end of file
+        folder_path = os.path.join(Config.STATIC_FOLDER, folder)
+        width = request.args.get('w', type=int)
+        if width and width > 0 and is_image(filename):
+            response = _serve_variant(folder_path, filename, width)
+            if response is not None:
+                return response
+        return _send(folder_path, filename, Config.IMAGE_MAX_AGE)
+    return "File not found", 404
+
+def _serve_variant(folder_path, filename, requested):
+    width = pick_width(requested)
+    if width is None:
+        return None
+    ext = 'webp' if request.accept_mimetypes['image/webp'] else 'jpg'
+    name = variant_name(filename, width, ext)
+    if os.path.isfile(os.path.join(folder_path, name)):
+        response = _send(folder_path, name, Config.IMAGE_MAX_AGE)
+    else:
+        original = os.path.join(folder_path, filename)
+        if not os.path.isfile(original):
+            return None
+        if variants_failed(original):
+            response = _send(folder_path, filename, Config.IMAGE_MAX_AGE)
+        else:
+            queue_variants(original)
+            response = _send(folder_path, filename, FALLBACK_MAX_AGE)
+    response.vary.add('Accept')
+    return response
+
+# 发送文件：上传文件的文件名不会指向新内容，可长期缓存（immutable）；
+# 支持 If-None-Match 和 Range 请求，小文件从内存缓存返回
+def _send(folder_path, filename, max_age):
+    path = safe_join(folder_path, filename)
+    if path is None:
+        abort(404)
+    try:
+        st = os.stat(path)
+    except OSError:
+        abort(404)
+    if not stat.S_ISREG(st.st_mode):
+        abort(404)
+    
+    name = os.path.basename(path)
+    etag = name if CONTENT_NAME.fullmatch(os.path.splitext(name)[0]) else f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    
+    if current_app.config['USE_X_SENDFILE'] or not image_cache.accepts(st):
+        response = send_file(path, etag=etag, conditional=True)
+    else:
+        data = image_cache.get(path, st)
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = st.st_mtime
+        response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = max_age == Config.IMAGE_MAX_AGE
+    return response
@@ -0,0 +1,116 @@
+from flask import Blueprint, request, jsonify, g
+from models import db, UploadSession
+from utils.decorators import validate_params
+from utils.tokens import principal_required
+from utils.uploads import UploadError, create_session, write_part, complete_session, \
+    session_info, discard_session_files
+
+upload_bp = Blueprint('upload', __name__, url_prefix='/api/uploads')
+
+# 当前用户的上传会话，不存在或属于其他用户时返回None
+def _own_session(upload_id):
+    session = db.session.get(UploadSession, upload_id)
+    if not session or session.user_id != g.principal.id:
+        return None
+    return session
+
+# 创建分片上传会话（JSON：field 图片字段、filename、size 文件字节数），会话属于当前登录的农户
+# 返回 upload_id、分片大小和分片数量
+@upload_bp.route('', methods=['POST'])
+@principal_required('农户', forbidden="只有农户可以上传原料图片")
+@validate_params(['field', 'filename', 'size'])
+def init_upload():
+    data = request.get_json()
+    
+    try:
+        session = create_session(g.principal, data['field'], data['filename'], data['size'])
+        db.session.commit()
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e), "status": "error"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"创建上传会话失败: {str(e)}", "status": "error"}), 500
+    
+    return jsonify({
+        "message": "创建上传会话成功",
+        "status": "success",
+        "data": session_info(session)
+    })
+
+# 上传一个分片（请求体为分片的原始字节，序号从0开始），可重复上传
+@upload_bp.route('/<upload_id>/parts/<int:index>', methods=['PUT'])
+@principal_required()
+def upload_part(upload_id, index):
+    session = _own_session(upload_id)
+    if not session:
+        return jsonify({"message": "上传会话不存在", "status": "error"}), 404
+    # 写入分片期间不占用数据库连接
+    db.session.expunge(session)
+    db.session.close()
+    
+    try:
+        size = write_part(session, index, request.stream)
+    except UploadError as e:
+        return jsonify({"message": str(e), "status": "error"}), 400
+    
+    return jsonify({
+        "message": "上传分片成功",
+        "status": "success",
+        "data": {"index": index, "size": size}
+    })
+
+# 查询上传进度，断线后根据 missing_parts 续传
+@upload_bp.route('/<upload_id>', methods=['GET'])
+@principal_required()
+def get_upload(upload_id):
+    session = _own_session(upload_id)
+    if not session:
+        return jsonify({"message": "上传会话不存在", "status": "error"}), 404
+    
+    return jsonify({
+        "message": "获取上传进度成功",
+        "status": "success",
+        "data": session_info(session)
+    })
+
+# 完成上传：合并全部分片，之后可在创建/修改原料时通过 <字段>_upload_id 引用
+@upload_bp.route('/<upload_id>/complete', methods=['POST'])
+@principal_required()
+def finish_upload(upload_id):
+    session = _own_session(upload_id)
+    if not session:
+        return jsonify({"message": "上传会话不存在", "status": "error"}), 404
+    
+    try:
+        complete_session(session)
+        db.session.commit()
+    except UploadError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e), "status": "error"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"完成上传失败: {str(e)}", "status": "error"}), 500
+    
+    return jsonify({
+        "message": "上传完成",
+        "status": "success",
+        "data": session_info(session)
+    })
+
+# 取消上传，删除会话及已上传的分片
+@upload_bp.route('/<upload_id>', methods=['DELETE'])
+@principal_required()
+def cancel_upload(upload_id):
+    session = _own_session(upload_id)
+    if not session:
+        return jsonify({"message": "上传会话不存在", "status": "error"}), 404
+    
+    try:
+        db.session.delete(session)
+        db.session.commit()
+        discard_session_files(upload_id)
+        return jsonify({"message": "取消上传成功", "status": "success"})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"取消上传失败: {str(e)}", "status": "error"}), 500
@@ -1,6 +1,12 @@
-from flask import Blueprint, request, jsonify
-from models import db, User
+from flask import Blueprint, request, jsonify, g
+from models import db, User, Partnership
 from utils.decorators import validate_params
+from utils.versioning import bump_versions, etag_versioned
+from utils.cache import catalog_cache
+from utils.pagination import paginate_query, PaginationError
+from utils.search import index_username, parse_search_limit, search_usernames
+from utils.lineage import refresh_farmer_lineage
+from utils.tokens import principal_required, revoke_tokens, issue_token
 from models.partner_request import PartnerRequest
 from datetime import datetime  # 添加datetime导入
 
@@ -9,6 +15,7 @@ user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 # 更新用户信息
 @user_bp.route('/info', methods=['PUT'])
 @validate_params(['id'])
+@principal_required(field='id')
 def update_user():
     data = request.get_json()
     user = User.query.get(data['id'])
@@ -25,19 +32,31 @@ def update_user():
         user.account = data['account']
     
     # 更新用户信息
-    if 'username' in data:
+    if 'username' in data and data['username'] != user.username:
         user.username = data['username']
+        # 同步更新用户名搜索索引和溯源记录中的农户名称
+        index_username(user.id, user.username)
+        refresh_farmer_lineage(user)
+    # 修改密码或身份后已签发的令牌失效，响应中返回新令牌
+    revoke = False
     if 'password' in data:
         if len(data['password']) < 6:
             return jsonify({"message": "密码长度至少为6位", "status": "error"}), 400
+        revoke = revoke or data['password'] != user.password
         user.password = data['password']
     if 'identity' in data:
         if data['identity'] not in ['消费者', '商户', '农户']:
             return jsonify({"message": "身份类型无效", "status": "error"}), 400
+        revoke = revoke or data['identity'] != user.identity
         user.identity = data['identity']
+    if revoke:
+        revoke_tokens(user)
     
     try:
+        bump_versions('user')
         db.session.commit()
+        # 食品目录中包含商户、农户名称，用户信息变更后同样需要失效缓存
+        catalog_cache.invalidate()
         return jsonify({
             "message": "更新成功",
             "status": "success",
@@ -45,7 +64,8 @@ def update_user():
                 "id": user.id,
                 "username": user.username,
                 "account": user.account,
-                "identity": user.identity
+                "identity": user.identity,
+                "token": issue_token(user)
             }
         })
     except Exception as e:
@@ -55,56 +75,61 @@ def update_user():
 # 获取用户列表
 @user_bp.route('/list', methods=['GET'])
 def get_users():
-    users = User.query.all()
+    try:
+        page = paginate_query(User.query, User.id, {'username': User.username})
+    except PaginationError as e:
+        return jsonify({"message": str(e), "status": "error"}), 400
+    
     user_list = [{
         'id': user.id,
         'username': user.username,
         'account': user.account,
         'identity': user.identity
-    } for user in users]
+    } for user in page.items]
     
     return jsonify({
         "message": "获取用户列表成功",
         "status": "success",
-        "data": user_list
+        "data": user_list,
+        "next_cursor": page.next_cursor
     })
 
 # 搜索用户
 @user_bp.route('/search', methods=['GET'])
 @validate_params(['keyword', 'current_user_id'])
+@principal_required(field='current_user_id')
 def search_users():
     keyword = request.args.get('keyword')
-    current_user_id = int(request.args.get('current_user_id'))
-    
-    # 获取当前用户信息
-    current_user = User.query.get(current_user_id)
-    if not current_user:
-        return jsonify({"message": "当前用户不存在", "status": "error"}), 404
+    current_user = g.principal
+    current_user_id = current_user.id
     
-    # 根据用户身份确定搜索条件
+    # 根据用户身份确定搜索条件（只通过username搜索，使用用户名片段索引）
+    limit = parse_search_limit(request.args.get('limit'))
     if current_user.identity == '商户':
         # 商户只能搜索农户
-        users = User.query.filter(
-            User.identity == '农户',
-            User.username.like(f'%{keyword}%')  # 只通过username搜索
-        ).all()
+        users = search_usernames(keyword, '农户', limit)
     elif current_user.identity == '农户':
         # 农户只能搜索商户
-        users = User.query.filter(
-            User.identity == '商户',
-            User.username.like(f'%{keyword}%')  # 只通过username搜索
-        ).all()
+        users = search_usernames(keyword, '商户', limit)
     else:
         return jsonify({"message": "只有商户和农户可以搜索合作伙伴", "status": "error"}), 403
-    
-    # 获取当前用户的合作伙伴ID列表
-    partner_ids = []
-    if current_user.worktogeter:
-        partner_ids = [int(id) for id in current_user.worktogeter.split(',')]
-    
-    # 获取已发送的请求
-    sent_requests = PartnerRequest.query.filter_by(sender_id=current_user_id).all()
-    sent_request_receiver_ids = [req.receiver_id for req in sent_requests]
+    user_ids = [user.id for user in users]
+    
+    # 获取搜索结果中已是合作伙伴的用户ID
+    partner_ids = set()
+    # 已发送给搜索结果用户的请求，按接收者建立索引（同一接收者取最早的请求）
+    request_status = {}
+    if user_ids:
+        partner_ids = {row.partner_id for row in db.session.query(Partnership.partner_id).filter(
+            Partnership.user_id == current_user_id,
+            Partnership.partner_id.in_(user_ids)
+        )}
+        sent_requests = db.session.query(PartnerRequest.receiver_id, PartnerRequest.status).filter(
+            PartnerRequest.sender_id == current_user_id,
+            PartnerRequest.receiver_id.in_(user_ids)
+        ).order_by(PartnerRequest.id)
+        for receiver_id, status in sent_requests:
+            request_status.setdefault(receiver_id, status)
     
     # 构建用户列表，并标记状态
     user_list = []
@@ -112,11 +137,8 @@ def search_users():
         status = 'none'  # 默认状态
         if user.id in partner_ids:
             status = 'partner'  # 已是合作伙伴
-        elif user.id in sent_request_receiver_ids:
-            # 查找请求状态
-            request_obj = next((req for req in sent_requests if req.receiver_id == user.id), None)
-            if request_obj:
-                status = request_obj.status  # pending, accepted, rejected
+        elif user.id in request_status:
+            status = request_status[user.id]  # pending, accepted, rejected
         
         user_list.append({
             'id': user.id,
@@ -135,16 +157,14 @@ def search_users():
 # 添加合作伙伴
 @user_bp.route('/partner/add', methods=['POST'])
 @validate_params(['user_id', 'partner_id'])
+@principal_required()
 def add_partner():
     data = request.get_json()
-    user_id = data['user_id']
-    partner_id = data['partner_id']
-    
-    # 获取用户和合作伙伴信息
-    user = User.query.get(user_id)
-    partner = User.query.get(partner_id)
+    user = g.principal
     
-    if not user or not partner:
+    # 获取合作伙伴信息
+    partner = User.query.get(data['partner_id'])
+    if not partner:
         return jsonify({"message": "用户或合作伙伴不存在", "status": "error"}), 404
     
     # 验证身份匹配
@@ -156,19 +176,15 @@ def add_partner():
     if not valid_partnership:
         return jsonify({"message": "只能在商户和农户之间建立合作关系", "status": "error"}), 400
     
-    # 添加合作伙伴ID到用户的worktogeter字段
-    partner_ids = []
-    if user.worktogeter:
-        partner_ids = user.worktogeter.split(',')
-    
     # 检查是否已经是合作伙伴
-    if str(partner_id) in partner_ids:
+    if db.session.get(Partnership, (user.id, partner.id)):
         return jsonify({"message": "已经是合作伙伴", "status": "error"}), 400
     
-    partner_ids.append(str(partner_id))
-    user.worktogeter = ','.join(partner_ids)
+    # 添加合作关系
+    db.session.add(Partnership(user_id=user.id, partner_id=partner.id))
     
     try:
+        bump_versions('partner')
         db.session.commit()
         return jsonify({
             "message": "添加合作伙伴成功",
@@ -181,60 +197,48 @@ def add_partner():
 # 删除合作伙伴
 @user_bp.route('/partner/remove', methods=['POST'])
 @validate_params(['user_id', 'partner_id'])
+@principal_required()
 def remove_partner():
     data = request.get_json()
-    user_id = data['user_id']
+    user = g.principal
     partner_id = data['partner_id']
     
-    # 获取用户信息
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "用户不存在", "status": "error"}), 404
-    
-    # 从用户的worktogeter字段中移除合作伙伴ID
-    if user.worktogeter:
-        partner_ids = user.worktogeter.split(',')
-        if str(partner_id) in partner_ids:
-            partner_ids.remove(str(partner_id))
-            user.worktogeter = ','.join(partner_ids) if partner_ids else None
-            
-            try:
-                db.session.commit()
-                return jsonify({
-                    "message": "删除合作伙伴成功",
-                    "status": "success"
-                })
-            except Exception as e:
-                db.session.rollback()
-                return jsonify({"message": f"删除合作伙伴失败: {str(e)}", "status": "error"}), 500
+    # 移除合作关系
+    partnership = Partnership.query.filter_by(user_id=user.id, partner_id=partner_id).first()
+    if partnership:
+        db.session.delete(partnership)
+        
+        try:
+            bump_versions('partner')
+            db.session.commit()
+            return jsonify({
+                "message": "删除合作伙伴成功",
+                "status": "success"
+            })
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"message": f"删除合作伙伴失败: {str(e)}", "status": "error"}), 500
     
     return jsonify({"message": "该用户不是您的合作伙伴", "status": "error"}), 400
 
 # 获取合作伙伴列表
 @user_bp.route('/partners', methods=['GET'])
 @validate_params(['user_id'])
+@principal_required()
+@etag_versioned('partner', 'user')
 def get_partners():
-    user_id = request.args.get('user_id')
-    
-    # 获取用户信息
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({"message": "用户不存在", "status": "error"}), 404
+    user = g.principal
     
     # 获取合作伙伴列表
-    partner_list = []
-    if user.worktogeter:
-        partner_ids = user.worktogeter.split(',')
-        partners = User.query.filter(User.id.in_(partner_ids)).all()
-        
-        partner_list = [{
-            'id': partner.id,
-            'username': partner.username,
-            'account': partner.account,
-            'identity': partner.identity
-        } for partner in partners]
+    partners = User.query.join(Partnership, Partnership.partner_id == User.id)\
+        .filter(Partnership.user_id == user.id).all()
+    
+    partner_list = [{
+        'id': partner.id,
+        'username': partner.username,
+        'account': partner.account,
+        'identity': partner.identity
+    } for partner in partners]
     
     return jsonify({
         "message": "获取合作伙伴列表成功",
@@ -246,16 +250,14 @@ def get_partners():
 # 发送合作伙伴请求
 @user_bp.route('/partner/request', methods=['POST'])
 @validate_params(['user_id', 'partner_id'])
+@principal_required()
 def send_partner_request():
     data = request.get_json()
-    user_id = data['user_id']
-    partner_id = data['partner_id']
-    
-    # 获取用户和合作伙伴信息
-    user = User.query.get(user_id)
-    partner = User.query.get(partner_id)
+    user = g.principal
     
-    if not user or not partner:
+    # 获取合作伙伴信息
+    partner = User.query.get(data['partner_id'])
+    if not partner:
         return jsonify({"message": "用户或合作伙伴不存在", "status": "error"}), 404
     
     # 验证身份匹配
@@ -268,13 +270,13 @@ def send_partner_request():
         return jsonify({"message": "只能在商户和农户之间建立合作关系", "status": "error"}), 400
     
     # 检查是否已经是合作伙伴
-    if user.worktogeter and str(partner_id) in user.worktogeter.split(','):
+    if db.session.get(Partnership, (user.id, partner.id)):
         return jsonify({"message": "已经是合作伙伴", "status": "error"}), 400
     
     # 检查是否已经发送过请求
     existing_request = PartnerRequest.query.filter_by(
-        sender_id=user_id, 
-        receiver_id=partner_id,
+        sender_id=user.id, 
+        receiver_id=partner.id,
         status='pending'
     ).first()
     
@@ -286,14 +288,15 @@ def send_partner_request():
     
     # 创建新的合作伙伴请求
     new_request = PartnerRequest(
-        sender_id=user_id,
-        receiver_id=partner_id,
+        sender_id=user.id,
+        receiver_id=partner.id,
         created_at=current_time,  # 手动设置创建时间
         updated_at=current_time   # 手动设置更新时间
     )
     
     try:
         db.session.add(new_request)
+        bump_versions('partner_request')
         db.session.commit()
         return jsonify({
             "message": "合作请求已发送，等待对方确认",
@@ -306,32 +309,25 @@ def send_partner_request():
 # 获取收到的合作伙伴请求
 @user_bp.route('/partner/requests/received', methods=['GET'])
 @validate_params(['user_id'])
+@principal_required()
+@etag_versioned('partner_request', 'user')
 def get_received_requests():
-    user_id = request.args.get('user_id')
-    
-    # 获取用户信息
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"message": "用户不存在", "status": "error"}), 404
-    
-    # 获取收到的待处理请求
-    requests = PartnerRequest.query.filter_by(
-        receiver_id=user_id,
-        status='pending'
-    ).all()
-    
-    request_list = []
-    for req in requests:
-        sender = User.query.get(req.sender_id)
-        if sender:
-            request_list.append({
-                'request_id': req.id,
-                'sender_id': sender.id,
-                'sender_username': sender.username,
-                'sender_account': sender.account,
-                'sender_identity': sender.identity,
-                'created_at': req.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            })
+    user = g.principal
+    
+    # 获取收到的待处理请求，发送者信息通过连接一次查出
+    rows = db.session.query(PartnerRequest, User)\
+        .join(User, User.id == PartnerRequest.sender_id)\
+        .filter(PartnerRequest.receiver_id == user.id, PartnerRequest.status == 'pending')\
+        .order_by(PartnerRequest.id).all()
+    
+    request_list = [{
+        'request_id': req.id,
+        'sender_id': sender.id,
+        'sender_username': sender.username,
+        'sender_account': sender.account,
+        'sender_identity': sender.identity,
+        'created_at': req.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    } for req, sender in rows]
     
     return jsonify({
         "message": "获取合作请求成功",
@@ -343,10 +339,11 @@ def get_received_requests():
 # 处理合作伙伴请求
 @user_bp.route('/partner/request/respond', methods=['POST'])
 @validate_params(['request_id', 'user_id', 'action'])
+@principal_required()
 def respond_to_request():
     data = request.get_json()
     request_id = data['request_id']
-    user_id = data['user_id']
+    user_id = g.principal.id
     action = data['action']  # 'accept' 或 'reject'
     
     if action not in ['accept', 'reject']:
@@ -358,7 +355,7 @@ def respond_to_request():
         return jsonify({"message": "请求不存在", "status": "error"}), 404
     
     # 验证接收者身份
-    if partner_request.receiver_id != int(user_id):
+    if partner_request.receiver_id != user_id:
         return jsonify({"message": "无权处理此请求", "status": "error"}), 403
     
     # 手动更新updated_at字段
@@ -373,22 +370,10 @@ def respond_to_request():
         sender = User.query.get(partner_request.sender_id)
         receiver = User.query.get(partner_request.receiver_id)
         
-        # 更新双方的合作伙伴列表
-        # 更新发送者的合作伙伴列表
-        sender_partners = []
-        if sender.worktogeter:
-            sender_partners = sender.worktogeter.split(',')
-        if str(receiver.id) not in sender_partners:
-            sender_partners.append(str(receiver.id))
-            sender.worktogeter = ','.join(sender_partners)
-        
-        # 更新接收者的合作伙伴列表
-        receiver_partners = []
-        if receiver.worktogeter:
-            receiver_partners = receiver.worktogeter.split(',')
-        if str(sender.id) not in receiver_partners:
-            receiver_partners.append(str(sender.id))
-            receiver.worktogeter = ','.join(receiver_partners)
+        # 为双方建立合作关系
+        for owner_id, partner_id in ((sender.id, receiver.id), (receiver.id, sender.id)):
+            if not db.session.get(Partnership, (owner_id, partner_id)):
+                db.session.add(Partnership(user_id=owner_id, partner_id=partner_id))
         
         message = "已接受合作请求"
     else:  # reject
@@ -396,6 +381,7 @@ def respond_to_request():
         message = "已拒绝合作请求"
     
     try:
+        bump_versions('partner_request', 'partner')
         db.session.commit()
         return jsonify({
             "message": message,
@@ -0,0 +1,98 @@
+import glob
+import os
+import click
+from config import Config
+from app import create_app, init_db
+from models import db
+from utils.metrics import app_metrics
+
+# fork 后各工作进程重新建立数据库连接：丢弃从主进程继承的连接池（不关闭父进程的连接）
+def reset_engines(app):
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+# 清空上次运行留下的指标快照（计数器从0开始）
+def clear_metrics_dir():
+    if Config.METRICS_MULTIPROC_DIR:
+        for path in glob.glob(os.path.join(Config.METRICS_MULTIPROC_DIR, 'metrics_*.json')):
+            os.remove(path)
+
+def run_gunicorn(app, options):
+    from gunicorn.app.base import BaseApplication
+
+    class StandaloneApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # 预加载时所有工作进程共用主进程创建的应用；否则每个工作进程各自创建
+            return app if app is not None else create_app(with_commands=False)
+
+    StandaloneApplication().run()
+
+# 生产环境启动：python serve.py --workers 4 --threads 4
+# 使用 gunicorn 多进程（每个进程多线程）运行；Windows 等没有 gunicorn 的环境使用 waitress 单进程多线程运行
+@click.command()
+@click.option('--bind', default=Config.SERVER_BIND, show_default=True, help='监听地址')
+@click.option('--workers', default=Config.SERVER_WORKERS, show_default=True, type=int, help='工作进程数')
+@click.option('--threads', default=Config.SERVER_THREADS, show_default=True, type=int, help='每个进程的线程数')
+@click.option('--timeout', default=Config.SERVER_TIMEOUT, show_default=True, type=int,
+              help='请求超时秒数，超时的工作进程会被重启')
+@click.option('--graceful-timeout', default=Config.SERVER_GRACEFUL_TIMEOUT, show_default=True, type=int,
+              help='重启或停止时等待处理中请求的秒数')
+@click.option('--max-requests', default=Config.SERVER_MAX_REQUESTS, show_default=True, type=int,
+              help='工作进程处理多少个请求后自动重启（0为不重启）')
+@click.option('--preload/--no-preload', default=Config.SERVER_PRELOAD, show_default=True,
+              help='在主进程中加载应用后再 fork（启动快、省内存；修改代码后需完全重启）')
+def serve(bind, workers, threads, timeout, graceful_timeout, max_requests, preload):
+    clear_metrics_dir()
+    
+    # 数据库迁移只在主进程中执行一次
+    app = create_app(with_commands=False)
+    init_db(app)
+    
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        gunicorn = None
+    
+    if gunicorn is None:
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            raise click.ClickException("请先安装 gunicorn（Linux）或 waitress（Windows）")
+        click.echo(f"未安装 gunicorn，使用 waitress 单进程 {threads} 线程运行")
+        waitress_serve(app, listen=bind, threads=threads, channel_timeout=timeout)
+        return
+    
+    if not preload:
+        reset_engines(app)
+        app = None
+    
+    def post_fork(server, worker):
+        if app is not None:
+            reset_engines(app)
+    
+    # 工作进程退出前写入最后的指标快照
+    def worker_exit(server, worker):
+        app_metrics.registry.flush(force=True)
+    
+    run_gunicorn(app, {
+        'bind': bind,
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'timeout': timeout,
+        'graceful_timeout': graceful_timeout,
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'preload_app': preload,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+        'accesslog': '-',
+    })
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# 测试使用临时的SQLite数据库和静态文件目录（需在导入 config 之前设置）
+_TMP = tempfile.mkdtemp(prefix='food-trace-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TMP, 'test.db')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app import create_app, init_db
+from models import db
+
+Config.STATIC_FOLDER = os.path.join(_TMP, 'static')
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app(with_commands=False)
+    init_db(app)
+    return app
+
+# 每个测试在独立的应用上下文中运行，结束时回滚未提交的修改
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        db.session.rollback()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,107 @@
+import io
+import os
+import pytest
+from werkzeug.datastructures import FileStorage
+from config import Config
+from models import db, StoredFile
+from utils.file_handler import FileTypeError, disk_path, is_content_path, remove_unreferenced, release_files, \
+    retain_files, save_file, store_file
+
+def _store(data, name='a.png', folder='in'):
+    return store_file(FileStorage(stream=io.BytesIO(data), filename=name), folder)
+
+def _ref_count(path):
+    row = db.session.get(StoredFile, path)
+    return row.ref_count if row else None
+
+@pytest.mark.parametrize('path', [
+    '/in/../../victim.txt',
+    '/in/../config.py',
+    '/in/ab/../../../etc/passwd',
+    '/in/',
+    '/etc/passwd',
+    '/models/user.py',
+    '',
+    None,
+])
+def test_disk_path_rejects_paths_outside_image_folders(path):
+    assert disk_path(path) is None
+
+def test_disk_path_resolves_inside_image_folder():
+    path = '/grow/ab/cd/' + 'a' * 64 + '.jpg'
+    assert disk_path(path) == os.path.join(Config.STATIC_FOLDER, 'grow', 'ab', 'cd', 'a' * 64 + '.jpg')
+
+def test_is_content_path():
+    digest = 'ab' + 'c' * 62
+    assert is_content_path(f'/in/ab/cc/{digest}.png')
+    assert is_content_path(f'/in/ab/cc/{digest}.png', 'in')
+    assert not is_content_path(f'/in/ab/cc/{digest}.png', 'out')
+    assert not is_content_path(f'/static/ab/cc/{digest}.png')
+    assert not is_content_path('/in/../../victim.txt')
+    assert not is_content_path('/in/photo.png')
+
+def test_retain_files_never_registers_unknown_paths(ctx):
+    victim = os.path.join(Config.STATIC_FOLDER, 'victim.txt')
+    os.makedirs(Config.STATIC_FOLDER, exist_ok=True)
+    with open(victim, 'w') as fp:
+        fp.write('keep me')
+    missing = '/in/00/00/' + '0' * 64 + '.png'
+    paths = ['/in/../victim.txt', missing, '/in/legacy.png']
+
+    retain_files(paths)
+    db.session.commit()
+    assert all(_ref_count(path) is None for path in paths)
+
+    remove_unreferenced(release_files(paths))
+    assert os.path.exists(victim)
+
+def test_ref_counted_deletion(ctx):
+    path = _store(b'shared image bytes')
+    assert path == _store(b'shared image bytes'), "相同内容应得到相同路径"
+    target = disk_path(path)
+    assert os.path.isfile(target)
+
+    retain_files([path, path])
+    db.session.commit()
+    assert _ref_count(path) == 2
+
+    # 还有引用时不删除
+    assert remove_unreferenced(release_files([path])) == []
+    assert _ref_count(path) == 1
+    assert os.path.isfile(target)
+
+    # 最后一个引用释放后删除记录和文件
+    assert remove_unreferenced(release_files([path])) == [path]
+    assert _ref_count(path) is None
+    assert not os.path.exists(target)
+
+def test_store_file_keeps_extension_of_non_ascii_filename(ctx):
+    path = save_file(FileStorage(stream=io.BytesIO(b'cjk image'), filename='有机蔬菜照片.JPG'), 'grow')
+    assert path.endswith('.jpg')
+    assert is_content_path(path, 'grow')
+    db.session.commit()
+    assert _ref_count(path) == 1
+
+@pytest.mark.parametrize('name', ['照片', 'report.exe', 'page.html', '.png'])
+def test_store_file_rejects_unsupported_types(name):
+    with pytest.raises(FileTypeError):
+        _store(b'not an image', name)
+
+def test_new_file_removed_on_rollback(ctx):
+    path = save_file(FileStorage(stream=io.BytesIO(b'rolled back'), filename='a.png'), 'in')
+    assert os.path.isfile(disk_path(path))
+    db.session.rollback()
+    assert _ref_count(path) is None
+    assert not os.path.exists(disk_path(path))
+
+def test_saving_content_again_after_removal(ctx):
+    data = b'removed then uploaded again'
+    path = save_file(FileStorage(stream=io.BytesIO(data), filename='a.png'), 'in')
+    db.session.commit()
+    assert remove_unreferenced(release_files([path])) == [path]
+    assert not os.path.exists(disk_path(path))
+
+    assert save_file(FileStorage(stream=io.BytesIO(data), filename='b.png'), 'in') == path
+    db.session.commit()
+    assert _ref_count(path) == 1
+    assert os.path.isfile(disk_path(path))
@@ -0,0 +1,124 @@
+import uuid
+import pytest
+from itsdangerous import URLSafeTimedSerializer
+from config import Config
+from models import db, User, Food, Ingredient, PartnerRequest
+from utils.tokens import TokenError, ensure_secret_key, issue_token, revoke_tokens, token_versions, verify_token
+
+def _user(identity='农户'):
+    name = f"user_{uuid.uuid4().hex[:8]}"
+    user = User(username=name, account=name, password='123456', identity=identity)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def _auth(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def test_valid_token(ctx):
+    user = _user()
+    principal = verify_token(issue_token(user))
+    assert (principal.id, principal.identity) == (user.id, '农户')
+
+def test_expired_token(ctx, monkeypatch):
+    token = issue_token(_user())
+    monkeypatch.setattr(Config, 'TOKEN_MAX_AGE', -1)
+    with pytest.raises(TokenError, match='过期'):
+        verify_token(token)
+
+def test_revoked_token(ctx):
+    user = _user()
+    token = issue_token(user)
+    verify_token(token)
+    revoke_tokens(user)
+    db.session.commit()
+    with pytest.raises(TokenError, match='失效'):
+        verify_token(token)
+    verify_token(issue_token(user))
+
+# 其他进程修改密码后，本进程在版本号缓存过期后拒绝旧令牌
+def test_revoked_in_another_process(ctx):
+    user = _user()
+    token = issue_token(user)
+    verify_token(token)
+    user.token_version = (user.token_version or 0) + 1
+    db.session.commit()
+    token_versions.invalidate(user.id)
+    with pytest.raises(TokenError):
+        verify_token(token)
+
+@pytest.mark.parametrize('key', ['dev-secret-key', 'another-key'])
+def test_token_signed_with_other_key(ctx, key):
+    user = _user()
+    forged = URLSafeTimedSerializer(key, salt='auth-token').dumps(
+        {'id': user.id, 'identity': user.identity, 'ver': user.token_version or 0})
+    with pytest.raises(TokenError, match='无效'):
+        verify_token(forged)
+
+def test_tampered_token(ctx):
+    farmer, merchant = _user('农户'), _user('商户')
+    payload, signature = issue_token(farmer).rsplit('.', 1)
+    other = issue_token(merchant).rsplit('.', 1)[0]
+    for forged in (f'{other}.{signature}', f'{payload}.{signature[:-2]}xx', payload, 'not-a-token'):
+        with pytest.raises(TokenError, match='无效'):
+            verify_token(forged)
+
+def test_endpoint_rejects_forged_and_mismatched_tokens(ctx, client):
+    farmer, other = _user(), _user()
+    url = '/api/ingredients'
+    forged = URLSafeTimedSerializer('dev-secret-key', salt='auth-token').dumps(
+        {'id': farmer.id, 'identity': '农户', 'ver': 0})
+    assert client.post(url, data={'name': 'x'}, headers=_auth(forged)).status_code == 401
+    response = client.post(url, data={'name': 'x', 'user_id': other.id}, headers=_auth(issue_token(farmer)))
+    assert response.status_code == 403
+    response = client.post(url, data={'name': 'x', 'user_id': farmer.id}, headers=_auth(issue_token(farmer)))
+    assert response.status_code == 200
+
+def test_bare_user_id_requires_legacy_mode(ctx, client, monkeypatch):
+    farmer = _user()
+    assert client.post('/api/ingredients', data={'name': 'x', 'user_id': farmer.id}).status_code == 401
+    monkeypatch.setattr(Config, 'AUTH_LEGACY_USER_ID', True)
+    assert client.post('/api/ingredients', data={'name': 'x', 'user_id': farmer.id}).status_code == 200
+
+def test_missing_secret_key(monkeypatch):
+    monkeypatch.setattr(Config, 'SECRET_KEY', None)
+    with pytest.raises(RuntimeError):
+        ensure_secret_key(debug=False)
+    ensure_secret_key(debug=True)
+    assert Config.SECRET_KEY and Config.SECRET_KEY != 'dev-secret-key'
+
+def _owned_requests(farmer, merchant, sender):
+    ingredient = Ingredient(name='x', user_id=farmer.id)
+    food = Food(name='x', prise=1, info='', poundage='1kg', num=1, category='', user_id=merchant.id)
+    partner_request = PartnerRequest(sender_id=sender.id, receiver_id=farmer.id)
+    db.session.add_all([ingredient, food, partner_request])
+    db.session.commit()
+    pair = {'user_id': merchant.id, 'partner_id': farmer.id}
+    return [
+        (merchant, 'delete', f'/api/foods/{food.id}?user_id={merchant.id}', {}),
+        (farmer, 'put', f'/api/ingredients/{ingredient.id}', {'data': {'user_id': farmer.id, 'name': 'y'}}),
+        (farmer, 'delete', f'/api/ingredients/{ingredient.id}?user_id={farmer.id}', {}),
+        (merchant, 'post', '/api/user/partner/add', {'json': pair}),
+        (merchant, 'post', '/api/user/partner/remove', {'json': pair}),
+        (merchant, 'post', '/api/user/partner/request', {'json': pair}),
+        (farmer, 'post', '/api/user/partner/request/respond',
+         {'json': {'request_id': partner_request.id, 'user_id': farmer.id, 'action': 'accept'}}),
+        (merchant, 'get', f'/api/user/partners?user_id={merchant.id}', {}),
+        (farmer, 'get', f'/api/user/partner/requests/received?user_id={farmer.id}', {}),
+    ]
+
+# 只带 user_id 不带令牌，或用其他用户的令牌冒充，都不能操作该用户的数据
+def test_owner_endpoints_require_token(ctx, client):
+    farmer, merchant, other = _user('农户'), _user('商户'), _user('商户')
+    for owner, method, url, kwargs in _owned_requests(farmer, merchant, other):
+        call = getattr(client, method)
+        assert call(url, **kwargs).status_code == 401, url
+        assert call(url, headers=_auth(issue_token(other)), **kwargs).status_code == 403, url
+    assert db.session.get(Food, db.session.query(Food.id).filter_by(user_id=merchant.id).scalar())
+    assert db.session.query(Ingredient).filter_by(user_id=farmer.id, name='x').count() == 1
+
+def test_owner_endpoints_accept_owner_token(ctx, client):
+    farmer, merchant, sender = _user('农户'), _user('商户'), _user('商户')
+    for owner, method, url, kwargs in _owned_requests(farmer, merchant, sender):
+        response = getattr(client, method)(url, headers=_auth(issue_token(owner)), **kwargs)
+        assert response.status_code == 200, (url, response.get_json())
@@ -0,0 +1,47 @@
+import uuid
+from models import db, User
+from utils.tokens import issue_token
+
+def _farmer():
+    name = f"farmer_{uuid.uuid4().hex[:8]}"
+    user = User(username=name, account=name, password='123456', identity='农户')
+    db.session.add(user)
+    db.session.commit()
+    return user, {'Authorization': f'Bearer {issue_token(user)}'}
+
+def _init(client, headers):
+    return client.post('/api/uploads', headers=headers,
+                       json={'field': 'planting_image', 'filename': '种植.png', 'size': 3})
+
+def test_init_requires_token(ctx, client):
+    owner, _ = _farmer()
+    response = client.post('/api/uploads', json={'user_id': owner.id, 'field': 'planting_image',
+                                                 'filename': 'a.png', 'size': 3})
+    assert response.status_code == 401
+
+def test_sessions_are_private_to_owner(ctx, client):
+    _, owner = _farmer()
+    other, other_headers = _farmer()
+    upload_id = _init(client, owner).get_json()['data']['upload_id']
+    base = f'/api/uploads/{upload_id}'
+
+    requests = [
+        ('put', f'{base}/parts/0', {'data': b'abc'}),
+        ('get', base, {}),
+        ('post', f'{base}/complete', {}),
+        ('delete', base, {}),
+    ]
+    for method, url, kwargs in requests:
+        assert getattr(client, method)(url, **kwargs).status_code == 401
+        assert getattr(client, method)(url, headers=other_headers, **kwargs).status_code == 404
+
+    assert client.put(f'{base}/parts/0', data=b'abc', headers=owner).status_code == 200
+    assert client.post(f'{base}/complete', headers=owner).get_json()['data']['status'] == 'completed'
+
+    # 其他农户不能引用该上传
+    response = client.post('/api/ingredients', headers=other_headers,
+                           data={'name': 'x', 'planting_image_upload_id': upload_id})
+    assert response.status_code == 400
+    response = client.post('/api/ingredients', headers=owner,
+                           data={'name': 'x', 'planting_image_upload_id': upload_id})
+    assert response.get_json()['data']['planting_image'].endswith('.png')
@@ -0,0 +1,26 @@
+import uuid
+from models import db, Food, User
+
+def _food(user, name):
+    food = Food(name=name, prise=1, info='', poundage='1kg', num=1, category='', user_id=user.id)
+    db.session.add(food)
+    db.session.commit()
+    return food
+
+def test_trace_etag_depends_on_food_id(ctx, client):
+    name = f"merchant_{uuid.uuid4().hex[:8]}"
+    merchant = User(username=name, account=name, password='123456', identity='商户')
+    db.session.add(merchant)
+    db.session.commit()
+    first, second = _food(merchant, 'first'), _food(merchant, 'second')
+
+    response = client.get(f'/api/foods/{first.id}/trace')
+    etag = response.headers['ETag']
+    assert response.get_json()['data']['food']['name'] == 'first'
+    assert etag != client.get(f'/api/foods/{second.id}/trace').headers['ETag']
+
+    # 另一个食品的ETag不能让当前食品返回304
+    response = client.get(f'/api/foods/{second.id}/trace', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['data']['food']['name'] == 'second'
+    assert client.get(f'/api/foods/{first.id}/trace', headers={'If-None-Match': etag}).status_code == 304
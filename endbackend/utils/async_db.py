@@ -0,0 +1,98 @@
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from config import Config
+from models import DataVersion, User
+from utils.tokens import MISSING, Principal, TokenError, check_version, decode_token, token_versions
+
+# 同步驱动对应的异步驱动
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+    'mysql+pymysql': 'mysql+aiomysql',
+    'mysql+mysqldb': 'mysql+aiomysql',
+}
+
+# 异步数据库地址：优先使用 ASYNC_DATABASE_URL，否则把主库地址的驱动换成对应的异步驱动
+def async_database_url():
+    if Config.ASYNC_DATABASE_URL:
+        return Config.ASYNC_DATABASE_URL
+    url = make_url(Config.SQLALCHEMY_DATABASE_URI)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    if driver is None:
+        raise RuntimeError(f"不支持的数据库驱动: {url.drivername}，请设置 ASYNC_DATABASE_URL")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+# 异步引擎和会话工厂（首次使用时创建，每个进程一份）
+class AsyncDatabase:
+    def __init__(self):
+        self.engine = None
+        self.sessionmaker = None
+
+    def session(self):
+        if self.sessionmaker is None:
+            url = async_database_url()
+            options = {}
+            if not url.startswith('sqlite'):
+                options = {'pool_size': Config.ASYNC_POOL_SIZE, 'max_overflow': Config.ASYNC_MAX_OVERFLOW,
+                           'pool_recycle': 3600, 'pool_pre_ping': True}
+            self.engine = create_async_engine(url, **options)
+            # 返回的对象在会话关闭后仍要序列化，提交时不过期
+            self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        return self.sessionmaker()
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+            self.sessionmaker = None
+
+async_db = AsyncDatabase()
+
+# 读取数据版本号（同 utils.versioning.get_versions）
+async def get_versions(session, *scopes):
+    rows = await session.execute(
+        select(DataVersion.scope, DataVersion.version).where(DataVersion.scope.in_(scopes)))
+    versions = dict(rows.all())
+    return tuple(versions.get(scope, 0) for scope in scopes)
+
+# 按ID查询用户，ID格式不正确时视为不存在
+async def get_user(session, user_id):
+    try:
+        return await session.get(User, int(user_id))
+    except (TypeError, ValueError):
+        return None
+
+# 校验登录令牌（同 utils.tokens.verify_token），令牌版本号缓存未命中时异步查询
+async def verify_token(session, token):
+    principal = decode_token(token)
+    version = token_versions.peek(principal.id)
+    if version is MISSING:
+        version = await session.scalar(select(User.token_version).where(User.id == principal.id))
+        token_versions.put(principal.id, version)
+    check_version(principal, version)
+    return principal
+
+# 识别当前用户（同 utils.tokens.principal_required），返回 (用户, None) 或 (None, (状态码, 错误消息))
+async def resolve_principal(session, token, user_id, identities=(), forbidden="无权执行此操作"):
+    if token:
+        try:
+            principal = await verify_token(session, token)
+        except TokenError as e:
+            return None, (401, str(e))
+        if user_id is not None and str(user_id) != str(principal.id):
+            return None, (403, "无权操作其他用户的数据")
+    elif Config.AUTH_LEGACY_USER_ID:
+        if not user_id:
+            return None, (400, "缺少用户ID")
+        user = await get_user(session, user_id)
+        if not user:
+            return None, (404, "用户不存在")
+        principal = Principal(user.id, user.identity, None)
+    else:
+        return None, (401, "请先登录")
+
+    if identities and principal.identity not in identities:
+        return None, (403, forbidden)
+    return principal, None
@@ -0,0 +1,421 @@
+import datetime
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from sqlalchemy import event, select
+from config import Config
+from models import db, User, Food, Ingredient, Partnership
+from utils.cache import catalog_cache
+from utils.seed import SAMPLE_PNG
+from utils.tokens import issue_token
+
+# 按线程统计SQL语句数（测试客户端在调用线程中处理请求）
+class SqlCounter:
+    def __init__(self):
+        self._local = threading.local()
+        self._engines = []
+
+    def install(self, engines):
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._on_execute)
+            self._engines.append(engine)
+
+    def remove(self):
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._on_execute)
+        self._engines = []
+
+    def _on_execute(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    def read(self):
+        return getattr(self._local, 'count', 0)
+
+# 记录每次请求的耗时、SQL语句数和是否成功，按接口名汇总
+class Recorder:
+    def __init__(self, counter, cold=False):
+        self.counter = counter
+        self.cold = cold
+        self.samples = defaultdict(list)  # 接口名 -> [(秒, SQL数, 是否成功)]
+        self._lock = threading.Lock()
+
+    def call(self, client, name, method, url, **kwargs):
+        if self.cold:
+            catalog_cache.invalidate()
+        self.counter.reset()
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        # 读完响应体，流式接口的查询也计入
+        response.get_data()
+        elapsed = time.perf_counter() - start
+        sql = self.counter.read()
+        with self._lock:
+            self.samples[name].append((elapsed, sql, response.status_code < 400))
+        return response
+
+def _percentile(values, p):
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+# 汇总统计；wall_time 为并发压测的总时长，未提供时吞吐量按请求耗时之和计算
+def summarize(samples, wall_time=None):
+    result = {}
+    for name, items in sorted(samples.items()):
+        latencies = sorted(item[0] for item in items)
+        sqls = [item[1] for item in items]
+        total = wall_time or sum(latencies)
+        result[name] = {
+            'count': len(items),
+            'errors': sum(1 for item in items if not item[2]),
+            'throughput_rps': round(len(items) / total, 2) if total else None,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(_percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3),
+            'sql_mean': round(sum(sqls) / len(sqls), 2),
+            'sql_max': max(sqls),
+        }
+    return result
+
+# 压测所需的数据样本（从当前数据库读取）
+class BenchContext:
+    def __init__(self, sample_size=500):
+        self.users = {}
+        for identity in ('农户', '商户', '消费者'):
+            self.users[identity] = [tuple(row) for row in db.session.execute(
+                select(User.id, User.account, User.password, User.username, User.identity, User.token_version)
+                .where(User.identity == identity).order_by(User.id).limit(sample_size))]
+        self.food_ids = [row[0] for row in db.session.execute(
+            select(Food.id).order_by(Food.id.desc()).limit(sample_size))]
+        merchant_ids = [user[0] for user in self.users['商户']]
+        self.partners = defaultdict(list)
+        if merchant_ids:
+            for user_id, partner_id in db.session.execute(
+                    select(Partnership.user_id, Partnership.partner_id)
+                    .where(Partnership.user_id.in_(merchant_ids))):
+                self.partners[user_id].append(partner_id)
+        self.farmer_ingredients = defaultdict(list)
+        farmer_ids = [user[0] for user in self.users['农户']]
+        if farmer_ids:
+            for ingredient_id, user_id in db.session.execute(
+                    select(Ingredient.id, Ingredient.user_id).where(Ingredient.user_id.in_(farmer_ids))):
+                self.farmer_ingredients[user_id].append(ingredient_id)
+        self.image_path = db.session.execute(
+            select(Ingredient.planting_image).where(Ingredient.planting_image.isnot(None)).limit(1)).scalar()
+        db.session.close()
+        self._names = itertools.count()
+        self._tokens = {}
+        self._prefix = f"bench{os.getpid()}_{int(time.time())}"
+
+    def unique_name(self):
+        return f"{self._prefix}_{next(self._names)}"
+
+    # 用户的令牌请求头（直接签发，不经过登录接口）
+    def auth(self, user):
+        token = self._tokens.get(user[0])
+        if token is None:
+            token = issue_token(SimpleNamespace(id=user[0], identity=user[4], token_version=user[5]))
+            self._tokens[user[0]] = token
+        return {'Authorization': f'Bearer {token}'}
+
+    def pick(self, rng, identity):
+        users = self.users[identity]
+        return rng.choice(users) if users else None
+
+    # 有合作农户原料的商户及其可用原料
+    def merchant_with_ingredients(self, rng):
+        candidates = [user for user in self.users['商户']
+                      if any(self.farmer_ingredients[p] for p in self.partners[user[0]])]
+        if not candidates:
+            return None, []
+        merchant = rng.choice(candidates)
+        pool = [i for p in self.partners[merchant[0]] for i in self.farmer_ingredients[p]]
+        return merchant, pool
+
+def _admin_headers():
+    return {'X-Admin-Token': Config.ADMIN_TOKEN}
+
+# ---- 只读场景 ----
+
+def _foods_page(rec, client, ctx, rng):
+    rec.call(client, 'food.get_foods', 'GET', '/api/foods?limit=20')
+
+def _foods_all(rec, client, ctx, rng):
+    rec.call(client, 'food.get_foods[full]', 'GET', '/api/foods')
+
+def _user_foods(rec, client, ctx, rng):
+    merchant = ctx.pick(rng, '商户')
+    if merchant:
+        rec.call(client, 'food.get_user_foods', 'GET', f'/api/foods/user?user_id={merchant[0]}')
+
+def _food_trace(rec, client, ctx, rng):
+    if ctx.food_ids:
+        rec.call(client, 'food.get_food_trace', 'GET', f'/api/foods/{rng.choice(ctx.food_ids)}/trace')
+
+def _ingredients_page(rec, client, ctx, rng):
+    rec.call(client, 'ingredient.get_ingredients', 'GET', '/api/ingredients?limit=20')
+
+def _partner_ingredients(rec, client, ctx, rng):
+    merchant = ctx.pick(rng, '商户')
+    if merchant:
+        rec.call(client, 'ingredient.get_partner_ingredients', 'GET',
+                 f'/api/ingredients/partners?user_id={merchant[0]}&limit=20', headers=ctx.auth(merchant))
+
+def _users_page(rec, client, ctx, rng):
+    rec.call(client, 'user.get_users', 'GET', '/api/user/list?limit=20')
+
+def _search_users(rec, client, ctx, rng):
+    merchant, farmer = ctx.pick(rng, '商户'), ctx.pick(rng, '农户')
+    if merchant and farmer:
+        start = rng.randrange(max(1, len(farmer[3]) - 2))
+        rec.call(client, 'user.search_users', 'GET', '/api/user/search',
+                 query_string={'keyword': farmer[3][start:start + 3], 'current_user_id': merchant[0]},
+                 headers=ctx.auth(merchant))
+
+def _partners(rec, client, ctx, rng):
+    merchant = ctx.pick(rng, '商户')
+    if merchant:
+        rec.call(client, 'user.get_partners', 'GET', f'/api/user/partners?user_id={merchant[0]}',
+                 headers=ctx.auth(merchant))
+
+def _received_requests(rec, client, ctx, rng):
+    farmer = ctx.pick(rng, '农户')
+    if farmer:
+        rec.call(client, 'user.get_received_requests', 'GET',
+                 f'/api/user/partner/requests/received?user_id={farmer[0]}', headers=ctx.auth(farmer))
+
+def _login(rec, client, ctx, rng):
+    user = ctx.pick(rng, rng.choice(['农户', '商户', '消费者']))
+    if user:
+        rec.call(client, 'auth.login', 'POST', '/api/auth/login', json={'account': user[1], 'password': user[2]})
+
+def _export(rec, client, ctx, rng):
+    # 未配置管理令牌时导出和管理接口不可用，跳过
+    merchant = ctx.pick(rng, '商户')
+    if merchant and Config.ADMIN_TOKEN:
+        rec.call(client, 'export.export_trace', 'GET', f'/api/export/trace?format=ndjson&merchant_id={merchant[0]}',
+                 headers=_admin_headers())
+
+def _admin(rec, client, ctx, rng):
+    if not Config.ADMIN_TOKEN:
+        return
+    for name, url in (('admin.get_cache_stats', '/api/admin/cache'),
+                      ('admin.get_image_cache_stats', '/api/admin/image-cache'),
+                      ('admin.get_replica_stats', '/api/admin/replicas')):
+        rec.call(client, name, 'GET', url, headers=_admin_headers())
+
+def _image(rec, client, ctx, rng):
+    if ctx.image_path:
+        rec.call(client, 'static.serve_image', 'GET', ctx.image_path)
+
+# ---- 写入场景（创建的数据在场景内删除或保持数量不变）----
+
+def _register(rec, client, ctx, rng):
+    name = ctx.unique_name()
+    rec.call(client, 'auth.register', 'POST', '/api/auth/register',
+             json={'username': name, 'account': name, 'password': '123456', 'identity': '消费者'})
+
+def _update_user(rec, client, ctx, rng):
+    user = ctx.pick(rng, '消费者')
+    if user:
+        rec.call(client, 'user.update_user', 'PUT', '/api/user/info', json={'id': user[0], 'password': user[2]},
+                 headers=ctx.auth(user))
+
+def _food_cycle(rec, client, ctx, rng):
+    merchant, pool = ctx.merchant_with_ingredients(rng)
+    if not merchant:
+        return
+    items = [{'id': i, 'amount': '100g'} for i in rng.sample(pool, min(5, len(pool)))]
+    body = {'name': ctx.unique_name(), 'prise': 10, 'poundage': '500g', 'num': 10,
+            'user_id': merchant[0], 'ingredients': items}
+    response = rec.call(client, 'food.add_food', 'POST', '/api/foods', json=body, headers=ctx.auth(merchant))
+    if response.status_code >= 400:
+        return
+    food_id = response.get_json()['data']['id']
+    rec.call(client, 'food.update_food', 'PUT', f'/api/foods/{food_id}', json=dict(body, num=5),
+             headers=ctx.auth(merchant))
+    rec.call(client, 'food.delete_food', 'DELETE', f'/api/foods/{food_id}?user_id={merchant[0]}',
+             headers=ctx.auth(merchant))
+
+def _ingredient_cycle(rec, client, ctx, rng):
+    farmer = ctx.pick(rng, '农户')
+    if not farmer:
+        return
+    response = rec.call(client, 'ingredient.add_ingredient', 'POST', '/api/ingredients', data={
+        'user_id': farmer[0], 'name': ctx.unique_name(), 'type': '蔬菜类',
+        'planting_image': (io.BytesIO(SAMPLE_PNG), 'bench.png')}, headers=ctx.auth(farmer))
+    if response.status_code >= 400:
+        return
+    ingredient = response.get_json()['data']
+    rec.call(client, 'ingredient.update_ingredient', 'PUT', f"/api/ingredients/{ingredient['id']}",
+             data={'user_id': farmer[0], 'name': ingredient['name'], 'description': 'bench'},
+             headers=ctx.auth(farmer))
+    rec.call(client, 'ingredient.delete_ingredient', 'DELETE',
+             f"/api/ingredients/{ingredient['id']}?user_id={farmer[0]}", headers=ctx.auth(farmer))
+
+def _partner_cycle(rec, client, ctx, rng):
+    merchant, farmer = ctx.pick(rng, '商户'), ctx.pick(rng, '农户')
+    if not merchant or not farmer or farmer[0] in ctx.partners[merchant[0]]:
+        return
+    pair = {'user_id': merchant[0], 'partner_id': farmer[0]}
+    headers = ctx.auth(merchant)
+    rec.call(client, 'user.add_partner', 'POST', '/api/user/partner/add', json=pair, headers=headers)
+    rec.call(client, 'user.remove_partner', 'POST', '/api/user/partner/remove', json=pair, headers=headers)
+    rec.call(client, 'user.send_partner_request', 'POST', '/api/user/partner/request', json=pair, headers=headers)
+    response = rec.call(client, 'user.get_received_requests', 'GET',
+                        f'/api/user/partner/requests/received?user_id={farmer[0]}', headers=ctx.auth(farmer))
+    for item in (response.get_json() or {}).get('data') or []:
+        if item.get('sender_id') == merchant[0]:
+            rec.call(client, 'user.respond_to_request', 'POST', '/api/user/partner/request/respond',
+                     json={'request_id': item['request_id'], 'user_id': farmer[0], 'action': 'reject'},
+                     headers=ctx.auth(farmer))
+
+def _upload_cycle(rec, client, ctx, rng):
+    farmer = ctx.pick(rng, '农户')
+    if not farmer:
+        return
+    headers = ctx.auth(farmer)
+    response = rec.call(client, 'upload.init_upload', 'POST', '/api/uploads', json={
+        'field': 'growing_image', 'filename': 'bench.png', 'size': len(SAMPLE_PNG)}, headers=headers)
+    if response.status_code >= 400:
+        return
+    upload_id = response.get_json()['data']['upload_id']
+    rec.call(client, 'upload.upload_part', 'PUT', f'/api/uploads/{upload_id}/parts/0', data=SAMPLE_PNG,
+             headers=headers)
+    rec.call(client, 'upload.get_upload', 'GET', f'/api/uploads/{upload_id}', headers=headers)
+    rec.call(client, 'upload.finish_upload', 'POST', f'/api/uploads/{upload_id}/complete', headers=headers)
+    rec.call(client, 'upload.cancel_upload', 'DELETE', f'/api/uploads/{upload_id}', headers=headers)
+
+def _import_dry_run(rec, client, ctx, rng):
+    farmer = ctx.pick(rng, '农户')
+    if not farmer:
+        return
+    rows = 'name,type\n' + ''.join(f"{ctx.unique_name()},蔬菜类\n" for _ in range(50))
+    rec.call(client, 'import.bulk_import_ingredients', 'POST', '/api/import/ingredients', data={
+        'user_id': farmer[0], 'dry_run': '1', 'file': (io.BytesIO(rows.encode('utf-8')), 'bench.csv')},
+        headers=ctx.auth(farmer))
+    rows = 'name,prise,poundage,num\n' + ''.join(f"{ctx.unique_name()},10,500g,1\n" for _ in range(50))
+    rec.call(client, 'import.bulk_import_foods', 'POST', '/api/import/foods', data={
+        'user_id': farmer[0], 'dry_run': '1', 'file': (io.BytesIO(rows.encode('utf-8')), 'bench.csv')},
+        headers=ctx.auth(farmer))
+
+# 场景：名称 -> (函数, 是否写入)
+SCENARIOS = {
+    'foods_page': (_foods_page, False),
+    'foods_all': (_foods_all, False),
+    'user_foods': (_user_foods, False),
+    'food_trace': (_food_trace, False),
+    'ingredients_page': (_ingredients_page, False),
+    'partner_ingredients': (_partner_ingredients, False),
+    'users_page': (_users_page, False),
+    'search_users': (_search_users, False),
+    'partners': (_partners, False),
+    'received_requests': (_received_requests, False),
+    'login': (_login, False),
+    'export': (_export, False),
+    'admin': (_admin, False),
+    'register': (_register, True),
+    'update_user': (_update_user, True),
+    'food_cycle': (_food_cycle, True),
+    'ingredient_cycle': (_ingredient_cycle, True),
+    'partner_cycle': (_partner_cycle, True),
+    'upload_cycle': (_upload_cycle, True),
+    'import_dry_run': (_import_dry_run, True),
+    'image': (_image, False),
+}
+
+# 运行基准测试：
+# 1. 顺序执行每个场景 iterations 次（先预热一次），得到各接口的单请求延迟和SQL语句数；
+# 2. concurrency 个线程在 duration 秒内随机执行场景（默认只读，writes=True 时包含写入场景）
+def run_benchmark(app, iterations=20, concurrency=8, duration=10.0, writes=False, cold=False, seed=1):
+    with app.app_context():
+        counter = SqlCounter()
+        counter.install(db.engines.values())
+        try:
+            ctx = BenchContext()
+            client = app.test_client()
+            rng = random.Random(seed)
+            
+            warmup = Recorder(counter, cold)
+            sequential = Recorder(counter, cold)
+            for fn, _ in SCENARIOS.values():
+                fn(warmup, client, ctx, rng)
+                for _ in range(iterations):
+                    fn(sequential, client, ctx, rng)
+            
+            load = Recorder(counter, cold)
+            names = [name for name, (_, is_write) in SCENARIOS.items() if writes or not is_write]
+            deadline = time.perf_counter() + duration
+            
+            def worker(index):
+                worker_client = app.test_client()
+                worker_rng = random.Random(seed * 1000 + index)
+                while time.perf_counter() < deadline:
+                    SCENARIOS[worker_rng.choice(names)][0](load, worker_client, ctx, worker_rng)
+            
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall_time = time.perf_counter() - start
+        finally:
+            counter.remove()
+        
+        load_endpoints = summarize(load.samples, wall_time)
+        total = sum(item['count'] for item in load_endpoints.values())
+        return {
+            'meta': {
+                'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'database': db.engine.url.get_backend_name(),
+                'python': platform.python_version(),
+                'iterations': iterations,
+                'concurrency': concurrency,
+                'duration': duration,
+                'writes': writes,
+                'cache': 'cold' if cold else 'warm',
+                'seed': seed,
+                'data': {
+                    'farmers': len(ctx.users['农户']),
+                    'merchants': len(ctx.users['商户']),
+                    'consumers': len(ctx.users['消费者']),
+                },
+            },
+            'sequential': summarize(sequential.samples),
+            'load': {
+                'wall_time': round(wall_time, 3),
+                'requests': total,
+                'errors': sum(item['errors'] for item in load_endpoints.values()),
+                'throughput_rps': round(total / wall_time, 2) if wall_time else None,
+                'endpoints': load_endpoints,
+            },
+        }
+
+# 与基线报告比较顺序测试结果：p95 延迟增加超过 threshold（比例，且至少1毫秒）或平均SQL语句数增加视为退化
+def compare_reports(report, baseline, threshold=0.2):
+    regressions = []
+    for name, current in report['sequential'].items():
+        previous = baseline.get('sequential', {}).get(name)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold) and current['p95_ms'] - previous['p95_ms'] >= 1:
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['sql_mean'] > previous['sql_mean']:
+            regressions.append(f"{name}: SQL {previous['sql_mean']} -> {current['sql_mean']}")
+    return regressions
+
+def load_report(path):
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, g, Response
+from config import Config
+
+# 进程内响应缓存（LRU + TTL）
+# 写操作提交后调用 invalidate() 递增代数并清空缓存；
+# 多进程部署时各进程缓存相互独立；接口同时使用 etag_versioned 时，
+# 数据版本号会成为缓存键的一部分，其他进程的写入也能立即生效
+class ResponseCache:
+    def __init__(self, max_entries=256, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()  # key -> (过期时间, 值)
+        self._inflight = {}  # key -> 正在重建该key的事件
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    # 读取缓存；未命中时由一个请求负责重建，其余并发请求等待其结果（single-flight）
+    def get_or_build(self, key, builder):
+        waited = False
+        while True:
+            with self._lock:
+                full_key = (self.generation, key)
+                entry = self._lookup(full_key)
+                if entry is not None:
+                    if waited:
+                        self.coalesced += 1
+                    else:
+                        self.hits += 1
+                    return entry[1]
+                event = self._inflight.get(full_key)
+                if event is None:
+                    event = threading.Event()
+                    self._inflight[full_key] = event
+                    self.misses += 1
+                    break
+            # 其他请求正在重建，等待后重新读取；重建失败时由本请求接手
+            event.wait()
+            waited = True
+
+        try:
+            value = builder()
+            with self._lock:
+                # 重建期间发生写操作时结果已过期，不写入缓存
+                if value is not None and full_key[0] == self.generation:
+                    self._entries[full_key] = (time.monotonic() + self.ttl, value)
+                    self._entries.move_to_end(full_key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(full_key, None)
+            event.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'generation': self.generation,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+            }
+
+# 小文件内存缓存（按总字节数淘汰的LRU）
+# 每次读取时比较文件的修改时间和大小，文件被替换或删除后不会返回旧内容
+class FileCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_file_size=512 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self._entries = OrderedDict()  # 路径 -> ((修改时间, 大小), 内容)
+        self._lock = threading.Lock()
+
+    # 文件是否适合放入内存缓存
+    def accepts(self, stat):
+        return self.max_bytes > 0 and stat.st_size <= self.max_file_size
+
+    def get(self, path, stat):
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                self.bytes_served += len(entry[1])
+                return entry[1]
+            self.misses += 1
+
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._entries[path] = (signature, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        return data
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'max_file_size': self.max_file_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes_served': self.bytes_served,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# 食品、原料目录共用一个缓存（食品数据中包含原料信息）
+catalog_cache = ResponseCache(Config.RESPONSE_CACHE_SIZE, Config.RESPONSE_CACHE_TTL)
+
+# 热门小图片的内存缓存
+image_cache = FileCache(Config.IMAGE_CACHE_BYTES, Config.IMAGE_CACHE_MAX_FILE)
+
+# 缓存GET接口的响应，key由接口名、数据版本号、路径参数和查询参数组成；只缓存200响应
+# unless 返回True时跳过缓存（如流式返回）
+def cached_response(cache, unless=None):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if unless is not None and unless():
+                return func(*args, **kwargs)
+            key = (request.endpoint, g.get('data_versions'), tuple(sorted((request.view_args or {}).items())),
+                   tuple(sorted(request.args.items(multi=True))))
+
+            def build():
+                rv = func(*args, **kwargs)
+                if isinstance(rv, Response) and rv.status_code == 200 and not rv.is_streamed:
+                    return rv.get_data(), rv.mimetype
+                # 非200响应不缓存，直接返回给当前请求
+                build.uncached = rv
+                return None
+
+            build.uncached = None
+            value = cache.get_or_build(key, build)
+            if value is None:
+                return build.uncached
+            body, mimetype = value
+            return Response(body, mimetype=mimetype)
+        return wrapper
+    return decorator
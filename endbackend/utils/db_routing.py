@@ -0,0 +1,112 @@
+import itertools
+import threading
+import time
+from flask import request, g
+from sqlalchemy import text
+from config import Config
+from models import db
+
+STICKY_COOKIE = 'db_sticky'
+
+# 只读副本路由：GET/HEAD 请求轮询选择健康的副本，其他请求及无可用副本时使用主库；
+# 用户写入后的一段时间内（READ_YOUR_WRITES_SECONDS）该用户的读请求仍走主库，
+# 通过 Cookie 和按 user_id 记录的时间判断
+class ReplicaRouter:
+    def __init__(self):
+        self.bind_keys = []
+        self._health = {}  # bind_key -> (下次检查时间, 是否健康)
+        self._sticky_users = {}  # user_id -> 截止时间
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.bind_keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {}
+                                if key.startswith('replica'))
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['replica_router'] = self
+
+    # 检查副本是否可用（结果缓存 REPLICA_HEALTH_INTERVAL 秒）
+    def is_healthy(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._health.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            # 检查期间其他请求沿用上次结果，避免同时检查
+            self._health[key] = (now + Config.REPLICA_HEALTH_INTERVAL, entry[1] if entry else False)
+        try:
+            with db.engines[key].connect() as conn:
+                conn.execute(text('SELECT 1 FROM data_version'))
+            healthy = True
+        except Exception:
+            healthy = False
+        with self._lock:
+            self._health[key] = (now + Config.REPLICA_HEALTH_INTERVAL, healthy)
+        return healthy
+
+    # 轮询选择一个健康的副本，都不可用时返回None（使用主库）
+    def choose(self):
+        if not self.bind_keys:
+            return None
+        start = next(self._counter)
+        for offset in range(len(self.bind_keys)):
+            key = self.bind_keys[(start + offset) % len(self.bind_keys)]
+            if self.is_healthy(key):
+                return key
+        return None
+
+    def _user_id(self):
+        user_id = request.args.get('user_id') or request.form.get('user_id')
+        if not user_id and request.is_json:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                user_id = data.get('user_id')
+        return str(user_id) if user_id else None
+
+    def _is_sticky(self):
+        now = time.time()
+        try:
+            if float(request.cookies.get(STICKY_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        user_id = self._user_id()
+        return user_id is not None and self._sticky_users.get(user_id, 0) > now
+
+    def _before_request(self):
+        g.db_replica = None
+        g.db_replica_key = None
+        if request.method in ('GET', 'HEAD') and self.bind_keys and not self._is_sticky():
+            key = self.choose()
+            if key is not None:
+                g.db_replica = db.engines[key]
+                g.db_replica_key = key
+
+    # 写请求成功后记录粘滞时间
+    def _after_request(self, response):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400 or not self.bind_keys:
+            return response
+        until = time.time() + Config.READ_YOUR_WRITES_SECONDS
+        response.set_cookie(STICKY_COOKIE, str(int(until) + 1), max_age=Config.READ_YOUR_WRITES_SECONDS,
+                            httponly=True, samesite='Lax')
+        user_id = self._user_id()
+        if user_id:
+            with self._lock:
+                self._sticky_users[user_id] = until
+                if len(self._sticky_users) > 10000:
+                    now = time.time()
+                    self._sticky_users = {k: v for k, v in self._sticky_users.items() if v > now}
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'replicas': [
+                    {'bind': key, 'healthy': self._health[key][1] if key in self._health else None}
+                    for key in self.bind_keys
+                ],
+                'sticky_users': len(self._sticky_users)
+            }
+
+replica_router = ReplicaRouter()
@@ -1,5 +1,7 @@
+import hmac
 from functools import wraps
 from flask import request, jsonify
+from config import Config
 
 # 请求参数验证装饰器
 def validate_params(required_params):
@@ -20,4 +22,18 @@ def validate_params(required_params):
                 }), 400
             return func(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+# 请求头 X-Admin-Token 是否与配置的管理令牌一致（未配置 ADMIN_TOKEN 时始终为False）
+def has_admin_token():
+    token = request.headers.get('X-Admin-Token')
+    return bool(Config.ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, Config.ADMIN_TOKEN)
+
+# 管理接口权限验证装饰器：要求请求头携带管理令牌；未配置 ADMIN_TOKEN 时管理接口全部禁用
+def admin_required(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not has_admin_token():
+            return jsonify({"message": "无权限访问管理接口", "status": "error"}), 403
+        return func(*args, **kwargs)
+    return wrapper
\ No newline at end of file
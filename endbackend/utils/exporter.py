@@ -0,0 +1,97 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from config import Config
+from models import db, Food, FoodIngredient, Ingredient, User
+
+# 导出字段（每行对应食品中的一种原料）
+EXPORT_COLUMNS = [
+    'food_id', 'food_name', 'food_category', 'cooking_time',
+    'merchant_id', 'merchant_name',
+    'ingredient_id', 'ingredient_name', 'ingredient_type', 'amount',
+    'farming_time', 'production_time',
+    'planting_image', 'growing_image', 'production_image', 'quality_report_image',
+    'farmer_id', 'farmer_name',
+]
+
+class ExportError(ValueError):
+    pass
+
+# 解析日期范围参数
+def parse_date(value, label):
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"{label}格式不正确")
+
+# 食品→原料→农户的扁平查询，可按商户和制作时间范围筛选
+def export_statement(merchant_id=None, start=None, end=None):
+    merchant = aliased(User)
+    farmer = aliased(User)
+    stmt = select(
+        Food.id, Food.name, Food.category, Food.cooking_time,
+        merchant.id, merchant.username,
+        Ingredient.id, Ingredient.name, Ingredient.type, FoodIngredient.amount,
+        Ingredient.farming_time, Ingredient.production_time,
+        Ingredient.planting_image, Ingredient.growing_image,
+        Ingredient.production_image, Ingredient.quality_report_image,
+        farmer.id, farmer.username
+    ).select_from(Food)\
+        .outerjoin(merchant, merchant.id == Food.user_id)\
+        .outerjoin(FoodIngredient, FoodIngredient.food_id == Food.id)\
+        .outerjoin(Ingredient, Ingredient.id == FoodIngredient.ingredient_id)\
+        .outerjoin(farmer, farmer.id == Ingredient.user_id)
+    if merchant_id:
+        stmt = stmt.where(Food.user_id == merchant_id)
+    if start:
+        stmt = stmt.where(Food.cooking_time >= start)
+    if end:
+        stmt = stmt.where(Food.cooking_time <= end)
+    return stmt.order_by(Food.id, Ingredient.id)
+
+def _value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+# 逐批从服务端游标读取并编码为CSV或NDJSON，compress=True时输出gzip；
+# 每次只在内存中保留一个批次
+def iter_export(fmt, merchant_id=None, start=None, end=None, compress=False):
+    batch_size = Config.STREAM_BATCH_SIZE
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def encode(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    result = db.session.execute(
+        export_statement(merchant_id, start, end).execution_options(yield_per=batch_size))
+    try:
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            # 带BOM，便于Excel正确识别中文
+            buffer.write('﻿')
+            writer.writerow(EXPORT_COLUMNS)
+            for rows in result.partitions():
+                writer.writerows([_value(v) for v in row] for row in rows)
+                yield encode(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield encode(buffer.getvalue())
+        else:
+            for rows in result.partitions():
+                yield encode(''.join(
+                    json.dumps(dict(zip(EXPORT_COLUMNS, map(_value, row))), ensure_ascii=False) + '\n'
+                    for row in rows))
+    finally:
+        result.close()
+    if compressor:
+        yield compressor.flush()
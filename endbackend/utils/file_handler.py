@@ -1,27 +1,220 @@
 import os
+import re
 import uuid
-import datetime
-from werkzeug.utils import secure_filename
+import hashlib
+import logging
+from collections import Counter
+from sqlalchemy import event, select, update, delete
+from sqlalchemy.orm import Session
+from werkzeug.security import safe_join
 from config import Config
+from models import db, StoredFile
+from utils.image_variants import IMAGE_EXTENSIONS, failure_marker, queue_variants, variant_names
 
-# 文件上传处理函数
-def save_file(file, folder):
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+# 原料图片字段与存储目录
+IMAGE_FOLDERS = {
+    'planting_image': 'in',
+    'growing_image': 'grow',
+    'production_image': 'out',
+    'quality_report_image': 'quality_inspection_report',
+}
+
+# 允许保存的文件类型（前端只能选择图片）
+ALLOWED_EXTENSIONS = IMAGE_EXTENSIONS
+
+class FileTypeError(ValueError):
+    pass
+
+# 内容寻址路径的格式
+CONTENT_PATH = re.compile(r'/(?P<folder>\w+)/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+')
+
+# 按内容哈希计算存储路径，按哈希前缀分两级目录：/folder/ab/cd/<sha256>.ext
+def content_path(folder, digest, ext):
+    return f"/{folder}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+# 是否为图片目录（folder 不为空时为该目录）下格式正确的内容寻址路径
+def is_content_path(path, folder=None):
+    match = CONTENT_PATH.fullmatch(path or '')
+    if match is None or match['folder'] not in IMAGE_FOLDERS.values():
+        return False
+    return folder is None or match['folder'] == folder
+
+# 返回 paths 中已在 stored_file 表登记的内容寻址路径（一次 IN 查询）
+def stored_paths(paths):
+    paths = {p for p in paths if is_content_path(p)}
+    if not paths:
+        return set()
+    return set(db.session.scalars(select(StoredFile.path).where(StoredFile.path.in_(paths))))
+
+def allowed_file(filename):
+    return os.path.splitext(filename or '')[1].lower() in ALLOWED_EXTENSIONS
+
+# 文件扩展名（小写）：直接取原始文件名的扩展名（secure_filename 会去掉中文等非ASCII字符，
+# 「照片.jpg」会变成「jpg」而丢失扩展名），不在允许列表中时抛出 FileTypeError
+def file_extension(filename):
+    if not allowed_file(filename):
+        raise FileTypeError(f"不支持的文件类型，只能上传图片（{'、'.join(ALLOWED_EXTENSIONS)}）")
+    return os.path.splitext(filename)[1].lower()
+
+# 访问路径对应的磁盘路径：只允许图片目录内的路径（含 .. 等越出目录的路径返回None）
+def disk_path(path):
+    folder, _, rest = (path or '').lstrip('/').partition('/')
+    if folder not in IMAGE_FOLDERS.values() or not rest:
+        return None
+    return safe_join(Config.STATIC_FOLDER, folder, rest)
+
+# 保存文件内容：边接收边计算SHA-256写入临时文件，再移动到内容寻址路径；
+# 相同内容已存在时直接丢弃临时文件。retain 为 True 时同时增加一次引用（见 move_into_store）
+def store_file(file, folder, retain=False):
     if not file:
         return None
-        
-    # 生成安全的文件名
-    filename = secure_filename(file.filename)
-    # 添加时间戳和UUID避免文件名冲突
-    unique_filename = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex}_{filename}"
+    
+    # 文件名只用于取扩展名
+    ext = file_extension(file.filename)
     
     # 确保目录存在
     folder_path = os.path.join(Config.STATIC_FOLDER, folder)
-    if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
-        
-    # 保存文件
-    file_path = os.path.join(folder_path, unique_filename)
-    file.save(file_path)
+    os.makedirs(folder_path, exist_ok=True)
     
-    # 返回相对路径（用于URL访问）
-    return f"/{folder}/{unique_filename}"
\ No newline at end of file
+    sha = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(folder_path, f".upload_{uuid.uuid4().hex}")
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        
+        # 返回相对路径（用于URL访问）
+        return move_into_store(tmp_path, folder, sha.hexdigest(), ext, retain)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# 把已算好哈希的本地文件移动到内容寻址路径（需与存储目录在同一文件系统），相同内容已存在时删除该文件。
+# retain 为 True 时先增加引用计数（更新/插入记录，锁定到事务结束）再检查文件是否存在，
+# 与 remove_unreferenced 互斥，不会复用一个正在被删除的文件；本次新移入的文件在事务回滚时删除。
+# restore_to 为本地文件路径时（分片上传的合并文件），回滚后文件回到该路径，可以重新引用
+def move_into_store(local_path, folder, digest, ext, retain=False, restore_to=None):
+    path = content_path(folder, digest, ext)
+    target = disk_path(path)
+    if retain:
+        _retain_stored(path, digest, os.path.getsize(local_path))
+    if os.path.exists(target):
+        # 保留 restore_to 指定的本地文件，由调用方在提交后删除
+        if restore_to != local_path:
+            os.remove(local_path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(local_path, target)
+        if retain:
+            db.session.info.setdefault('new_files', []).append((path, restore_to))
+        # 后台生成缩略图
+        queue_variants(target)
+    return path
+
+# 文件上传处理函数：保存文件并记一次引用（随当前事务提交）
+def save_file(file, folder):
+    return store_file(file, folder, retain=True)
+
+# 为即将放入存储目录的文件增加一次引用，没有记录时新建
+def _retain_stored(path, digest, size):
+    result = db.session.execute(
+        update(StoredFile)
+        .where(StoredFile.path == path)
+        .values(ref_count=StoredFile.ref_count + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(StoredFile(path=path, sha256=digest, size=size, ref_count=1))
+        db.session.flush()
+
+@event.listens_for(Session, 'after_commit')
+def _keep_new_files(session):
+    session.info.pop('new_files', None)
+
+# 事务回滚（或未提交就关闭）时清理本次新移入的文件：在新事务中确认没有其他请求引用后再删除
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_new_files(session, transaction):
+    if transaction.parent is not None or not session.info.get('new_files'):
+        return
+    new_files = session.info.pop('new_files')
+    try:
+        with db.engine.begin() as conn:
+            for path, restore_to in new_files:
+                conn.execute(delete(StoredFile).where(StoredFile.path == path, StoredFile.ref_count <= 0))
+                if conn.scalar(select(StoredFile.path).where(StoredFile.path == path)) is not None:
+                    continue
+                if restore_to and not os.path.exists(restore_to) and os.path.isdir(os.path.dirname(restore_to)):
+                    os.replace(disk_path(path), restore_to)
+                remove_from_disk(path)
+    except Exception:
+        # 不影响回滚本身，残留的文件由 flask migrate-files 清理
+        logger.exception("清理回滚的上传文件失败: %s", new_files)
+
+# 增加引用计数，paths 中同一路径出现几次就增加几次；
+# 只为已保存到存储目录的内容寻址文件登记新记录，其他路径（不存在的文件、旧版路径等）不计数
+def retain_files(paths):
+    for path, count in Counter(p for p in paths if p).items():
+        result = db.session.execute(
+            update(StoredFile)
+            .where(StoredFile.path == path)
+            .values(ref_count=StoredFile.ref_count + count)
+        )
+        if result.rowcount == 0:
+            target = disk_path(path) if is_content_path(path) else None
+            if target is None or not os.path.isfile(target):
+                continue
+            db.session.add(StoredFile(
+                path=path,
+                sha256=os.path.splitext(os.path.basename(path))[0],
+                size=os.path.getsize(target),
+                ref_count=count
+            ))
+            db.session.flush()
+
+# 减少引用计数（随当前事务提交），提交后调用 remove_unreferenced 删除不再被引用的文件
+def release_files(paths):
+    paths = [p for p in paths if p]
+    for path, count in Counter(paths).items():
+        db.session.execute(
+            update(StoredFile)
+            .where(StoredFile.path == path)
+            .values(ref_count=StoredFile.ref_count - count)
+        )
+    return paths
+
+# 删除引用计数已为0的文件及其缩略图；需在释放引用的事务提交后调用。
+# 文件在删除记录的同一事务中删除：记录被锁定期间其他请求的 move_into_store 会等待，
+# 事务结束后发现记录已不存在，重新放入文件，不会引用一个已被删除的文件
+def remove_unreferenced(paths):
+    removed = []
+    for path in set(paths):
+        result = db.session.execute(
+            delete(StoredFile).where(StoredFile.path == path, StoredFile.ref_count <= 0)
+        )
+        if result.rowcount:
+            remove_from_disk(path)
+            removed.append(path)
+    db.session.commit()
+    return removed
+
+# 从磁盘删除文件及其缩略图（只删除图片目录内的文件）
+def remove_from_disk(path):
+    target = disk_path(path)
+    if target is None:
+        return
+    folder, name = os.path.split(target)
+    for filename in [name, failure_marker(name)] + variant_names(name):
+        try:
+            os.remove(os.path.join(folder, filename))
+        except FileNotFoundError:
+            pass
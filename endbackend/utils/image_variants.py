@@ -0,0 +1,109 @@
+import importlib.util
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+# 是否安装了Pillow（未安装时不生成缩略图，始终返回原图）；
+# 只检查不导入，Pillow 在第一次生成缩略图时才导入，不增加启动时间
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif')
+# 缩略图格式：扩展名 -> Pillow格式名
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+def is_image(filename):
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+# 缩略图与原图放在同一目录，文件名由原图名、宽度和格式决定，例如 a.jpg -> a@w320.webp
+def variant_name(filename, width, ext):
+    return f"{os.path.splitext(filename)[0]}@w{width}.{ext}"
+
+def variant_names(filename):
+    return [variant_name(filename, width, ext) for width in Config.IMAGE_VARIANT_WIDTHS for ext in VARIANT_FORMATS]
+
+# 缩略图生成失败的标记文件（如无法解码的图片），例如 a.jpg -> a@failed；
+# 存在标记时不再排队生成，直接返回原图（各进程共用）
+def failure_marker(filename):
+    return f"{os.path.splitext(filename)[0]}@failed"
+
+def variants_failed(path):
+    folder, filename = os.path.split(path)
+    return os.path.exists(os.path.join(folder, failure_marker(filename)))
+
+# 选择不小于请求宽度的最小缩略图宽度；请求宽度超过所有规格时返回None（使用原图）
+def pick_width(requested):
+    for width in sorted(Config.IMAGE_VARIANT_WIDTHS):
+        if width >= requested:
+            return width
+    return None
+
+# 生成一张图片的全部缩略图；原图比目标宽度小时按原尺寸重新编码，保证每个规格都有对应文件
+def generate_variants(path):
+    if not PILLOW_AVAILABLE:
+        return
+    from PIL import Image, ImageOps
+    folder, filename = os.path.split(path)
+    with Image.open(path) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    for width in Config.IMAGE_VARIANT_WIDTHS:
+        if image.width > width:
+            resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        else:
+            resized = image
+        for ext, fmt in VARIANT_FORMATS.items():
+            output = resized
+            if fmt == 'JPEG' and output.mode != 'RGB':
+                output = output.convert('RGB')
+            elif fmt == 'WEBP' and output.mode not in ('RGB', 'RGBA'):
+                output = output.convert('RGBA' if 'A' in output.getbands() else 'RGB')
+            target = os.path.join(folder, variant_name(filename, width, ext))
+            # 先写临时文件再替换，避免读到写了一半的图片
+            tmp = f"{target}.tmp"
+            output.save(tmp, fmt, quality=Config.IMAGE_VARIANT_QUALITY)
+            os.replace(tmp, target)
+    # 重新生成成功后清除失败标记
+    try:
+        os.remove(os.path.join(folder, failure_marker(filename)))
+    except FileNotFoundError:
+        pass
+
+def _run(path):
+    try:
+        generate_variants(path)
+    except Exception as e:
+        logger.exception("生成缩略图失败: %s", path)
+        folder, filename = os.path.split(path)
+        try:
+            with open(os.path.join(folder, failure_marker(filename)), 'w', encoding='utf-8') as fp:
+                fp.write(f"{type(e).__name__}: {e}\n")
+        except OSError:
+            pass
+    finally:
+        with _lock:
+            _pending.discard(path)
+
+# 把缩略图生成任务放入后台线程池，不阻塞请求；
+# 排队任务数有上限，超出时丢弃（访问该图片时会重新排队）；已生成失败的图片不再排队
+def queue_variants(path):
+    global _executor
+    if not PILLOW_AVAILABLE or not is_image(path) or variants_failed(path):
+        return False
+    with _lock:
+        if path in _pending or len(_pending) >= Config.IMAGE_VARIANT_QUEUE:
+            return False
+        _pending.add(path)
+        # 首次使用时创建线程池（多进程部署时在子进程中创建）
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.IMAGE_VARIANT_WORKERS,
+                                           thread_name_prefix='image-variants')
+    _executor.submit(_run, path)
+    return True
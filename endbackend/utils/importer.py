@@ -0,0 +1,280 @@
+import csv
+import datetime
+import io
+import json
+import os
+import zipfile
+from sqlalchemy import and_, insert
+from werkzeug.datastructures import FileStorage
+from config import Config
+from models import db, Food, FoodIngredient, Ingredient, User, Partnership
+from utils.cache import catalog_cache
+from utils.file_handler import IMAGE_FOLDERS, allowed_file, is_content_path, store_file, stored_paths, retain_files
+from utils.lineage import rebuild_food_lineage
+from utils.versioning import bump_versions
+
+class ImportRowError(ValueError):
+    pass
+
+# 根据文件名推断格式
+def detect_format(filename, fmt=None):
+    if fmt:
+        fmt = fmt.lower()
+    else:
+        ext = os.path.splitext(filename or '')[1].lower()
+        fmt = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(ext)
+    if fmt not in ('csv', 'jsonl'):
+        raise ImportRowError("仅支持CSV或JSONL格式")
+    return fmt
+
+# 逐行读取记录，返回 [(行号, 字段字典或错误信息)]
+def read_records(stream, fmt):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    records = []
+    if fmt == 'csv':
+        for line_no, row in enumerate(csv.DictReader(text), start=2):
+            records.append((line_no, {k.strip(): v for k, v in row.items() if k}))
+    else:
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                records.append((line_no, "JSON格式不正确"))
+                continue
+            records.append((line_no, row if isinstance(row, dict) else "每行必须是JSON对象"))
+    text.detach()
+    return records
+
+# 图片压缩包：按文件名查找，同一图片只保存一次（引用计数在写入原料时增加）
+class ImageArchive:
+    def __init__(self, stream=None):
+        self._zip = zipfile.ZipFile(stream) if stream is not None else None
+        self._names = {}
+        if self._zip:
+            for name in self._zip.namelist():
+                if not name.endswith('/'):
+                    self._names.setdefault(os.path.basename(name), name)
+        self._saved = {}
+        self._stored = set()
+
+    # 预先查询记录中引用的已上传图片（一次查询）
+    def load_stored(self, records):
+        self._stored = stored_paths(str(row.get(field)).strip() for _, row in records
+                                    if isinstance(row, dict) for field in IMAGE_FOLDERS if row.get(field))
+
+    # 图片引用是否有效：压缩包内的文件名，或该目录下已登记的内容寻址路径
+    def has(self, value, folder):
+        return value in self._names or (is_content_path(value, folder) and value in self._stored)
+
+    def resolve(self, value, folder):
+        if value not in self._names:
+            return value
+        key = (value, folder)
+        if key not in self._saved:
+            with self._zip.open(self._names[value]) as fp:
+                self._saved[key] = store_file(FileStorage(stream=fp, filename=value), folder)
+        return self._saved[key]
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+
+def _parse_time(value, label):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ImportRowError(f"{label}格式不正确")
+
+def _text(row, key, default=''):
+    value = row.get(key)
+    return default if value is None else str(value)
+
+# 校验一行原料数据
+def _validate_ingredient(row, images):
+    name = _text(row, 'name').strip()
+    if not name:
+        raise ImportRowError("缺少原料名称")
+    record = {
+        'name': name,
+        'type': _text(row, 'type'),
+        'description': _text(row, 'description'),
+        'farming_time': _parse_time(row.get('farming_time'), '养殖时间'),
+        'production_time': _parse_time(row.get('production_time'), '出产时间'),
+    }
+    for field, folder in IMAGE_FOLDERS.items():
+        value = _text(row, field).strip()
+        if value and not images.has(value, folder):
+            raise ImportRowError(f"图片 '{value}' 不存在")
+        if value and not is_content_path(value) and not allowed_file(value):
+            raise ImportRowError(f"图片 '{value}' 的文件类型不支持")
+        record[field] = value or None
+    return record
+
+# 解析食品行中的原料列表：JSONL为 [{"id":1,"amount":"2kg"}]，CSV为 "1:2kg;2:500g"
+def _parse_food_ingredients(value):
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        items = []
+        for part in value.split(';'):
+            if not part.strip():
+                continue
+            ingredient_id, _, amount = part.partition(':')
+            items.append({'id': ingredient_id.strip(), 'amount': amount.strip()})
+        value = items
+    if not isinstance(value, list):
+        raise ImportRowError("原料列表格式不正确")
+    links = {}
+    for item in value:
+        try:
+            ingredient_id = int(item.get('id'))
+        except (AttributeError, TypeError, ValueError):
+            raise ImportRowError("原料ID格式不正确")
+        links.setdefault(ingredient_id, _text(item, 'amount'))
+    return [{'ingredient_id': k, 'amount': v} for k, v in links.items()]
+
+# 校验一行食品数据
+def _validate_food(row):
+    name = _text(row, 'name').strip()
+    if not name:
+        raise ImportRowError("缺少食品名称")
+    for key in ('prise', 'poundage', 'num'):
+        if row.get(key) in (None, ''):
+            raise ImportRowError(f"缺少必要参数: {key}")
+    try:
+        price = float(row['prise'])
+    except (TypeError, ValueError):
+        raise ImportRowError("价格格式不正确")
+    if price <= 0:
+        raise ImportRowError("价格必须为正数")
+    try:
+        num = int(row['num'])
+    except (TypeError, ValueError):
+        raise ImportRowError("库存格式不正确")
+    if num < 0:
+        raise ImportRowError("库存不能为负数")
+    return {
+        'name': name,
+        'prise': price,
+        'info': _text(row, 'info'),
+        'poundage': _text(row, 'poundage'),
+        'num': num,
+        'category': _text(row, 'category'),
+        'cooking_time': _parse_time(row.get('cooking_time'), '制作时间'),
+        'links': _parse_food_ingredients(row.get('ingredients')),
+    }
+
+# 对全部记录做一遍校验，返回 (有效记录[(行号, 数据)], 错误列表)
+def _validate_all(records, validate):
+    valid, errors = [], []
+    for line_no, row in records:
+        if isinstance(row, str):
+            errors.append({'row': line_no, 'message': row})
+            continue
+        try:
+            valid.append((line_no, validate(row)))
+        except ImportRowError as e:
+            errors.append({'row': line_no, 'message': str(e)})
+    return valid, errors
+
+def _chunks(items):
+    size = Config.IMPORT_CHUNK_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _report(total, imported, errors):
+    return {
+        'total': total,
+        'imported': imported,
+        'failed': len(errors),
+        'errors': sorted(errors, key=lambda e: e['row'])
+    }
+
+# 批量导入原料：一次校验全部记录，按批次 executemany 插入，每批一个事务
+def import_ingredients(user, records, images=None, dry_run=False):
+    images = images or ImageArchive()
+    images.load_stored(records)
+    valid, errors = _validate_all(records, lambda row: _validate_ingredient(row, images))
+    if dry_run:
+        return _report(len(records), 0, errors)
+
+    imported = 0
+    for chunk in _chunks(valid):
+        try:
+            rows = []
+            for _, record in chunk:
+                row = dict(record, user_id=user.id)
+                for field, folder in IMAGE_FOLDERS.items():
+                    if row[field]:
+                        row[field] = images.resolve(row[field], folder)
+                rows.append(row)
+            db.session.execute(insert(Ingredient), rows)
+            retain_files([row[field] for row in rows for field in IMAGE_FOLDERS])
+            bump_versions('ingredient')
+            db.session.commit()
+            imported += len(rows)
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({'row': line_no, 'message': f"写入失败: {str(e)}"} for line_no, _ in chunk)
+    if imported:
+        catalog_cache.invalidate()
+    return _report(len(records), imported, errors)
+
+# 批量导入食品：一次 IN 查询校验全部引用的原料（商户同时校验合作关系），
+# 按批次写入食品、原料关联（executemany）和溯源记录，每批一个事务
+def import_foods(user, records, dry_run=False):
+    valid, errors = _validate_all(records, _validate_food)
+
+    ingredient_ids = {link['ingredient_id'] for _, record in valid for link in record['links']}
+    allowed = set()
+    if ingredient_ids:
+        query = db.session.query(Ingredient.id, User.identity)\
+            .outerjoin(User, User.id == Ingredient.user_id)\
+            .filter(Ingredient.id.in_(ingredient_ids))
+        if user.identity == '商户':
+            query = query.add_columns(Partnership.partner_id)\
+                .outerjoin(Partnership, and_(Partnership.user_id == user.id,
+                                             Partnership.partner_id == Ingredient.user_id))
+        for row in query:
+            if user.identity != '商户' or (row.identity == '农户' and row.partner_id is not None):
+                allowed.add(row.id)
+
+    checked = []
+    for line_no, record in valid:
+        invalid = [link['ingredient_id'] for link in record['links'] if link['ingredient_id'] not in allowed]
+        if invalid:
+            message = "原料不存在" if user.identity != '商户' else "原料不存在或不是来自您的合作伙伴"
+            errors.append({'row': line_no, 'message': f"{message}: {', '.join(map(str, invalid))}"})
+        else:
+            checked.append((line_no, record))
+    if dry_run:
+        return _report(len(records), 0, errors)
+
+    imported = 0
+    for chunk in _chunks(checked):
+        try:
+            foods = []
+            for _, record in chunk:
+                fields = {k: v for k, v in record.items() if k != 'links'}
+                foods.append(Food(user_id=user.id, **fields))
+            db.session.add_all(foods)
+            db.session.flush()
+
+            link_rows = [dict(link, food_id=food.id)
+                         for food, (_, record) in zip(foods, chunk) for link in record['links']]
+            if link_rows:
+                db.session.execute(insert(FoodIngredient), link_rows)
+            rebuild_food_lineage([food.id for food in foods])
+            bump_versions('food')
+            db.session.commit()
+            imported += len(foods)
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({'row': line_no, 'message': f"写入失败: {str(e)}"} for line_no, _ in chunk)
+    if imported:
+        catalog_cache.invalidate()
+    return _report(len(records), imported, errors)
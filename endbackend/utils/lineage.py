@@ -0,0 +1,60 @@
+from sqlalchemy import select
+from models import db, Food, FoodIngredient, Ingredient, User, FoodLineage
+
+# 从原料复制到溯源表的字段
+INGREDIENT_FIELDS = {
+    'ingredient_name': Ingredient.name,
+    'ingredient_type': Ingredient.type,
+    'farming_time': Ingredient.farming_time,
+    'production_time': Ingredient.production_time,
+    'planting_image': Ingredient.planting_image,
+    'growing_image': Ingredient.growing_image,
+    'production_image': Ingredient.production_image,
+    'quality_report_image': Ingredient.quality_report_image,
+    'farmer_id': Ingredient.user_id,
+}
+
+# 重建指定食品的溯源记录（INSERT ... SELECT 一条语句写入），
+# 需在食品写操作的事务中、关联记录flush之后调用
+def rebuild_food_lineage(food_ids):
+    if not food_ids:
+        return
+    db.session.flush()
+    FoodLineage.query.filter(FoodLineage.food_id.in_(food_ids)).delete(synchronize_session=False)
+    
+    columns = ['food_id', 'ingredient_id', 'amount'] + list(INGREDIENT_FIELDS) + ['farmer_name']
+    source = select(
+        FoodIngredient.food_id, FoodIngredient.ingredient_id, FoodIngredient.amount,
+        *INGREDIENT_FIELDS.values(), User.username
+    ).join(Ingredient, Ingredient.id == FoodIngredient.ingredient_id)\
+        .outerjoin(User, User.id == Ingredient.user_id)\
+        .where(FoodIngredient.food_id.in_(food_ids))
+    db.session.execute(FoodLineage.__table__.insert().from_select(columns, source))
+
+# 删除食品的溯源记录
+def delete_food_lineage(food_id):
+    FoodLineage.query.filter_by(food_id=food_id).delete(synchronize_session=False)
+
+# 原料信息修改后同步到所有引用它的溯源记录
+def refresh_ingredient_lineage(ingredient):
+    db.session.flush()
+    FoodLineage.query.filter_by(ingredient_id=ingredient.id).update({
+        field: getattr(ingredient, column.key) for field, column in INGREDIENT_FIELDS.items()
+    }, synchronize_session=False)
+
+# 删除原料的溯源记录
+def delete_ingredient_lineage(ingredient_id):
+    FoodLineage.query.filter_by(ingredient_id=ingredient_id).delete(synchronize_session=False)
+
+# 农户改名后同步溯源记录中的农户名称
+def refresh_farmer_lineage(user):
+    FoodLineage.query.filter_by(farmer_id=user.id).update(
+        {'farmer_name': user.username}, synchronize_session=False)
+
+# 重建全部食品的溯源记录
+def rebuild_all_lineage():
+    food_ids = [row.id for row in db.session.query(Food.id)]
+    FoodLineage.query.delete(synchronize_session=False)
+    for start in range(0, len(food_ids), 1000):
+        rebuild_food_lineage(food_ids[start:start + 1000])
+    return len(food_ids)
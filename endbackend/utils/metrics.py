@@ -0,0 +1,317 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from flask import request, g
+from config import Config
+from models import db
+from utils.cache import catalog_cache, image_cache
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# 指标基类：按标签值保存样本；kind 为 counter/gauge/histogram
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = registry.lock
+        self._samples = {}  # 标签值元组 -> 值
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return {key: (list(value) if isinstance(value, list) else value) for key, value in self._samples.items()}
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+    # 由统计回调设置累计值（如缓存命中次数）
+    def set_total(self, value, **labels):
+        with self._lock:
+            self._samples[self._key(labels)] = value
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._samples[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    # 样本为 [各桶计数..., +Inf计数, 总和]（桶计数不累加，输出时再累加）
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            sample = self._samples.get(key)
+            if sample is None:
+                sample = self._samples[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            sample[index] += 1
+            sample[-1] += value
+
+# 指标注册表，以 Prometheus 文本格式输出
+# 多进程部署（设置 METRICS_MULTIPROC_DIR）时，每个进程把自己的样本定期写入 <目录>/metrics_<pid>.json，
+# 输出时合并目录下的全部文件：计数器和直方图累加（已退出进程的累计值保留），仪表只累加仍在运行的进程
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+        self._flushed_at = 0.0
+        self._timer_pid = None  # 已安排延迟写入的进程号（fork 后子进程需重新安排）
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    # 注册统计回调，在输出或写入快照前调用，用于读取缓存、连接池等现有统计
+    def collector(self, func):
+        self._collectors.append(func)
+        return func
+
+    def _collect(self):
+        for func in self._collectors:
+            func()
+        return {metric.name: metric.samples() for metric in self._metrics}
+
+    @staticmethod
+    def _snapshot_path(pid):
+        return os.path.join(Config.METRICS_MULTIPROC_DIR, f'metrics_{pid}.json')
+
+    # 写入本进程的快照；距上次写入不足 METRICS_FLUSH_INTERVAL 秒时延迟到间隔结束再写入，
+    # 保证进程空闲后其他进程也能看到最新的值
+    def flush(self, force=False):
+        if not Config.METRICS_MULTIPROC_DIR:
+            return
+        now = time.monotonic()
+        remaining = self._flushed_at + Config.METRICS_FLUSH_INTERVAL - now
+        if not force and remaining > 0:
+            with self.lock:
+                if self._timer_pid == os.getpid():
+                    return
+                self._timer_pid = os.getpid()
+            timer = threading.Timer(remaining, self._delayed_flush)
+            timer.daemon = True
+            timer.start()
+            return
+        self._flushed_at = now
+        data = {name: [[list(key), value] for key, value in samples.items()]
+                for name, samples in self._collect().items()}
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump(data, fp)
+        os.replace(tmp_path, path)
+
+    def _delayed_flush(self):
+        with self.lock:
+            self._timer_pid = None
+        self.flush(force=True)
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def _merged(self):
+        if not Config.METRICS_MULTIPROC_DIR:
+            return self._collect()
+        self.flush(force=True)
+        kinds = {metric.name: metric.kind for metric in self._metrics}
+        merged = {metric.name: {} for metric in self._metrics}
+        for path in glob.glob(os.path.join(Config.METRICS_MULTIPROC_DIR, 'metrics_*.json')):
+            try:
+                pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+                with open(path, encoding='utf-8') as fp:
+                    data = json.load(fp)
+            except (ValueError, OSError):
+                continue
+            alive = self._alive(pid)
+            for name, samples in data.items():
+                kind = kinds.get(name)
+                if kind is None or (kind == 'gauge' and not alive):
+                    continue
+                target = merged[name]
+                for key, value in samples:
+                    key = tuple(key)
+                    if isinstance(value, list):
+                        current = target.get(key)
+                        target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        target[key] = target.get(key, 0) + value
+        return merged
+
+    def render(self):
+        merged = self._merged()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for key, value in sorted(merged.get(metric.name, {}).items()):
+                if metric.kind != 'histogram':
+                    lines.append(f'{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                    cumulative += count
+                    le = ('le', _format_value(bound if isinstance(bound, float) else float(bound)))
+                    lines.append(f'{metric.name}_bucket{_format_labels(metric.labelnames, key, le)} {cumulative}')
+                lines.append(f'{metric.name}_sum{_format_labels(metric.labelnames, key)} {_format_value(value[-1])}')
+                lines.append(f'{metric.name}_count{_format_labels(metric.labelnames, key)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+# 应用指标：请求数、耗时、进行中的请求、响应大小、上传字节数、数据库连接池等待时间和缓存命中
+class AppMetrics:
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter('http_requests_total', '请求数', ('blueprint', 'endpoint', 'method', 'status'))
+        self.duration = r.histogram('http_request_duration_seconds', '请求耗时（秒）',
+                                    ('blueprint', 'endpoint', 'method'))
+        self.in_flight = r.gauge('http_requests_in_flight', '正在处理的请求数', ('blueprint',))
+        self.response_size = r.histogram('http_response_size_bytes', '响应大小（字节，不含流式响应）',
+                                         ('blueprint', 'endpoint'), SIZE_BUCKETS)
+        self.upload_bytes = r.counter('http_upload_bytes_total', '上传的请求体字节数', ('endpoint',))
+        self.pool_wait = r.histogram('db_pool_checkout_wait_seconds', '从连接池获取连接的等待时间（秒）',
+                                     ('bind',), WAIT_BUCKETS)
+        self.pool_checked_out = r.gauge('db_pool_checked_out', '已借出的数据库连接数', ('bind',))
+        self.pool_size = r.gauge('db_pool_size', '连接池大小', ('bind',))
+        self.cache_hits = r.counter('cache_hits_total', '缓存命中次数（含合并等待）', ('cache',))
+        self.cache_misses = r.counter('cache_misses_total', '缓存未命中次数', ('cache',))
+        self.cache_entries = r.gauge('cache_entries', '缓存条目数', ('cache',))
+        self._engines = {}
+        r.collector(self._collect_stats)
+
+    def init_app(self, app):
+        if not Config.METRICS_ENABLED:
+            return
+        if Config.METRICS_MULTIPROC_DIR:
+            os.makedirs(Config.METRICS_MULTIPROC_DIR, exist_ok=True)
+            atexit.register(self.registry.flush, True)
+        with app.app_context():
+            self._engines = {key or 'default': engine for key, engine in db.engines.items()}
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['metrics'] = self
+
+    # 包装连接池的取连接方法以统计等待时间；engine.dispose()（如fork后）会重建连接池，因此每次请求检查一次
+    def _instrument_pools(self):
+        for bind, engine in self._engines.items():
+            pool = engine.pool
+            if getattr(pool, '_metrics_bind', None) is not None:
+                continue
+            do_get = pool._do_get
+
+            def timed_get(do_get=do_get, bind=bind):
+                start = time.perf_counter()
+                try:
+                    return do_get()
+                finally:
+                    self.pool_wait.observe(time.perf_counter() - start, bind=bind)
+
+            pool._do_get = timed_get
+            pool._metrics_bind = bind
+
+    def _collect_stats(self):
+        for bind, engine in self._engines.items():
+            pool = engine.pool
+            if hasattr(pool, 'checkedout'):
+                self.pool_checked_out.set(pool.checkedout(), bind=bind)
+            if hasattr(pool, 'size'):
+                self.pool_size.set(pool.size(), bind=bind)
+        for name, cache in (('catalog', catalog_cache), ('image', image_cache)):
+            stats = cache.stats()
+            self.cache_hits.set_total(stats['hits'] + stats.get('coalesced', 0), cache=name)
+            self.cache_misses.set_total(stats['misses'], cache=name)
+            self.cache_entries.set(stats['entries'], cache=name)
+
+    def _before_request(self):
+        self._instrument_pools()
+        g.metrics_started = time.perf_counter()
+        g.metrics_blueprint = request.blueprint or 'app'
+        self.in_flight.inc(blueprint=g.metrics_blueprint)
+
+    def _after_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        blueprint = g.metrics_blueprint
+        endpoint = request.endpoint or 'unmatched'
+        self.requests.inc(blueprint=blueprint, endpoint=endpoint, method=request.method,
+                          status=response.status_code)
+        self.duration.observe(time.perf_counter() - started, blueprint=blueprint, endpoint=endpoint,
+                              method=request.method)
+        if response.content_length is not None:
+            self.response_size.observe(response.content_length, blueprint=blueprint, endpoint=endpoint)
+        if request.content_length and request.mimetype in ('multipart/form-data', 'application/octet-stream'):
+            self.upload_bytes.inc(request.content_length, endpoint=endpoint)
+        return response
+
+    def _teardown_request(self, exc):
+        blueprint = g.pop('metrics_blueprint', None)
+        if blueprint is not None:
+            self.in_flight.dec(blueprint=blueprint)
+            self.registry.flush()
+
+app_metrics = AppMetrics()
@@ -0,0 +1,185 @@
+import hashlib
+from datetime import datetime
+from sqlalchemy import func, inspect, insert, select, text, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+from models import db, SchemaVersion, SchemaState, DataVersion, Food, FoodIngredient, Ingredient, \
+    Partnership, PartnerRequest, User
+
+# 在模型中按名称查找声明的索引
+def _find_index(name):
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"未声明的索引: {name}")
+
+# 创建模型中声明的索引，已存在时跳过（新库由 create_all 直接创建）
+def _create_indexes(conn, *names):
+    inspector = inspect(conn)
+    for name in names:
+        index = _find_index(name)
+        existing = {ix['name'] for ix in inspector.get_indexes(index.table.name)}
+        if name not in existing:
+            index.create(conn)
+
+def _add_hot_query_indexes(conn):
+    _create_indexes(
+        conn,
+        'ix_food_user_id',
+        'ix_ingredient_user_id',
+        'ix_food_ingredient_ingredient_id',
+        'ix_partner_request_receiver_status',
+        'ix_partner_request_sender_receiver_status',
+        'ix_user_identity_username',
+    )
+
+# 为已有的表添加模型中声明的列，已存在时跳过
+def _add_column(conn, model, name):
+    table = model.__table__
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    if name not in existing:
+        preparer = conn.dialect.identifier_preparer
+        ddl = CreateColumn(table.columns[name]).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+
+def _add_user_token_version(conn):
+    _add_column(conn, User, 'token_version')
+
+# 将 user.worktogeter 中逗号分隔的合作伙伴ID迁移到 partnership 表，迁移后清空旧字段，
+# 返回 (迁移的用户数, 新增的合作关系数)；旧字段为空时不做任何修改
+def migrate_partnerships(conn):
+    Partnership.__table__.create(conn, checkfirst=True)
+    users = conn.execute(select(User.id, User.worktogeter).where(User.worktogeter.isnot(None))).all()
+    if not users:
+        return 0, 0
+
+    user_ids = set(conn.scalars(select(User.id)))
+    existing = set(conn.execute(select(Partnership.user_id, Partnership.partner_id)).all())
+    new_rows = []
+    for user_id, worktogeter in users:
+        for value in worktogeter.split(','):
+            value = value.strip()
+            if not value.isdigit():
+                continue
+            pair = (user_id, int(value))
+            # 跳过不存在的用户和已迁移的关系
+            if pair[1] not in user_ids or pair in existing:
+                continue
+            existing.add(pair)
+            new_rows.append({'user_id': pair[0], 'partner_id': pair[1]})
+
+    if new_rows:
+        conn.execute(insert(Partnership), new_rows)
+    conn.execute(update(User).where(User.worktogeter.isnot(None)).values(worktogeter=None))
+    # 合作伙伴数据变化，使相关缓存和ETag失效
+    if conn.execute(update(DataVersion).where(DataVersion.scope == 'partner')
+                    .values(version=DataVersion.version + 1)).rowcount == 0:
+        conn.execute(insert(DataVersion).values(scope='partner', version=1))
+    return len(users), len(new_rows)
+
+def _migrate_partnerships(conn):
+    migrate_partnerships(conn)
+
+# 迁移列表：(版本号, 名称, 执行函数)，执行函数接收一个处于事务中的连接
+# 只能在末尾追加新迁移，已发布的迁移不要修改；模型中新增的列/索引也要在这里补一个迁移，
+# 否则已有数据库不会更新（create_all 只创建不存在的表）
+MIGRATIONS = [
+    (1, 'add_hot_query_indexes', _add_hot_query_indexes),
+    (2, 'add_user_token_version', _add_user_token_version),
+    (3, 'migrate_partnerships', _migrate_partnerships),
+]
+
+def current_version():
+    return db.session.query(func.max(SchemaVersion.version)).scalar() or 0
+
+def pending_migrations():
+    applied = {version for (version,) in db.session.query(SchemaVersion.version)}
+    db.session.close()
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+# 依次执行未执行的迁移（可指定目标版本），每个迁移与其版本记录在同一事务中提交；
+# 多个进程同时启动时，已被其他进程执行的迁移会被跳过。返回本次执行的迁移
+def upgrade(target=None):
+    SchemaVersion.__table__.create(db.engine, checkfirst=True)
+    applied = []
+    for version, name, migrate in pending_migrations():
+        if target is not None and version > target:
+            break
+        try:
+            with db.engine.begin() as conn:
+                migrate(conn)
+                conn.execute(insert(SchemaVersion).values(version=version, name=name, applied_at=datetime.now()))
+        except IntegrityError:
+            if db.session.get(SchemaVersion, version) is None:
+                raise
+            db.session.close()
+            continue
+        applied.append((version, name))
+    return applied
+
+# 模型结构指纹：全部表和索引的建表语句（按当前数据库方言生成）加上最新迁移版本号的哈希，
+# 模型或迁移有任何变化时指纹都会改变
+def schema_fingerprint():
+    dialect = db.engine.dialect
+    digest = hashlib.sha256(f"{dialect.name}:{MIGRATIONS[-1][0]}".encode())
+    for table in db.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()
+
+# 数据库中记录的指纹与当前模型一致时返回True（一次主键查询，表不存在时返回False）
+def schema_is_current(fingerprint):
+    try:
+        state = db.session.get(SchemaState, 'fingerprint')
+        return state is not None and state.value == fingerprint
+    except SQLAlchemyError:
+        return False
+    finally:
+        db.session.rollback()
+
+# 建表和迁移完成后记录指纹，之后的启动跳过 create_all 和迁移检查
+def record_schema_fingerprint(fingerprint):
+    state = db.session.get(SchemaState, 'fingerprint')
+    if state is None:
+        db.session.add(SchemaState(key='fingerprint', value=fingerprint))
+    else:
+        state.value = fingerprint
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 其他进程同时启动并已记录
+        db.session.rollback()
+
+# 热点查询（与 routes/* 中的筛选条件一致），用于检查执行计划是否使用索引
+def hot_queries():
+    return [
+        ('商户的食品', select(Food).where(Food.user_id == 1)),
+        ('农户的原料', select(Ingredient).where(Ingredient.user_id == 1)),
+        ('原料关联的食品', select(FoodIngredient).where(FoodIngredient.ingredient_id == 1)),
+        ('收到的待处理合作请求', select(PartnerRequest).where(
+            PartnerRequest.receiver_id == 1, PartnerRequest.status == 'pending')),
+        ('重复合作请求检查', select(PartnerRequest).where(
+            PartnerRequest.sender_id == 1, PartnerRequest.receiver_id == 2, PartnerRequest.status == 'pending')),
+        ('按身份列出用户', select(User).where(User.identity == '农户').order_by(User.username).limit(20)),
+    ]
+
+# 执行 EXPLAIN，返回 (是否使用索引, 执行计划文本行)；支持 SQLite 和 MySQL
+def explain(stmt):
+    dialect = db.engine.dialect
+    sql = str(stmt.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    with db.engine.connect() as conn:
+        if dialect.name == 'sqlite':
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+            # SCAN 为逐行扫描整张表（即使按索引顺序），SEARCH ... USING 为按索引查找
+            return not any(line.startswith('SCAN ') for line in plan), plan
+        if dialect.name in ('mysql', 'mariadb'):
+            rows = [row._mapping for row in conn.execute(text(f"EXPLAIN {sql}"))]
+            plan = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in rows]
+            return all(row['key'] and row['type'] != 'ALL' for row in rows), plan
+    raise ValueError(f"不支持的数据库: {dialect.name}")
+
+# 检查全部热点查询，返回 [(名称, 是否使用索引, 执行计划)]
+def check_hot_queries():
+    return [(name, *explain(stmt)) for name, stmt in hot_queries()]
@@ -0,0 +1,95 @@
+import base64
+import json
+from collections import namedtuple
+from flask import request
+from sqlalchemy import and_, or_
+from config import Config
+
+# 分页结果：当前页数据、下一页游标（没有更多数据时为None）
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+class PaginationError(ValueError):
+    pass
+
+# 游标编码为不透明字符串（URL安全的base64）
+def encode_cursor(values):
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise PaginationError("分页游标无效")
+    if not isinstance(values, list) or len(values) != 3:
+        raise PaginationError("分页游标无效")
+    return values
+
+# 解析每页数量
+def parse_limit(value):
+    if value is None:
+        return Config.PAGE_SIZE_DEFAULT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError("分页数量格式不正确")
+    if limit <= 0:
+        raise PaginationError("分页数量必须为正数")
+    return min(limit, Config.PAGE_SIZE_MAX)
+
+# 是否需要分页（兼容模式下未携带分页参数的旧客户端返回完整列表）
+def wants_pagination(args=None):
+    args = request.args if args is None else args
+    if 'limit' in args or 'cursor' in args:
+        return True
+    return not Config.PAGINATION_COMPAT
+
+# 基于游标（键集）的分页：按 (排序字段, id) 或 (id) 升序，
+# 下一页从上一页最后一条记录之后开始，不受并发插入影响
+def paginate_query(query, id_column, sort_columns=None, args=None):
+    query, finish = page_query(query, id_column, sort_columns, args)
+    return finish(query.all())
+
+# 构造分页查询（Query 或 select() 语句均可），返回 (查询, finish)：
+# 执行查询后用 finish(结果列表) 生成分页结果，供同步和异步查询共用
+def page_query(query, id_column, sort_columns=None, args=None):
+    args = request.args if args is None else args
+    if not wants_pagination(args):
+        return query.order_by(id_column), lambda items: Page(items, None)
+
+    sort_columns = sort_columns or {}
+    sort = args.get('sort') or 'id'
+    if sort != 'id' and sort not in sort_columns:
+        raise PaginationError(f"不支持的排序字段: {sort}")
+    sort_column = sort_columns.get(sort)
+    limit = parse_limit(args.get('limit'))
+
+    cursor = args.get('cursor')
+    if cursor:
+        cursor_sort, last_value, last_id = decode_cursor(cursor)
+        if cursor_sort != sort or not isinstance(last_id, int):
+            raise PaginationError("分页游标与排序字段不匹配")
+        if sort_column is None:
+            query = query.filter(id_column > last_id)
+        else:
+            query = query.filter(or_(
+                sort_column > last_value,
+                and_(sort_column == last_value, id_column > last_id)
+            ))
+
+    if sort_column is None:
+        query = query.order_by(id_column)
+    else:
+        query = query.order_by(sort_column, id_column)
+
+    # 多取一条用于判断是否还有下一页
+    def finish(items):
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            last_value = getattr(last, sort_column.key) if sort_column is not None else None
+            next_cursor = encode_cursor([sort, last_value, getattr(last, id_column.key)])
+        return Page(items, next_cursor)
+    return query.limit(limit + 1), finish
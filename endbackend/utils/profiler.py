@@ -0,0 +1,176 @@
+import datetime
+import os
+import random
+import re
+import sys
+import threading
+import time
+from flask import request, g
+from config import Config
+from utils.decorators import has_admin_token
+
+# 性能分析文件名：<时间（精确到毫秒）>_<接口名>_<进程号>_<随机数>.collapsed
+PROFILE_NAME = re.compile(r'\d{8}T\d{9}_[\w.]+_\d+_[0-9a-f]{6}\.collapsed')
+
+def profile_folder():
+    return Config.PROFILE_FOLDER or os.path.join(Config.STATIC_FOLDER, 'profiles')
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    name = getattr(code, 'co_qualname', code.co_name)
+    # 折叠栈格式用分号分隔栈帧
+    return f"{module}:{name}".replace(';', ',')
+
+# 采样线程：每隔 interval 秒读取一次目标线程的调用栈，按栈计数
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}  # 栈（从外到内的栈帧名元组） -> 次数
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            # 采样期间已停止时，栈中是停止采样本身，不计入
+            if self._stop_event.is_set():
+                break
+            key = tuple(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+# 单个请求的采样分析：请求头 X-Profile: 1 且携带 X-Admin-Token，
+# 或按 PROFILE_SAMPLE_RATE 抽样开启；未配置 ADMIN_TOKEN 时不进行任何分析；结果按折叠栈格式（flamegraph.pl 可直接使用）保存，
+# 文件名通过响应头 X-Profile-Id 返回。未开启分析的请求只多一次请求头判断
+class RequestProfiler:
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['request_profiler'] = self
+
+    def _requested(self):
+        if not Config.ADMIN_TOKEN:
+            return False
+        if request.headers.get('X-Profile') == '1':
+            return has_admin_token()
+        return Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE
+
+    def _before_request(self):
+        if not self._requested():
+            return
+        sampler = StackSampler(threading.get_ident(), Config.PROFILE_INTERVAL_MS / 1000)
+        sampler.start()
+        g.profile_sampler = sampler
+        g.profile_started = time.perf_counter()
+
+    def _after_request(self, response):
+        sampler = g.pop('profile_sampler', None)
+        if sampler is None:
+            return response
+        sampler.stop()
+        elapsed = time.perf_counter() - g.profile_started
+        name = self.save(sampler.stacks, request.endpoint or 'unmatched')
+        response.headers['X-Profile-Id'] = name
+        response.headers['X-Profile-Samples'] = str(sum(sampler.stacks.values()))
+        response.headers['X-Profile-Duration'] = f'{elapsed * 1000:.1f}ms'
+        return response
+
+    # 请求出错未执行 after_request 时停止采样线程
+    def _teardown_request(self, exc):
+        sampler = g.pop('profile_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+
+    def save(self, stacks, endpoint):
+        folder = profile_folder()
+        os.makedirs(folder, exist_ok=True)
+        now = datetime.datetime.now()
+        stamp = f"{now:%Y%m%dT%H%M%S}{now.microsecond // 1000:03d}"
+        endpoint = re.sub(r'[^\w.]', '_', endpoint)
+        name = f"{stamp}_{endpoint}_{os.getpid()}_{os.urandom(3).hex()}.collapsed"
+        with open(os.path.join(folder, name), 'w', encoding='utf-8') as fp:
+            for stack, count in sorted(stacks.items()):
+                fp.write(f"{';'.join(stack)} {count}\n")
+        self._prune(folder)
+        return name
+
+    # 只保留最近的 PROFILE_KEEP 个文件
+    def _prune(self, folder):
+        names = sorted(name for name in os.listdir(folder) if PROFILE_NAME.fullmatch(name))
+        for name in names[:-Config.PROFILE_KEEP]:
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass
+
+request_profiler = RequestProfiler()
+
+# 读取折叠栈文件，返回 [(栈帧列表, 次数)]
+def read_collapsed(path):
+    stacks = []
+    with open(path, encoding='utf-8') as fp:
+        for line in fp:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks.append((stack.split(';'), int(count)))
+    return stacks
+
+# 最近的分析文件（新的在前）
+def list_profiles():
+    folder = profile_folder()
+    if not os.path.isdir(folder):
+        return []
+    profiles = []
+    for name in sorted((n for n in os.listdir(folder) if PROFILE_NAME.fullmatch(n)), reverse=True):
+        stamp, rest = name[:-len('.collapsed')].split('_', 1)
+        endpoint = rest.rsplit('_', 2)[0]
+        samples = sum(count for _, count in read_collapsed(os.path.join(folder, name)))
+        profiles.append({
+            'id': name,
+            'endpoint': endpoint,
+            'created_at': datetime.datetime.strptime(stamp[:15], '%Y%m%dT%H%M%S').strftime('%Y-%m-%d %H:%M:%S'),
+            'samples': samples,
+            'sampled_ms': samples * Config.PROFILE_INTERVAL_MS,
+        })
+    return profiles
+
+# 转换为 speedscope（https://www.speedscope.app）的 sampled 格式
+def to_speedscope(name, stacks):
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in stacks:
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame})
+            ids.append(index[frame])
+        samples.append(ids)
+        weights.append(count * Config.PROFILE_INTERVAL_MS)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+        'name': name,
+        'exporter': 'food-traceability-system',
+    }
@@ -0,0 +1,56 @@
+from sqlalchemy import case, distinct, func
+from config import Config
+from models import db, User, UsernameGram
+
+# 索引的最大片段长度
+GRAM_SIZE = 3
+
+# 拆分出长度1~3的全部片段（小写，去重）
+def username_grams(username):
+    name = (username or '').lower()
+    return {name[i:i + n] for n in range(1, GRAM_SIZE + 1) for i in range(len(name) - n + 1)}
+
+# 重建某个用户的用户名索引，需在注册/修改用户名的事务中调用
+def index_username(user_id, username):
+    UsernameGram.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    grams = username_grams(username)
+    if grams:
+        db.session.execute(UsernameGram.__table__.insert(),
+                           [{'gram': gram, 'user_id': user_id} for gram in grams])
+
+# 解析搜索结果数量
+def parse_search_limit(value):
+    try:
+        limit = int(value) if value is not None else Config.SEARCH_LIMIT_DEFAULT
+    except ValueError:
+        limit = Config.SEARCH_LIMIT_DEFAULT
+    return max(1, min(limit, Config.PAGE_SIZE_MAX))
+
+# 按用户名子串搜索指定身份的用户：
+# 关键字不超过3个字符时直接命中片段索引；更长的关键字取全部三字片段求交集，
+# 再在候选集中校验子串。结果按完全匹配、前缀匹配、用户名长度排序
+def search_usernames(keyword, identity, limit):
+    keyword = (keyword or '').strip()
+    lowered = keyword.lower()
+    query = User.query.filter(User.identity == identity)
+    
+    if len(lowered) <= GRAM_SIZE:
+        if lowered:
+            query = query.join(UsernameGram, UsernameGram.user_id == User.id)\
+                .filter(UsernameGram.gram == lowered)
+    else:
+        grams = {lowered[i:i + GRAM_SIZE] for i in range(len(lowered) - GRAM_SIZE + 1)}
+        candidates = db.session.query(UsernameGram.user_id)\
+            .filter(UsernameGram.gram.in_(grams))\
+            .group_by(UsernameGram.user_id)\
+            .having(func.count(distinct(UsernameGram.gram)) == len(grams))\
+            .subquery()
+        query = query.join(candidates, candidates.c.user_id == User.id)\
+            .filter(User.username.contains(keyword, autoescape=True))
+    
+    rank = case(
+        (func.lower(User.username) == lowered, 0),
+        (User.username.startswith(keyword, autoescape=True), 1),
+        else_=2
+    )
+    return query.order_by(rank, func.length(User.username), User.id).limit(limit).all()
@@ -0,0 +1,142 @@
+import datetime
+import io
+import random
+from sqlalchemy import insert, select
+from werkzeug.datastructures import FileStorage
+from config import Config
+from models import db, User, Ingredient, Food, FoodIngredient, Partnership, PartnerRequest, UsernameGram
+from utils.cache import catalog_cache
+from utils.file_handler import IMAGE_FOLDERS, store_file, retain_files
+from utils.lineage import rebuild_food_lineage
+from utils.search import username_grams
+from utils.versioning import SCOPES, bump_versions
+
+INGREDIENT_NAMES = ['猪肉', '牛肉', '鸡肉', '白菜', '土豆', '番茄', '鲈鱼', '虾', '大米', '面粉',
+                    '牛奶', '鸡蛋', '酱油', '食盐', '青椒', '胡萝卜', '豆腐', '玉米', '羊肉', '黄瓜']
+INGREDIENT_TYPES = ['肉类', '蔬菜类', '水产类', '粮食类', '乳产品', '蛋产品', '调料类']
+FOOD_NAMES = ['红烧肉', '宫保鸡丁', '番茄炒蛋', '清蒸鲈鱼', '土豆丝', '麻婆豆腐', '饺子', '炒饭',
+              '牛肉面', '油焖大虾', '酸辣汤', '葱油饼']
+FOOD_CATEGORIES = ['热菜', '凉菜', '主食', '汤类', '小吃']
+
+# 1x1 PNG，测试原料共用的种植图片（内容寻址存储中只保存一份）
+SAMPLE_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360f8cfc0f01f0005000201e2f6'
+    'c2f00000000049454e44ae426082')
+
+def _insert(model, rows):
+    size = Config.IMPORT_CHUNK_SIZE
+    for start in range(0, len(rows), size):
+        db.session.execute(insert(model), rows[start:start + size])
+
+def _random_time(rng, days):
+    return datetime.datetime(2025, 1, 1) + datetime.timedelta(minutes=rng.randrange(days * 24 * 60))
+
+# 按给定规模生成测试数据（相同 seed 生成相同数据）：
+# 用户名以 prefix 开头；商户以 partner_density 的概率与每个农户建立合作关系，
+# 食品的原料优先取自合作农户。返回各表写入的行数
+def seed_data(farmers=50, merchants=20, consumers=20, ingredients_per_farmer=20, foods_per_merchant=30,
+              ingredients_per_food=5, partner_density=0.3, request_density=0.05, seed=42, prefix='seed'):
+    rng = random.Random(seed)
+    if db.session.query(User.query.filter(User.account.startswith(f"{prefix}_")).exists()).scalar():
+        raise ValueError(f"已存在前缀为 {prefix} 的测试数据，请更换前缀")
+    
+    # 用户及用户名搜索索引
+    users = []
+    for identity, role, count in (('农户', 'farmer', farmers), ('商户', 'merchant', merchants),
+                                  ('消费者', 'consumer', consumers)):
+        for i in range(count):
+            name = f"{prefix}_{role}_{i}"
+            users.append({'username': name, 'account': name, 'password': '123456', 'identity': identity})
+    _insert(User, users)
+    ids = {identity: [] for identity in ('农户', '商户', '消费者')}
+    grams = []
+    for user_id, username, identity in db.session.execute(
+            select(User.id, User.username, User.identity)
+            .where(User.account.startswith(f"{prefix}_")).order_by(User.id)):
+        ids[identity].append(user_id)
+        grams.extend({'gram': gram, 'user_id': user_id} for gram in username_grams(username))
+    _insert(UsernameGram, grams)
+    farmer_ids, merchant_ids = ids['农户'], ids['商户']
+    
+    # 合作关系（双向）和待处理的合作请求
+    partners = {merchant_id: [] for merchant_id in merchant_ids}
+    partnership_rows, request_rows = [], []
+    for merchant_id in merchant_ids:
+        for farmer_id in farmer_ids:
+            if rng.random() < partner_density:
+                partners[merchant_id].append(farmer_id)
+                partnership_rows.append({'user_id': merchant_id, 'partner_id': farmer_id})
+                partnership_rows.append({'user_id': farmer_id, 'partner_id': merchant_id})
+            elif rng.random() < request_density:
+                request_rows.append({'sender_id': merchant_id, 'receiver_id': farmer_id, 'status': 'pending',
+                                     'created_at': _random_time(rng, 365), 'updated_at': _random_time(rng, 365)})
+    _insert(Partnership, partnership_rows)
+    _insert(PartnerRequest, request_rows)
+    
+    # 原料
+    ingredient_rows = []
+    image = store_file(FileStorage(stream=io.BytesIO(SAMPLE_PNG), filename='seed.png'), IMAGE_FOLDERS['planting_image'])
+    for farmer_id in farmer_ids:
+        for i in range(ingredients_per_farmer):
+            farming_time = _random_time(rng, 300)
+            ingredient_rows.append({
+                'name': f"{rng.choice(INGREDIENT_NAMES)}{i}",
+                'type': '，'.join(rng.sample(INGREDIENT_TYPES, rng.randint(1, 2))),
+                'description': '测试数据',
+                'farming_time': farming_time,
+                'production_time': farming_time + datetime.timedelta(days=rng.randint(10, 60)),
+                'planting_image': image,
+                'user_id': farmer_id,
+            })
+    _insert(Ingredient, ingredient_rows)
+    retain_files([row['planting_image'] for row in ingredient_rows])
+    farmer_ingredients = {farmer_id: [] for farmer_id in farmer_ids}
+    if farmer_ids:
+        for ingredient_id, farmer_id in db.session.execute(
+                select(Ingredient.id, Ingredient.user_id).where(Ingredient.user_id.in_(farmer_ids))):
+            farmer_ingredients[farmer_id].append(ingredient_id)
+    all_ingredients = [i for items in farmer_ingredients.values() for i in items]
+    
+    # 食品及原料关联
+    food_rows = []
+    for merchant_id in merchant_ids:
+        for i in range(foods_per_merchant):
+            food_rows.append({
+                'name': f"{rng.choice(FOOD_NAMES)}{i}",
+                'prise': round(rng.uniform(5, 200), 2),
+                'info': '测试数据',
+                'poundage': f"{rng.randint(100, 1000)}g",
+                'num': rng.randint(0, 500),
+                'category': rng.choice(FOOD_CATEGORIES),
+                'cooking_time': _random_time(rng, 365),
+                'user_id': merchant_id,
+            })
+    _insert(Food, food_rows)
+    link_rows = []
+    food_ids = []
+    if merchant_ids:
+        for food_id, merchant_id in db.session.execute(
+                select(Food.id, Food.user_id).where(Food.user_id.in_(merchant_ids)).order_by(Food.id)):
+            food_ids.append(food_id)
+            pool = [i for farmer_id in partners[merchant_id] for i in farmer_ingredients[farmer_id]] or all_ingredients
+            for ingredient_id in rng.sample(pool, min(ingredients_per_food, len(pool))):
+                link_rows.append({'food_id': food_id, 'ingredient_id': ingredient_id,
+                                  'amount': f"{rng.randint(1, 50) * 10}g"})
+    _insert(FoodIngredient, link_rows)
+    
+    size = Config.IMPORT_CHUNK_SIZE
+    for start in range(0, len(food_ids), size):
+        rebuild_food_lineage(food_ids[start:start + size])
+    bump_versions(*SCOPES)
+    db.session.commit()
+    catalog_cache.invalidate()
+    
+    return {
+        'users': len(users),
+        'partnerships': len(partnership_rows),
+        'partner_requests': len(request_rows),
+        'ingredients': len(ingredient_rows),
+        'foods': len(food_rows),
+        'food_ingredients': len(link_rows),
+    }
@@ -0,0 +1,116 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models import Food, FoodIngredient, Ingredient
+
+# 食品目录的预加载选项（Query 和 select() 共用）
+def food_catalog_options():
+    return (
+        joinedload(Food.user),
+        selectinload(Food.ingredients)
+            .joinedload(FoodIngredient.ingredient)
+            .joinedload(Ingredient.user)
+    )
+
+# 食品加载器：商户、关联用量、原料及农户信息一次性预加载，
+# 查询条数固定（食品+商户一条，关联+原料+农户一条），与食品数量无关
+def food_catalog_query(query=None):
+    if query is None:
+        query = Food.query
+    return query.options(*food_catalog_options())
+
+# 日期时间转ISO字符串
+def isoformat(value):
+    return value.isoformat() if value else None
+
+# 原料信息
+def serialize_ingredient(ingredient):
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'type': ingredient.type,
+        'description': ingredient.description,
+        'farming_time': isoformat(ingredient.farming_time),
+        'production_time': isoformat(ingredient.production_time),
+        'planting_image': ingredient.planting_image,
+        'growing_image': ingredient.growing_image,
+        'production_image': ingredient.production_image,
+        'quality_report_image': ingredient.quality_report_image,
+        'user_id': ingredient.user_id
+    }
+
+# 食品目录中的原料信息（包含农户名称与用量）
+def serialize_catalog_ingredient(link):
+    ingredient = link.ingredient
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'type': ingredient.type,
+        'description': ingredient.description,
+        'farming_time': isoformat(ingredient.farming_time),
+        'production_time': isoformat(ingredient.production_time),
+        'planting_image': ingredient.planting_image,
+        'growing_image': ingredient.growing_image,
+        'production_image': ingredient.production_image,
+        'quality_report_image': ingredient.quality_report_image,
+        'farmer_name': ingredient.user.username if ingredient.user else "未知农户",
+        'amount': link.amount or ''
+    }
+
+# 食品溯源信息（食品、商户与溯源记录）
+def serialize_trace(food, lineage):
+    return {
+        'food': {
+            'id': food.id,
+            'name': food.name,
+            'category': food.category,
+            'cooking_time': isoformat(food.cooking_time)
+        },
+        'merchant': {
+            'id': food.user_id,
+            'name': food.user.username if food.user else "未知商户"
+        },
+        'ingredients': [{
+            'id': row.ingredient_id,
+            'name': row.ingredient_name,
+            'type': row.ingredient_type,
+            'amount': row.amount or '',
+            'farming_time': isoformat(row.farming_time),
+            'production_time': isoformat(row.production_time),
+            'farmer': {
+                'id': row.farmer_id,
+                'name': row.farmer_name or "未知农户"
+            },
+            'images': {
+                'planting': row.planting_image,
+                'growing': row.growing_image,
+                'production': row.production_image,
+                'quality_report': row.quality_report_image
+            }
+        } for row in lineage]
+    }
+
+# 食品信息；catalog=True时附带商户名称和完整原料信息
+def serialize_food(food, catalog=False):
+    data = {
+        'id': food.id,
+        'name': food.name,
+        'prise': float(food.prise),
+        'info': food.info,
+        'poundage': food.poundage,
+        'num': food.num,
+        'category': food.category,
+        'cooking_time': isoformat(food.cooking_time),
+        'user_id': food.user_id
+    }
+
+    if catalog:
+        data['merchant_name'] = food.user.username if food.user else "未知商户"
+        data['ingredients'] = [serialize_catalog_ingredient(link) for link in food.ingredients]
+    else:
+        data['ingredients'] = [{
+            'id': link.ingredient.id,
+            'name': link.ingredient.name,
+            'description': link.ingredient.description,
+            'amount': link.amount or ''
+        } for link in food.ingredients]
+
+    return data
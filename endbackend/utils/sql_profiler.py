@@ -0,0 +1,152 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from flask import request, g, has_request_context
+from sqlalchemy import event
+from config import Config
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# 把展开后的 IN (?, ?, ...) 归并为同一种语句形态
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)')
+_SPACES = re.compile(r'\s+')
+
+def statement_shape(statement):
+    return _IN_LIST.sub('(?)', _SPACES.sub(' ', statement).strip())
+
+# 按请求统计SQL：语句数、耗时、按语句分组的次数和耗时（按 SQL_PROFILE_SAMPLE_RATE 抽样）
+# - 同一语句形态执行次数达到 SQL_N_PLUS_ONE_THRESHOLD 时记为疑似N+1
+# - 响应头 Server-Timing 给出数据库耗时、语句数和请求总耗时
+# - 请求耗时超过 SQL_SLOW_REQUEST_MS 时记录慢请求日志（含语句明细）
+class QueryProfiler:
+    def __init__(self):
+        self._endpoints = {}  # 接口名 -> 汇总统计
+        self._slow = deque(maxlen=50)  # 最近的慢请求
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if Config.SQL_PROFILE_SAMPLE_RATE <= 0:
+            return
+        if Config.SQL_SLOW_LOG_FILE:
+            handler = logging.FileHandler(Config.SQL_SLOW_LOG_FILE, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+            logger.addHandler(handler)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['query_profiler'] = self
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        if random.random() < Config.SQL_PROFILE_SAMPLE_RATE:
+            g.sql_profile = {}  # 语句 -> [次数, 耗时]
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and g.get('sql_profile') is not None:
+            context._profile_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_profile_started', None)
+        if started is None:
+            return
+        profile = g.get('sql_profile')
+        if profile is None:
+            return
+        entry = profile.get(statement)
+        if entry is None:
+            entry = profile[statement] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += time.perf_counter() - started
+
+    def _after_request(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        
+        shapes = {}
+        for statement, (count, duration) in profile.items():
+            entry = shapes.setdefault(statement_shape(statement), [0, 0.0])
+            entry[0] += count
+            entry[1] += duration
+        queries = sum(entry[0] for entry in shapes.values())
+        db_time = sum(entry[1] for entry in shapes.values())
+        repeated = {shape: entry for shape, entry in shapes.items()
+                    if entry[0] >= Config.SQL_N_PLUS_ONE_THRESHOLD}
+        
+        timing = [f'db;dur={db_time * 1000:.1f};desc="{queries} queries"',
+                  f'app;dur={elapsed * 1000:.1f}']
+        if repeated:
+            timing.append(f'n1;desc="{len(repeated)} repeated statements"')
+        response.headers.add('Server-Timing', ', '.join(timing))
+        
+        endpoint = request.endpoint or request.path
+        slow = elapsed * 1000 >= Config.SQL_SLOW_REQUEST_MS
+        for shape, (count, _) in repeated.items():
+            logger.warning("疑似N+1查询 %s %s: 执行 %d 次: %s", request.method, endpoint, count, shape)
+        if slow:
+            breakdown = sorted(shapes.items(), key=lambda item: item[1][1], reverse=True)
+            entry = {
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 1),
+                'db_ms': round(db_time * 1000, 1),
+                'queries': queries,
+                'statements': [
+                    {'sql': shape, 'count': count, 'duration_ms': round(duration * 1000, 2)}
+                    for shape, (count, duration) in breakdown[:10]
+                ],
+            }
+            logger.warning("慢请求 %s %s: %.1fms，SQL %d 条 %.1fms\n%s", entry['method'], entry['path'],
+                           entry['duration_ms'], queries, entry['db_ms'],
+                           '\n'.join(f"  {s['count']}x {s['duration_ms']}ms {s['sql']}" for s in entry['statements']))
+        
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'duration_ms': 0.0,
+                    'n_plus_one': 0, 'slow': 0}
+            stats['requests'] += 1
+            stats['queries'] += queries
+            stats['max_queries'] = max(stats['max_queries'], queries)
+            stats['db_ms'] += db_time * 1000
+            stats['duration_ms'] += elapsed * 1000
+            stats['n_plus_one'] += 1 if repeated else 0
+            stats['slow'] += 1 if slow else 0
+            if slow:
+                self._slow.append(entry)
+        return response
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for name, item in sorted(self._endpoints.items()):
+                endpoints[name] = {
+                    'sampled_requests': item['requests'],
+                    'avg_queries': round(item['queries'] / item['requests'], 2),
+                    'max_queries': item['max_queries'],
+                    'avg_db_ms': round(item['db_ms'] / item['requests'], 2),
+                    'avg_duration_ms': round(item['duration_ms'] / item['requests'], 2),
+                    'n_plus_one_requests': item['n_plus_one'],
+                    'slow_requests': item['slow'],
+                }
+            return {
+                'sample_rate': Config.SQL_PROFILE_SAMPLE_RATE,
+                'n_plus_one_threshold': Config.SQL_N_PLUS_ONE_THRESHOLD,
+                'slow_request_ms': Config.SQL_SLOW_REQUEST_MS,
+                'endpoints': endpoints,
+                'recent_slow_requests': list(self._slow),
+            }
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,25 @@
+import time
+from contextlib import contextmanager
+
+# 记录启动各阶段耗时（导入模块、创建应用、初始化数据库），启动完成后输出一行汇总
+class StartupTimer:
+    def __init__(self):
+        self.phases = []  # [(阶段名, 秒)]
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self):
+        total = sum(seconds for _, seconds in self.phases)
+        parts = '，'.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+        return f"启动耗时 {total * 1000:.0f}ms：{parts}"
+
+startup_timer = StartupTimer()
@@ -0,0 +1,28 @@
+from flask import Response, current_app, request, stream_with_context
+from config import Config
+
+# 是否请求流式返回完整列表
+def wants_stream():
+    return request.args.get('stream') in ('1', 'true')
+
+# 以流式JSON返回完整列表：查询按批次从服务端游标读取（yield_per），
+# 每批序列化后立即输出，内存占用与总行数无关
+def stream_json_list(message, query, serialize):
+    batch_size = Config.STREAM_BATCH_SIZE
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield '{"message": %s, "status": "success", "data": [' % dumps(message)
+        chunk = []
+        first = True
+        for row in query.yield_per(batch_size):
+            chunk.append(dumps(serialize(row)))
+            if len(chunk) >= batch_size:
+                yield ('' if first else ',') + ','.join(chunk)
+                first = False
+                chunk = []
+        if chunk:
+            yield ('' if first else ',') + ','.join(chunk)
+        yield '], "next_cursor": null}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
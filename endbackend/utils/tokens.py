@@ -0,0 +1,141 @@
+import secrets
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+from flask import request, g, jsonify
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from config import Config
+from models import db, User
+
+# 当前请求的用户：来自令牌时 version 为令牌版本号，来自旧的 user_id 参数时为 None
+Principal = namedtuple('Principal', ['id', 'identity', 'version'])
+
+class TokenError(Exception):
+    pass
+
+MISSING = object()
+
+# 检查签名密钥：未设置 SECRET_KEY 时拒绝启动；调试模式下改用本进程随机生成的密钥（重启后需重新登录）
+def ensure_secret_key(debug=False):
+    if Config.SECRET_KEY:
+        return
+    if not debug:
+        raise RuntimeError("未设置 SECRET_KEY 环境变量，拒绝启动（登录令牌需要每个部署独立的签名密钥）")
+    Config.SECRET_KEY = secrets.token_hex(32)
+    print('未设置 SECRET_KEY，调试模式使用随机生成的签名密钥（重启后需重新登录）')
+
+def _serializer():
+    return URLSafeTimedSerializer(Config.SECRET_KEY, salt='auth-token')
+
+# 登录令牌：签名的用户ID、身份和令牌版本号，TOKEN_MAX_AGE 秒后过期
+def issue_token(user):
+    return _serializer().dumps({'id': user.id, 'identity': user.identity, 'ver': user.token_version or 0})
+
+# 用户令牌版本号缓存（TTL），令牌校验通常不需要查询数据库；
+# 身份或密码修改后版本号递增，本进程立即生效，其他进程在 TOKEN_VERSION_TTL 秒内生效
+class TokenVersionCache:
+    def __init__(self):
+        self._entries = {}  # user_id -> (过期时间, 版本号)
+        self._lock = threading.Lock()
+
+    # 读取缓存的版本号，未缓存或已过期时返回 MISSING
+    def peek(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+        return MISSING
+
+    def put(self, user_id, version):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[user_id] = (now + Config.TOKEN_VERSION_TTL, version)
+            if len(self._entries) > 10000:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+
+    def get(self, user_id):
+        version = self.peek(user_id)
+        if version is MISSING:
+            version = db.session.query(User.token_version).filter(User.id == user_id).scalar()
+            self.put(user_id, version)
+        return version
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+token_versions = TokenVersionCache()
+
+# 使用户已签发的令牌全部失效（需在提交前调用）
+def revoke_tokens(user):
+    user.token_version = (user.token_version or 0) + 1
+    token_versions.invalidate(user.id)
+
+# 校验签名和有效期，返回令牌中的用户（版本号由调用方检查）
+def decode_token(token):
+    try:
+        data = _serializer().loads(token, max_age=Config.TOKEN_MAX_AGE)
+    except SignatureExpired:
+        raise TokenError("登录已过期，请重新登录")
+    except BadSignature:
+        raise TokenError("登录令牌无效")
+    return Principal(data['id'], data['identity'], data['ver'])
+
+def check_version(principal, version):
+    if version is None or version != principal.version:
+        raise TokenError("登录已失效，请重新登录")
+
+def verify_token(token):
+    principal = decode_token(token)
+    check_version(principal, token_versions.get(principal.id))
+    return principal
+
+def _bearer_token():
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip()
+    return None
+
+def _request_user_id(field):
+    value = request.args.get(field) or request.form.get(field)
+    if value is None and request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            value = data.get(field)
+    return value
+
+# 用户身份验证装饰器，验证通过后 g.principal 为当前用户：
+# - 请求头 Authorization: Bearer <令牌> 时从令牌读取用户ID和身份，不查询用户表；
+#   请求参数 field 中的用户ID必须与令牌一致
+# - 没有令牌时（AUTH_LEGACY_USER_ID 开启）按请求参数 field 中的用户ID查询用户
+# identities 不为空时只允许这些身份，否则返回403和 forbidden 消息
+def principal_required(*identities, forbidden="无权执行此操作", field='user_id'):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            user_id = _request_user_id(field)
+            token = _bearer_token()
+            if token:
+                try:
+                    principal = verify_token(token)
+                except TokenError as e:
+                    return jsonify({"message": str(e), "status": "error"}), 401
+                if user_id is not None and str(user_id) != str(principal.id):
+                    return jsonify({"message": "无权操作其他用户的数据", "status": "error"}), 403
+            elif Config.AUTH_LEGACY_USER_ID:
+                if not user_id:
+                    return jsonify({"message": "缺少用户ID", "status": "error"}), 400
+                user = User.query.get(user_id)
+                if not user:
+                    return jsonify({"message": "用户不存在", "status": "error"}), 404
+                principal = Principal(user.id, user.identity, None)
+            else:
+                return jsonify({"message": "请先登录", "status": "error"}), 401
+            
+            if identities and principal.identity not in identities:
+                return jsonify({"message": forbidden, "status": "error"}), 403
+            g.principal = principal
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
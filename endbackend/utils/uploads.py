@@ -0,0 +1,181 @@
+import datetime
+import hashlib
+import math
+import os
+import shutil
+import uuid
+from config import Config
+from models import db, UploadSession
+from utils.file_handler import CHUNK_SIZE, IMAGE_FOLDERS, FileTypeError, content_path, disk_path, file_extension, \
+    move_into_store, retain_files
+
+class UploadError(ValueError):
+    pass
+
+def upload_root():
+    return Config.UPLOAD_FOLDER or os.path.join(Config.STATIC_FOLDER, 'uploads_tmp')
+
+def session_dir(upload_id):
+    return os.path.join(upload_root(), upload_id)
+
+def _part_path(upload_id, index):
+    return os.path.join(session_dir(upload_id), f"{index}.part")
+
+def _assembled_path(upload_id):
+    return os.path.join(session_dir(upload_id), 'assembled')
+
+def part_count(session):
+    return max(1, math.ceil(session.size / session.part_size))
+
+# 分片的应有长度：除最后一片外均为 part_size
+def part_length(session, index):
+    count = part_count(session)
+    if index < count - 1:
+        return session.part_size
+    return session.size - session.part_size * (count - 1)
+
+# 已接收的分片序号（从0开始），断线后客户端据此续传缺失的分片
+def received_parts(session):
+    folder = session_dir(session.id)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(int(name[:-5]) for name in os.listdir(folder)
+                  if name.endswith('.part') and name[:-5].isdigit())
+
+def session_info(session):
+    received = received_parts(session)
+    return {
+        'upload_id': session.id,
+        'status': session.status,
+        'field': next((k for k, v in IMAGE_FOLDERS.items() if v == session.folder), None),
+        'filename': session.filename,
+        'size': session.size,
+        'part_size': session.part_size,
+        'part_count': part_count(session),
+        'received_parts': received,
+        'missing_parts': sorted(set(range(part_count(session))) - set(received)) if session.status == 'uploading' else []
+    }
+
+# 创建上传会话
+def create_session(user, field, filename, size):
+    if field not in IMAGE_FOLDERS:
+        raise UploadError("图片字段不正确")
+    try:
+        file_extension(filename)
+    except FileTypeError as e:
+        raise UploadError(str(e))
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("文件大小格式不正确")
+    if size <= 0 or size > Config.UPLOAD_MAX_SIZE:
+        raise UploadError(f"文件大小必须在1到{Config.UPLOAD_MAX_SIZE}字节之间")
+    
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user.id,
+        folder=IMAGE_FOLDERS[field],
+        filename=filename,
+        size=size,
+        part_size=Config.UPLOAD_PART_SIZE,
+        status='uploading'
+    )
+    os.makedirs(session_dir(session.id), exist_ok=True)
+    db.session.add(session)
+    return session
+
+# 流式写入一个分片：先写临时文件，长度正确后再重命名，断线时不会留下不完整的分片；
+# 重复上传同一分片会覆盖之前的内容
+def write_part(session, index, stream):
+    if session.status != 'uploading':
+        raise UploadError("上传已完成")
+    if index < 0 or index >= part_count(session):
+        raise UploadError("分片序号不正确")
+    expected = part_length(session, index)
+    
+    target = _part_path(session.id, index)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    written = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > expected:
+                    break
+                out.write(chunk)
+        if written != expected:
+            raise UploadError(f"分片大小不正确，应为{expected}字节")
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return expected
+
+# 按顺序合并全部分片并计算SHA-256；已完成的会话直接返回
+def complete_session(session):
+    if session.status == 'completed':
+        return session
+    missing = sorted(set(range(part_count(session))) - set(received_parts(session)))
+    if missing:
+        raise UploadError(f"缺少分片: {', '.join(map(str, missing))}")
+    
+    sha = hashlib.sha256()
+    assembled = _assembled_path(session.id)
+    with open(assembled, 'wb') as out:
+        for index in range(part_count(session)):
+            with open(_part_path(session.id, index), 'rb') as part:
+                while True:
+                    chunk = part.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    out.write(chunk)
+    for index in range(part_count(session)):
+        os.remove(_part_path(session.id, index))
+    
+    session.status = 'completed'
+    session.sha256 = sha.hexdigest()
+    return session
+
+# 创建/修改原料时引用已完成的上传：只能引用 user_id（当前登录用户）自己创建的会话，
+# 文件移入内容寻址存储并增加引用计数，会话随当前事务删除；事务提交后调用 discard_session_files 清理会话目录
+def claim_upload(upload_id, user_id, field):
+    session = UploadSession.query.get(upload_id)
+    if not session or str(session.user_id) != str(user_id):
+        raise UploadError("上传会话不存在")
+    if session.folder != IMAGE_FOLDERS[field]:
+        raise UploadError("上传会话与图片字段不匹配")
+    if session.status != 'completed':
+        raise UploadError("文件尚未上传完成")
+    
+    ext = file_extension(session.filename)
+    assembled = _assembled_path(session.id)
+    if os.path.exists(assembled):
+        path = move_into_store(assembled, session.folder, session.sha256, ext, retain=True, restore_to=assembled)
+    else:
+        # 合并文件已不存在（旧版本在相同内容已保存时会删除合并文件），先记引用再确认文件仍存在
+        path = content_path(session.folder, session.sha256, ext)
+        retain_files([path])
+        if not os.path.exists(disk_path(path)):
+            raise UploadError("上传文件已失效，请重新上传")
+    
+    db.session.delete(session)
+    return path
+
+def discard_session_files(upload_id):
+    shutil.rmtree(session_dir(upload_id), ignore_errors=True)
+
+# 删除超过保留时间的上传会话及其分片，返回删除的数量
+def expire_sessions():
+    deadline = datetime.datetime.now() - datetime.timedelta(seconds=Config.UPLOAD_SESSION_TTL)
+    expired = [row.id for row in db.session.query(UploadSession.id).filter(UploadSession.created_at < deadline)]
+    if expired:
+        UploadSession.query.filter(UploadSession.id.in_(expired)).delete(synchronize_session=False)
+        db.session.commit()
+    for upload_id in expired:
+        discard_session_files(upload_id)
+    return len(expired)
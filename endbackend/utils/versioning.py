@@ -0,0 +1,69 @@
+import hashlib
+from functools import wraps
+from flask import request, g, make_response
+from sqlalchemy import update
+from models import db, DataVersion
+
+# 数据类别
+SCOPES = ('food', 'ingredient', 'user', 'partner', 'partner_request')
+
+# 补齐缺失的版本记录（初始化数据库时调用）
+def ensure_versions():
+    existing = {row.scope for row in DataVersion.query.all()}
+    for scope in SCOPES:
+        if scope not in existing:
+            db.session.add(DataVersion(scope=scope, version=0))
+    db.session.commit()
+
+# 递增数据版本号，需在写操作提交前调用，与数据变更处于同一事务
+def bump_versions(*scopes):
+    result = db.session.execute(
+        update(DataVersion)
+        .where(DataVersion.scope.in_(scopes))
+        .values(version=DataVersion.version + 1)
+    )
+    if result.rowcount < len(scopes):
+        existing = {row.scope for row in DataVersion.query.filter(DataVersion.scope.in_(scopes))}
+        for scope in scopes:
+            if scope not in existing:
+                db.session.add(DataVersion(scope=scope, version=1))
+
+# 读取数据版本号（一次主键查询）
+def get_versions(*scopes):
+    rows = db.session.query(DataVersion.scope, DataVersion.version)\
+        .filter(DataVersion.scope.in_(scopes)).all()
+    versions = dict(rows)
+    return tuple(versions.get(scope, 0) for scope in scopes)
+
+# ETag：接口名、数据版本号和请求参数（查询参数及路径参数，如 /api/foods/<id>/trace 的 id）摘要；
+# 异步读接口使用相同格式，两种模式的ETag可以互相验证
+def make_etag(endpoint, versions, query_string, view_args=None):
+    digest = hashlib.md5(query_string)
+    if view_args:
+        digest.update(b'\0' + repr(sorted(view_args.items())).encode('utf-8'))
+    args_digest = digest.hexdigest()[:12]
+    return f"{endpoint}-{'.'.join(str(v) for v in versions)}-{args_digest}"
+
+# 为GET接口生成基于数据版本的强ETag：
+# If-None-Match 命中时直接返回304，不执行查询和序列化
+def etag_versioned(*scopes):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            versions = get_versions(*scopes)
+            # 供响应缓存作为键的一部分，保证缓存内容与ETag对应的数据版本一致
+            g.data_versions = versions
+            etag = make_etag(request.endpoint, versions, request.query_string, request.view_args)
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # 要求浏览器每次使用前重新验证
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
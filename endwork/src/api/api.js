@@ -57,7 +57,14 @@ export const user = {
 // 请求拦截器
 request.interceptors.request.use(
   config => {
-    // 可以在这里添加token等认证信息
+    // 携带登录时返回的令牌
+    const userInfo = localStorage.getItem('currentUser')
+    if (userInfo) {
+      const { token } = JSON.parse(userInfo)
+      if (token) {
+        config.headers.Authorization = `Bearer ${token}`
+      }
+    }
     return config
   },
   error => {
@@ -120,9 +127,44 @@ export const ingredient = {
   },
 }
 
+// 分片上传接口（网络中断后可续传）
+export const upload = {
+  // 创建上传会话
+  init: (data) => request.post('/uploads', data),
+  // 上传一个分片（序号从0开始）
+  uploadPart: (uploadId, index, blob) => request.put(`/uploads/${uploadId}/parts/${index}`, blob, {
+    headers: { 'Content-Type': 'application/octet-stream' },
+    timeout: 60000
+  }),
+  // 查询上传进度
+  getStatus: (uploadId) => request.get(`/uploads/${uploadId}`),
+  // 完成上传
+  complete: (uploadId) => request.post(`/uploads/${uploadId}/complete`, null, { timeout: 60000 }),
+  // 分片上传整个文件，返回 upload_id；单个分片失败时先查询进度再重试缺失的分片
+  uploadFile: async (file, field, userId, retries = 3) => {
+    const res = await upload.init({ user_id: userId, field, filename: file.name, size: file.size });
+    const { upload_id: uploadId, part_size: partSize } = res.data.data;
+    let missing = res.data.data.missing_parts;
+    for (let attempt = 0; missing.length > 0; attempt++) {
+      try {
+        for (const index of missing) {
+          await upload.uploadPart(uploadId, index, file.slice(index * partSize, (index + 1) * partSize));
+        }
+      } catch (error) {
+        if (attempt >= retries) throw error;
+        await new Promise((resolve) => setTimeout(resolve, 1000 * (attempt + 1)));
+      }
+      missing = (await upload.getStatus(uploadId)).data.data.missing_parts;
+    }
+    await upload.complete(uploadId);
+    return uploadId;
+  }
+}
+
 export default {
   auth,
   user,
   food,
-  ingredient
+  ingredient,
+  upload
 }
\ No newline at end of file